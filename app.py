@@ -1,11 +1,32 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 from flask_cors import CORS
 import os
-import json
+import copy
 import datetime
+import functools
+import time
 import uuid
 
+import numpy as np
+
+from expiry import EXPIRING_SOON_DAYS, ExpiryIndex
+from importer import read_rows, validate_container, validate_item, validate_rows
+from logstore import LogTable, parse_timestamp
+from changes import ChangeFeed
+import metrics
+from cache import ResponseCache
+from operations import Changeset
+from placement import DIMENSIONS, FreeSpaceIndex, OccupancyIndex, PlacementEngine, parse_dimensions
+from search import TextIndex
+import serializers
+from simulation import Columns, expiry_as_of, parse_rates, simulate
+from stats import StorageStats
+from storage import Storage
+from store import FieldIndex, Table, paginate, record_type
+from waste import default_vehicles, pack, parse_vehicles, planned_loads, return_plan
+
 app = Flask(__name__, static_folder='dist')
+app.json = serializers.JSONProvider(app)
 CORS(app)
 
 # Define the data file paths
@@ -15,25 +36,46 @@ CONTAINERS_FILE = os.path.join(DATA_DIR, 'containers.json')
 LOGS_FILE = os.path.join(DATA_DIR, 'logs.json')
 WASTE_FILE = os.path.join(DATA_DIR, 'waste.json')
 
+# Longest what-if projection a single /api/simulate/day call may run
+MAX_SIMULATION_DAYS = 3650
+
+# Transactions per /api/changes page, and how often the change stream
+# checks for commits from other workers and sends keepalives
+CHANGES_PAGE_SIZE = 1000
+CHANGES_POLL_SECONDS = 1
+CHANGES_KEEPALIVE_SECONDS = 15
+
+# Lifecycle of a waste item, in order
+WASTE_STATUSES = ("identified", "return-planned", "returned")
+
+# Most operations accepted by one /api/retrieve/batch or /api/place/batch call
+MAX_BATCH_OPERATIONS = 1000
+
+# Sort keys accepted by GET /api/inventory and the fields they order by
+INVENTORY_SORT_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "expiry": "expiry_date",
+    "quantity": "quantity",
+    "location": "location"
+}
+
 # Create data directory if it doesn't exist
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Snapshots live in the data files above; every change since the last
+# compaction is appended to a shared journal instead of rewriting them.
+storage = Storage(DATA_DIR)
+
 # Initialize data structures
-def load_data(file_path, default_func):
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, 'r') as f:
-                return json.load(f)
-        except:
-            return default_func()
-    else:
-        data = default_func()
-        save_data(file_path, data)
-        return data
+def load_data(file_path, default_func, indexes=(), cls=Table, record_type=None):
+    return storage.collection(file_path, default_func, cls=cls, indexes=indexes, record_type=record_type)
+
+def save_data(file_path, record):
+    storage.put(file_path, record)
 
-def save_data(file_path, data):
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=2)
+def delete_data(file_path, key):
+    storage.delete(file_path, key)
 
 # Default data functions
 def default_inventory():
@@ -47,11 +89,16 @@ def default_inventory():
 
 def default_containers():
     return [
-        {"id": 1, "name": "Medical Cabinet", "capacity": 100, "current_fill": 50, "location": "Module A"},
-        {"id": 2, "name": "Food Storage", "capacity": 300, "current_fill": 200, "location": "Storage Bay"},
-        {"id": 3, "name": "Water Storage", "capacity": 150, "current_fill": 100, "location": "Module B"},
-        {"id": 4, "name": "Oxygen Cabinet", "capacity": 50, "current_fill": 25, "location": "Airlock"},
-        {"id": 5, "name": "Equipment Locker", "capacity": 80, "current_fill": 30, "location": "Lab Module"}
+        {"id": 1, "name": "Medical Cabinet", "capacity": 100, "current_fill": 50, "location": "Module A",
+         "width": 100, "depth": 60, "height": 180},
+        {"id": 2, "name": "Food Storage", "capacity": 300, "current_fill": 200, "location": "Storage Bay",
+         "width": 200, "depth": 85, "height": 200},
+        {"id": 3, "name": "Water Storage", "capacity": 150, "current_fill": 100, "location": "Module B",
+         "width": 120, "depth": 85, "height": 200},
+        {"id": 4, "name": "Oxygen Cabinet", "capacity": 50, "current_fill": 25, "location": "Airlock",
+         "width": 60, "depth": 60, "height": 180},
+        {"id": 5, "name": "Equipment Locker", "capacity": 80, "current_fill": 30, "location": "Lab Module",
+         "width": 100, "depth": 85, "height": 200}
     ]
 
 def default_logs():
@@ -77,11 +124,172 @@ def default_waste():
         }
     ]
 
+# Items and logs are the largest collections, so their records keep their
+# fields in slots and share one string per repeated value
+InventoryItem = record_type('InventoryItem',
+                            ("id", "name", "quantity", "location", "expiry_date", "container_id",
+                             "width", "depth", "height", "position"),
+                            interned=("location", "expiry_date"))
+LogEntry = record_type('LogEntry', ("id", "timestamp", "action", "item_id", "quantity", "user"),
+                       interned=("action", "user"))
+
 # Initialize data
-inventory_items = load_data(INVENTORY_FILE, default_inventory)
-containers = load_data(CONTAINERS_FILE, default_containers)
-logs = load_data(LOGS_FILE, default_logs)
-waste_items = load_data(WASTE_FILE, default_waste)
+inventory_items = load_data(INVENTORY_FILE, default_inventory,
+                            indexes=[FieldIndex("container_id"), FieldIndex("location"),
+                                     TextIndex(["name", "location"]), ExpiryIndex(), OccupancyIndex()],
+                            record_type=InventoryItem)
+containers = load_data(CONTAINERS_FILE, default_containers, indexes=[FreeSpaceIndex(), StorageStats()])
+logs = load_data(LOGS_FILE, default_logs, cls=LogTable, record_type=LogEntry)
+waste_items = load_data(WASTE_FILE, default_waste, indexes=[FieldIndex("status")])
+
+# Every committed transaction, numbered by storage.sequence, for delta sync
+change_feed = ChangeFeed({name: collection.key for name, collection in storage.collections.items()})
+storage.listeners.append(change_feed.append)
+# With LAZY_STARTUP the snapshots and journal are loaded by the first
+# request instead of at import, so workers start serving immediately
+if os.environ.get('LAZY_STARTUP', 'false').lower() != 'true':
+    storage.recover()
+
+placement_engine = PlacementEngine(containers, inventory_items)
+
+# Bodies of read endpoints, keyed by endpoint and query; an entry is used
+# only while the collections it was built from have not changed
+response_cache = ResponseCache()
+
+def cached(*collections):
+    def decorate(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            if request.args.get('stream', 'false').lower() == 'true':
+                return view(**kwargs)
+            key = (request.endpoint, tuple(sorted(kwargs.items())),
+                   tuple(sorted(request.args.items(multi=True))))
+            # Read before building, so a write landing meanwhile invalidates the entry
+            revisions = tuple(collection.revision for collection in collections)
+            entry = response_cache.get(key, revisions)
+            if entry is None:
+                response = app.make_response(view(**kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                entry = (response.get_data(), response.headers.to_wsgi_list())
+                response_cache.put(key, revisions, entry, len(entry[0]))
+            response = Response(entry[0], headers=entry[1])
+            return response.make_conditional(request)
+        return wrapper
+    return decorate
+
+def versioned_json(build):
+    # Clients sending the last ETag in If-None-Match get a 304; the change
+    # version tells them where to follow /api/changes from. Both are read
+    # before building, so a commit landing meanwhile is replayed from the
+    # feed (puts and deletes are idempotent) rather than skipped for good
+    etag, sequence = storage.version, storage.sequence
+    response = Response(serializers.dumps(build(), sort_keys=True), mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['X-Change-Version'] = str(sequence)
+    return response.make_conditional(request)
+
+# Per-process metrics served by /api/metrics
+registry = metrics.Registry()
+request_latency = registry.register(metrics.Histogram(
+    'http_request_duration_seconds', 'Time spent handling requests', metrics.LATENCY_BUCKETS,
+    labels=('endpoint', 'method')))
+responses = registry.register(metrics.Counter(
+    'http_responses', 'Responses sent', labels=('endpoint', 'status')))
+records_scanned = registry.register(metrics.Histogram(
+    'records_scanned', 'Records examined to answer a request', metrics.SCAN_BUCKETS,
+    labels=('endpoint',)))
+registry.register(metrics.SampledCounter(
+    'storage_bytes_written', 'Bytes appended to the journal by save_data and delete_data',
+    lambda: storage.bytes_written))
+registry.register(metrics.SampledCounter(
+    'storage_commits', 'Transactions written to the journal', lambda: storage.commits))
+registry.register(metrics.SampledCounter(
+    'storage_commit_seconds', 'Time spent writing and syncing the journal', lambda: storage.commit_seconds))
+registry.register(metrics.SampledCounter(
+    'storage_syncs', 'Journal fsyncs; fewer than commits when writes are grouped', lambda: storage.syncs))
+registry.register(metrics.SampledCounter(
+    'storage_compactions', 'Snapshot compactions run', lambda: storage.compactions))
+registry.register(metrics.Gauge(
+    'collection_records', 'Records held per collection',
+    lambda: {(name,): len(collection) for name, collection in storage.collections.items()},
+    labels=('collection',)))
+registry.register(metrics.SampledCounter(
+    'response_cache_hits', 'Responses served from the response cache',
+    lambda: {(endpoint,): count for endpoint, count in response_cache.stats()['hits'].items()}, labels=('endpoint',)))
+registry.register(metrics.SampledCounter(
+    'response_cache_misses', 'Cacheable responses that had to be built',
+    lambda: {(endpoint,): count for endpoint, count in response_cache.stats()['misses'].items()}, labels=('endpoint',)))
+registry.register(metrics.SampledCounter(
+    'response_cache_evictions', 'Cached responses dropped to stay within the size limits',
+    lambda: response_cache.stats()['evictions']))
+registry.register(metrics.SampledCounter(
+    'response_cache_invalidations', 'Cached responses dropped because their data changed',
+    lambda: response_cache.stats()['invalidations']))
+registry.register(metrics.Gauge(
+    'response_cache_entries', 'Responses held in the response cache', lambda: response_cache.stats()['entries']))
+registry.register(metrics.Gauge(
+    'response_cache_bytes', 'Body bytes held in the response cache', lambda: response_cache.stats()['bytes']))
+
+# Set PROFILE_SLOW_MS to keep cProfile reports of sampled requests slower
+# than that; PROFILE_SAMPLE_RATE is the fraction of requests profiled
+profiler = metrics.Profiler(
+    slow_seconds=float(os.environ['PROFILE_SLOW_MS']) / 1000 if os.environ.get('PROFILE_SLOW_MS') else None,
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', '0.1')))
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    g.profile = profiler.start()
+
+@app.after_request
+def record_metrics(response):
+    elapsed = time.perf_counter() - g.get('started', time.perf_counter())
+    endpoint = request.endpoint or 'unmatched'
+    request_latency.observe(elapsed, endpoint, request.method)
+    responses.inc(1, endpoint, str(response.status_code))
+    if 'records_scanned' in g:
+        records_scanned.observe(g.records_scanned, endpoint)
+    if g.get('profile') is not None:
+        profiler.finish(g.profile, elapsed, endpoint)
+        g.profile = None
+    return response
+
+def note_scanned(count):
+    g.records_scanned = g.get('records_scanned', 0) + count
+
+# Bring in changes committed by other worker processes before each request
+@app.before_request
+def refresh_data():
+    storage.refresh()
+
+def is_positive_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+# Record ids are integers or strings; anything else cannot match a record
+def is_record_id(value):
+    return isinstance(value, (int, str)) and not isinstance(value, bool)
+
+# Type-check the item fields present in a request body before any
+# transaction starts; returns an error message, or None if they are valid
+def item_fields_error(data):
+    quantity = data.get("quantity", 0)
+    if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 0:
+        return "quantity must be a non-negative integer"
+    for field in ("name", "location"):
+        if not isinstance(data.get(field, ""), str):
+            return f"{field} must be a string"
+    if not isinstance(data.get("expiry_date") or "", str):
+        return "expiry_date must be a date string"
+    container_id = data.get("container_id")
+    if container_id is not None and not is_positive_int(container_id):
+        return "container_id must be a positive integer"
+    for axis in DIMENSIONS:
+        if axis in data:
+            value = data[axis]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 < value < float('inf'):
+                return "width, depth and height must all be positive numbers"
+    return None
 
 # Add log entry
 def add_log(action, item_id, quantity, user="system"):
@@ -93,18 +301,73 @@ def add_log(action, item_id, quantity, user="system"):
         "quantity": quantity,
         "user": user
     }
-    logs.append(log_entry)
-    save_data(LOGS_FILE, logs)
+    save_data(LOGS_FILE, log_entry)
     return log_entry
 
 # Existing inventory endpoints
 @app.route('/api/inventory', methods=['GET'])
+@cached(inventory_items)
 def get_inventory():
-    return jsonify(inventory_items)
+    # Without query parameters the full list is returned, as before
+    if not request.args:
+        return versioned_json(lambda: list(inventory_items))
+    
+    sort = request.args.get('sort', 'id')
+    descending = sort.startswith('-')
+    sort_field = INVENTORY_SORT_FIELDS.get(sort.lstrip('-'))
+    if sort_field is None:
+        return jsonify({"error": f"sort must be one of: {', '.join(INVENTORY_SORT_FIELDS)}"}), 400
+    
+    limit = None
+    if 'limit' in request.args:
+        try:
+            limit = int(request.args['limit'])
+        except ValueError:
+            limit = -1
+        if limit < 1:
+            return jsonify({"error": "limit must be a positive integer"}), 400
+    
+    # Equality filters are answered from the secondary indexes
+    filters = {}
+    if 'container_id' in request.args:
+        try:
+            filters['container_id'] = int(request.args['container_id'])
+        except ValueError:
+            return jsonify({"error": "container_id must be an integer"}), 400
+    if 'location' in request.args:
+        filters['location'] = request.args['location']
+    
+    if filters:
+        field, value = next(iter(filters.items()))
+        items = [item for item in inventory_items.lookup(field, value)
+                 if all(item.get(f) == v for f, v in filters.items())]
+    else:
+        items = list(inventory_items)
+    note_scanned(len(items))
+    
+    try:
+        page, next_cursor = paginate(items, sort_field, descending=descending,
+                                     after=request.args.get('after') or None, limit=limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    fields = [f for f in request.args.get('fields', '').split(',') if f]
+    if fields:
+        page = [{f: item[f] for f in fields if f in item} for item in page]
+    
+    if request.args.get('stream', 'false').lower() == 'true':
+        return Response(stream_page('items', page, next_cursor), mimetype='application/json')
+    
+    return jsonify({
+        "items": page,
+        "count": len(page),
+        "next_cursor": next_cursor
+    })
 
 @app.route('/api/inventory/<int:item_id>', methods=['GET'])
+@cached(inventory_items)
 def get_item(item_id):
-    item = next((item for item in inventory_items if item["id"] == item_id), None)
+    item = inventory_items.get(item_id)
     if item:
         return jsonify(item)
     return jsonify({"error": "Item not found"}), 404
@@ -112,7 +375,7 @@ def get_item(item_id):
 @app.route('/api/inventory', methods=['POST'])
 def add_item():
     data = request.json
-    if not data:
+    if not data or not isinstance(data, dict):
         return jsonify({"error": "Invalid data"}), 400
     
     # Validate required fields
@@ -120,59 +383,70 @@ def add_item():
     for field in required_fields:
         if field not in data:
             return jsonify({"error": f"Missing required field: {field}"}), 400
+    try:
+        dimensions = parse_dimensions(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    error = item_fields_error({k: v for k, v in data.items() if k not in DIMENSIONS})
+    if error:
+        return jsonify({"error": error}), 400
     
-    new_id = 1
-    if inventory_items:
-        new_id = max([item["id"] for item in inventory_items]) + 1
+    with storage.transaction():
+        new_id = inventory_items.allocate_id()
+        new_item = {
+            "id": new_id,
+            "name": data.get("name", ""),
+            "quantity": data.get("quantity", 0),
+            "location": data.get("location", ""),
+            "expiry_date": data.get("expiry_date", ""),
+            "container_id": data.get("container_id", None)
+        }
+        if dimensions is not None:
+            new_item.update(zip(DIMENSIONS, dimensions))
         
-    new_item = {
-        "id": new_id,
-        "name": data.get("name", ""),
-        "quantity": data.get("quantity", 0),
-        "location": data.get("location", ""),
-        "expiry_date": data.get("expiry_date", ""),
-        "container_id": data.get("container_id", None)
-    }
-    
-    inventory_items.append(new_item)
-    save_data(INVENTORY_FILE, inventory_items)
-    add_log("Add", new_id, data.get("quantity", 0))
+        save_data(INVENTORY_FILE, new_item)
+        add_log("Add", new_id, data.get("quantity", 0))
     return jsonify(new_item), 201
 
 @app.route('/api/inventory/<int:item_id>', methods=['PUT'])
 def update_item(item_id):
-    item = next((item for item in inventory_items if item["id"] == item_id), None)
-    if not item:
-        return jsonify({"error": "Item not found"}), 404
-        
     data = request.json
-    if not data:
+    if not data or not isinstance(data, dict):
         return jsonify({"error": "Invalid data"}), 400
+    error = item_fields_error(data)
+    if error:
+        return jsonify({"error": error}), 400
     
-    old_quantity = item["quantity"]
-    
-    for key in data:
-        if key in item and key != "id":  # Prevent ID changes
-            item[key] = data[key]
-    
-    save_data(INVENTORY_FILE, inventory_items)
-    
-    if "quantity" in data and old_quantity != data["quantity"]:
-        add_log("Update", item_id, data["quantity"] - old_quantity)
+    with storage.transaction():
+        item = inventory_items.get(item_id)
+        if not item:
+            return jsonify({"error": "Item not found"}), 404
+        
+        # Changed on a copy, so a failed transaction leaves the stored record as it was
+        item = copy.deepcopy(item)
+        old_quantity = item["quantity"]
+        
+        for key in data:
+            if key in item and key != "id":  # Prevent ID changes
+                item[key] = data[key]
+        
+        save_data(INVENTORY_FILE, item)
+        
+        if "quantity" in data and old_quantity != data["quantity"]:
+            add_log("Update", item_id, data["quantity"] - old_quantity)
             
     return jsonify(item)
 
 @app.route('/api/inventory/<int:item_id>', methods=['DELETE'])
 def delete_item(item_id):
-    global inventory_items
-    item = next((item for item in inventory_items if item["id"] == item_id), None)
-    if not item:
-        return jsonify({"error": "Item not found"}), 404
-    
-    quantity = item["quantity"]
-    inventory_items = [item for item in inventory_items if item["id"] != item_id]
-    save_data(INVENTORY_FILE, inventory_items)
-    add_log("Delete", item_id, -quantity)
+    with storage.transaction():
+        item = inventory_items.get(item_id)
+        if not item:
+            return jsonify({"error": "Item not found"}), 404
+        
+        quantity = item["quantity"]
+        delete_data(INVENTORY_FILE, item_id)
+        add_log("Delete", item_id, -quantity)
     return jsonify({"message": "Item deleted successfully"})
 
 # New API endpoints
@@ -186,35 +460,16 @@ def get_placement_recommendations():
     
     item_type = data.get('item_type', '')  # Make item_type optional by using .get() with default value
     quantity = data.get('quantity', 1)
+    if not is_positive_int(quantity):
+        return jsonify({"error": "quantity must be a positive integer"}), 400
+    try:
+        dimensions = parse_dimensions(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Find containers with sufficient space
-    suitable_containers = []
-    for container in containers:
-        if container['capacity'] - container['current_fill'] >= quantity:
-            # Simple algorithm: score based on available space and location
-            # More sophisticated algorithm could be implemented here
-            score = (container['capacity'] - container['current_fill']) * 0.5
-            
-            # Boost score if container already has similar items (only if item_type is provided)
-            if item_type:
-                similar_items = [item for item in inventory_items 
-                                if item['container_id'] == container['id'] and item_type.lower() in item['name'].lower()]
-                if similar_items:
-                    score += 20
-                
-            suitable_containers.append({
-                "container_id": container['id'],
-                "container_name": container['name'],
-                "location": container['location'],
-                "available_space": container['capacity'] - container['current_fill'],
-                "score": score
-            })
-    
-    # Sort by score descending
-    suitable_containers.sort(key=lambda x: x['score'], reverse=True)
-    
-    # Return top 3 recommendations or all if less than 3
-    recommendations = suitable_containers[:3] if len(suitable_containers) > 3 else suitable_containers
+    # Score only the emptiest containers and those already holding similar items;
+    # with width/depth/height each one also gets a 3D position
+    recommendations = placement_engine.recommend(item_type, quantity, limit=3, dimensions=dimensions)
     
     return jsonify({
         "success": True,
@@ -223,114 +478,185 @@ def get_placement_recommendations():
         "recommendations": recommendations
     })
 
+@app.route('/api/placement/batch', methods=['POST'])
+def get_batch_placement():
+    data = request.json
+    if not data or not isinstance(data.get('items'), list):
+        return jsonify({"error": "Missing required field: items"}), 400
+    
+    placement_requests = []
+    for index, item in enumerate(data['items']):
+        if not isinstance(item, dict):
+            return jsonify({"error": f"Item {index} must be an object"}), 400
+        quantity = item.get('quantity', 1)
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+            return jsonify({"error": f"Item {index} has an invalid quantity"}), 400
+        placement_request = {"item_type": item.get('item_type', ''), "quantity": quantity}
+        try:
+            dimensions = parse_dimensions(item)
+        except ValueError as e:
+            return jsonify({"error": f"Item {index}: {e}"}), 400
+        if dimensions is not None:
+            placement_request.update(zip(DIMENSIONS, dimensions))
+        placement_requests.append(placement_request)
+    
+    # Joint assignment: no container is given more than its free space
+    assignments = placement_engine.plan(placement_requests)
+    
+    return jsonify({
+        "success": True,
+        "placed_count": sum(1 for a in assignments if "error" not in a),
+        "assignments": assignments
+    })
+
 # 2. Item Search API
 @app.route('/api/search', methods=['GET'])
+@cached(inventory_items)
 def search_items():
     query = request.args.get('q', '')
     category = request.args.get('category', '')
     location = request.args.get('location', '')
+    prefix = request.args.get('prefix', 'false').lower() == 'true'
+    try:
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({"error": "limit and offset must be integers"}), 400
+    if (limit is not None and limit < 0) or offset < 0:
+        return jsonify({"error": "limit and offset must not be negative"}), 400
     
-    results = []
-    for item in inventory_items:
-        if (query.lower() in item['name'].lower() and
-            (not category or category.lower() in item['name'].lower()) and
-            (not location or location.lower() in item['location'].lower())):
-            results.append(item)
+    # q and category match item names, location matches item locations;
+    # prefix=true restricts q to word prefixes for typeahead
+    total, results = inventory_items.indexes['text'].search(
+        [("name", "" if prefix else query), ("name", category), ("location", location)],
+        rank=query, prefix=prefix, limit=limit, offset=offset)
+    note_scanned(total)
     
-    return jsonify({"results": results, "count": len(results)})
+    return jsonify({"results": results, "count": len(results), "total": total})
 
 # Item Retrieve API
 @app.route('/api/retrieve', methods=['POST'])
 def retrieve_item():
     data = request.json
-    if not data or 'item_id' not in data:
+    if not isinstance(data, dict) or 'item_id' not in data:
         return jsonify({"error": "Missing required field: item_id"}), 400
+    error = operation_error(data, ('item_id',))
+    if error:
+        return jsonify({"error": error}), 400
     
     item_id = data['item_id']
     quantity = data.get('quantity', 1)
     user = data.get('user', 'system')
     
-    item = next((item for item in inventory_items if item["id"] == item_id), None)
-    if not item:
-        return jsonify({"error": "Item not found"}), 404
-    
-    if item['quantity'] < quantity:
-        return jsonify({"error": "Insufficient quantity available"}), 400
-    
-    # Update item quantity
-    item['quantity'] -= quantity
-    save_data(INVENTORY_FILE, inventory_items)
+    # Check and update under one transaction so concurrent retrievals
+    # (threads or other workers) cannot overdraw the item
+    with storage.transaction():
+        changes = Changeset(inventory_items, containers, placement_engine)
+        result, error, status = changes.retrieve(item_id, quantity, user)
+        if error:
+            return jsonify({"error": error}), status
+        save_changes(changes)
     
-    # Update container fill level if applicable
-    if item['container_id']:
-        container = next((c for c in containers if c["id"] == item['container_id']), None)
-        if container:
-            container['current_fill'] -= quantity
-            save_data(CONTAINERS_FILE, containers)
-    
-    # Log the retrieval
-    add_log("Retrieve", item_id, -quantity, user)
-    
-    return jsonify({
-        "success": "true",
-        "item_id": item_id,
-        "name": item['name'],
-        "quantity_retrieved": quantity,
-        "remaining_quantity": item['quantity']
-    })
+    return jsonify({"success": "true", **result})
 
 # Item Place API
 @app.route('/api/place', methods=['POST'])
 def place_item():
     data = request.json
-    if not data or 'item_id' not in data or 'container_id' not in data:
+    if not isinstance(data, dict) or 'item_id' not in data or 'container_id' not in data:
         return jsonify({"error": "Missing required fields"}), 400
+    error = operation_error(data, ('item_id', 'container_id'))
+    if error:
+        return jsonify({"error": error}), 400
     
     item_id = data['item_id']
     container_id = data['container_id']
     quantity = data.get('quantity', 1)
     user = data.get('user', 'system')
     
-    item = next((item for item in inventory_items if item["id"] == item_id), None)
-    if not item:
-        return jsonify({"error": "Item not found"}), 404
-    
-    container = next((c for c in containers if c["id"] == container_id), None)
-    if not container:
-        return jsonify({"error": "Container not found"}), 404
-    
-    if container['capacity'] - container['current_fill'] < quantity:
-        return jsonify({"error": "Container does not have enough space"}), 400
-    
-    # Update item
-    item['quantity'] += quantity
-    item['container_id'] = container_id
-    item['location'] = container['location']
-    
-    # Update container
-    container['current_fill'] += quantity
+    with storage.transaction():
+        changes = Changeset(inventory_items, containers, placement_engine)
+        result, error, status = changes.place(item_id, container_id, quantity, user)
+        if error:
+            return jsonify({"error": error}), status
+        save_changes(changes)
     
-    # Save changes
-    save_data(INVENTORY_FILE, inventory_items)
-    save_data(CONTAINERS_FILE, containers)
+    return jsonify({"success": True, **result})
+
+# Batch retrieve/place: {"operations": [{"item_id": ..., "quantity": ...}, ...]}.
+# Every operation is checked against the effect of the ones before it and
+# the batch is committed in one transaction only if all of them succeed.
+@app.route('/api/retrieve/batch', methods=['POST'])
+def retrieve_batch():
+    return apply_batch(('item_id',), lambda changes, op: changes.retrieve(
+        op['item_id'], op.get('quantity', 1), op.get('user', 'system')))
+
+@app.route('/api/place/batch', methods=['POST'])
+def place_batch():
+    return apply_batch(('item_id', 'container_id'), lambda changes, op: changes.place(
+        op['item_id'], op['container_id'], op.get('quantity', 1), op.get('user', 'system')))
+
+# Check the ids, quantity and user of one retrieve or place request before
+# its transaction; returns an error message, or None if they are valid
+def operation_error(data, id_fields):
+    for field in id_fields:
+        if not is_record_id(data[field]):
+            return f"{field} must be an integer or string"
+    if not is_positive_int(data.get('quantity', 1)):
+        return "quantity must be a positive integer"
+    if not isinstance(data.get('user', 'system'), str):
+        return "user must be a string"
+    return None
+
+def apply_batch(required, apply):
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('operations'), list) or not data['operations']:
+        return jsonify({"error": "Missing required field: operations"}), 400
+    operations = data['operations']
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({"error": f"At most {MAX_BATCH_OPERATIONS} operations per batch"}), 400
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict) or any(field not in op for field in required):
+            return jsonify({"error": f"Operation {index} is missing required fields"}), 400
+        error = operation_error(op, required)
+        if error:
+            return jsonify({"error": f"Operation {index}: {error}"}), 400
     
-    # Log the placement
-    add_log("Place", item_id, quantity, user)
+    with storage.transaction():
+        changes = Changeset(inventory_items, containers, placement_engine)
+        results = []
+        failed = 0
+        for index, op in enumerate(operations):
+            result, error, _ = apply(changes, op)
+            if error:
+                failed += 1
+                results.append({"index": index, "success": False, "error": error})
+            else:
+                results.append({"index": index, "success": True, **result})
+        if failed:
+            return jsonify({
+                "success": False,
+                "error": f"{failed} of {len(operations)} operations failed; none were applied",
+                "results": results
+            }), 400
+        save_changes(changes)
     
-    return jsonify({
-        "success": True,
-        "item_id": item_id,
-        "name": item['name'],
-        "quantity_placed": quantity,
-        "container": container['name'],
-        "location": container['location']
-    })
+    return jsonify({"success": True, "count": len(results), "results": results})
+
+# Save the records and logs of a Changeset inside the current transaction
+def save_changes(changes):
+    for item in changes.items.values():
+        save_data(INVENTORY_FILE, item)
+    for container in changes.containers.values():
+        save_data(CONTAINERS_FILE, container)
+    for action, item_id, quantity, user in changes.logs:
+        add_log(action, item_id, quantity, user)
 
 # 3. Waste Management API
 @app.route('/api/waste/identify', methods=['POST'])
 def identify_waste():
     data = request.json
-    if not data or 'name' not in data or 'weight' not in data:
+    if not isinstance(data, dict) or 'name' not in data or 'weight' not in data:
         return jsonify({"error": "Missing required fields"}), 400
     
     waste_id = f"waste-{uuid.uuid4()}"
@@ -342,8 +668,7 @@ def identify_waste():
         "return_plan": None
     }
     
-    waste_items.append(new_waste)
-    save_data(WASTE_FILE, waste_items)
+    save_data(WASTE_FILE, new_waste)
     
     return jsonify({
         "success": "true",
@@ -351,55 +676,142 @@ def identify_waste():
         "status": "identified"
     })
 
+@app.route('/api/waste', methods=['GET'])
+def list_waste():
+    # Answered from the status index; without status every item is listed
+    status = request.args.get('status')
+    if status:
+        if status not in WASTE_STATUSES:
+            return jsonify({"error": f"status must be one of: {', '.join(WASTE_STATUSES)}"}), 400
+        items = waste_items.lookup('status', status)
+    else:
+        items = list(waste_items)
+    
+    return jsonify({
+        "waste": items,
+        "count": len(items),
+        "status_counts": {s: waste_items.indexes['status'].count(s) for s in WASTE_STATUSES}
+    })
+
 @app.route('/api/waste/return-plan', methods=['POST'])
 def waste_return_plan():
     data = request.json
-    if not data or 'waste_id' not in data:
+    if not isinstance(data, dict) or 'waste_id' not in data:
         return jsonify({"error": "Missing required field: waste_id"}), 400
     
     waste_id = data['waste_id']
-    waste_item = next((w for w in waste_items if w["id"] == waste_id), None)
-    if not waste_item:
-        return jsonify({"error": "Waste item not found"}), 404
-    
-    # Generate a simple return plan
-    return_plan = {
-        "vehicle": "SpaceX Dragon",
-        "scheduled_date": (datetime.datetime.utcnow() + datetime.timedelta(days=30)).strftime("%Y-%m-%d"),
-        "storage_location": "Waste Bay Section C",
-        "handling_instructions": "Secure in triple containment bag"
-    }
+    if not is_record_id(waste_id):
+        return jsonify({"error": "waste_id must be an integer or string"}), 400
+    try:
+        vehicles = parse_vehicles(data['vehicles'], datetime.datetime.utcnow().date()) if 'vehicles' in data else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Update waste item
-    waste_item['status'] = "return-planned"
-    waste_item['return_plan'] = return_plan
-    save_data(WASTE_FILE, waste_items)
+    with storage.transaction():
+        waste_item = waste_items.get(waste_id)
+        if not waste_item:
+            return jsonify({"error": "Waste item not found"}), 404
+        if waste_item['status'] == "returned":
+            return jsonify({"error": "Waste item has already been returned"}), 400
+        
+        # Earliest upcoming vehicle with room for it
+        assigned, unplaced = plan_waste([waste_item], vehicles)
+        if unplaced:
+            return jsonify({"error": unplaced[0][1]}), 400
     
     return jsonify({
         "success": "true",
         "waste_id": waste_id,
         "status": "return-planned",
-        "return_plan": return_plan
+        "return_plan": assigned[0][0]['return_plan']
     })
 
+@app.route('/api/waste/return-plan/batch', methods=['POST'])
+def waste_return_plan_batch():
+    # Optional body: {"waste_ids": [...], "vehicles": [{"name", "departure_date", "capacity"}]};
+    # by default every identified item is packed into the upcoming vehicles
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    waste_ids = data.get('waste_ids')
+    if waste_ids is not None:
+        if not isinstance(waste_ids, list) or not all(is_record_id(waste_id) for waste_id in waste_ids):
+            return jsonify({"error": "waste_ids must be a list of ids"}), 400
+        # Each item is packed once however often it is listed
+        waste_ids = list(dict.fromkeys(waste_ids))
+    try:
+        vehicles = parse_vehicles(data['vehicles'], datetime.datetime.utcnow().date()) if 'vehicles' in data else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    with storage.transaction():
+        unplanned = []
+        if waste_ids is None:
+            candidates = waste_items.lookup('status', 'identified')
+        else:
+            candidates = []
+            for waste_id in waste_ids:
+                waste_item = waste_items.get(waste_id)
+                if not waste_item:
+                    unplanned.append({"waste_id": waste_id, "error": "Waste item not found"})
+                elif waste_item['status'] == "returned":
+                    unplanned.append({"waste_id": waste_id, "error": "Waste item has already been returned"})
+                else:
+                    candidates.append(waste_item)
+        
+        assigned, unplaced = plan_waste(candidates, vehicles)
+        unplanned += [{"waste_id": item['id'], "error": error} for item, error in unplaced]
+        loads = planned_loads(waste_items.lookup('status', 'return-planned'))
+    
+    used_vehicles = {vehicle['id']: vehicle for _, vehicle in assigned}
+    return jsonify({
+        "success": True,
+        "planned_count": len(assigned),
+        "plans": [{"waste_id": item['id'], "return_plan": item['return_plan']} for item, _ in assigned],
+        "unplanned": unplanned,
+        "vehicles": [dict(vehicle, load=loads.get(vehicle_id, 0))
+                     for vehicle_id, vehicle in sorted(used_vehicles.items(), key=lambda v: v[1]['departure_date'])]
+    })
+
+# Pack waste into return vehicles by weight and save the plans; must run
+# inside a transaction. Returns pack()'s (assigned, unplaced), with the
+# saved copies of the planned items in assigned.
+def plan_waste(candidates, vehicles=None):
+    if vehicles is None:
+        vehicles = default_vehicles(datetime.datetime.utcnow().date())
+    ids = {item['id'] for item in candidates}
+    # Capacity already taken by other planned waste; re-planned items free theirs
+    loads = planned_loads(item for item in waste_items.lookup('status', 'return-planned')
+                          if item['id'] not in ids)
+    assigned, unplaced = pack(candidates, vehicles, loads)
+    planned = []
+    for waste_item, vehicle in assigned:
+        waste_item = dict(waste_item, status="return-planned", return_plan=return_plan(vehicle))
+        save_data(WASTE_FILE, waste_item)
+        planned.append((waste_item, vehicle))
+    return planned, unplaced
+
 @app.route('/api/waste/complete-undocking', methods=['POST'])
 def complete_waste_undocking():
     data = request.json
-    if not data or 'waste_id' not in data:
+    if not isinstance(data, dict) or 'waste_id' not in data:
         return jsonify({"error": "Missing required field: waste_id"}), 400
     
     waste_id = data['waste_id']
-    waste_item = next((w for w in waste_items if w["id"] == waste_id), None)
-    if not waste_item:
-        return jsonify({"error": "Waste item not found"}), 404
-    
-    if waste_item['status'] != "return-planned":
-        return jsonify({"error": "Waste item does not have a return plan"}), 400
-    
-    # Update waste item
-    waste_item['status'] = "returned"
-    waste_item['return_completion_date'] = datetime.datetime.utcnow().strftime("%Y-%m-%d")
-    save_data(WASTE_FILE, waste_items)
+    if not is_record_id(waste_id):
+        return jsonify({"error": "waste_id must be an integer or string"}), 400
+    with storage.transaction():
+        waste_item = waste_items.get(waste_id)
+        if not waste_item:
+            return jsonify({"error": "Waste item not found"}), 404
+        
+        if waste_item['status'] != "return-planned":
+            return jsonify({"error": "Waste item does not have a return plan"}), 400
+        
+        # Update waste item
+        waste_item = dict(waste_item, status="returned",
+                          return_completion_date=datetime.datetime.utcnow().strftime("%Y-%m-%d"))
+        save_data(WASTE_FILE, waste_item)
     
     return jsonify({
         "success": "true",
@@ -408,203 +820,361 @@ def complete_waste_undocking():
         "completion_date": waste_item['return_completion_date']
     })
 
+@app.route('/api/waste/complete-undocking/batch', methods=['POST'])
+def complete_waste_undocking_batch():
+    # {"waste_ids": [...]} or {"vehicle_id": ...} for everything planned on
+    # that vehicle; all items are marked returned together or none are
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    waste_ids = data.get('waste_ids')
+    vehicle = data.get('vehicle_id')
+    if (waste_ids is None) == (vehicle is None) or (waste_ids is not None and not isinstance(waste_ids, list)):
+        return jsonify({"error": "Provide either waste_ids (a list) or vehicle_id"}), 400
+    if waste_ids is not None:
+        if not all(is_record_id(waste_id) for waste_id in waste_ids):
+            return jsonify({"error": "waste_ids must be a list of ids"}), 400
+        waste_ids = list(dict.fromkeys(waste_ids))
+    
+    with storage.transaction():
+        if vehicle is not None:
+            undocked = [item for item in waste_items.lookup('status', 'return-planned')
+                        if (item.get('return_plan') or {}).get('vehicle_id') == vehicle]
+            errors = []
+        else:
+            undocked, errors = [], []
+            for waste_id in waste_ids:
+                waste_item = waste_items.get(waste_id)
+                if not waste_item:
+                    errors.append({"waste_id": waste_id, "error": "Waste item not found"})
+                elif waste_item['status'] != "return-planned":
+                    errors.append({"waste_id": waste_id, "error": "Waste item does not have a return plan"})
+                else:
+                    undocked.append(waste_item)
+        if errors:
+            return jsonify({
+                "success": False,
+                "error": f"{len(errors)} of {len(waste_ids)} waste items cannot be undocked; none were changed",
+                "errors": errors
+            }), 400
+        
+        completion_date = datetime.datetime.utcnow().strftime("%Y-%m-%d")
+        for waste_item in undocked:
+            save_data(WASTE_FILE, dict(waste_item, status="returned", return_completion_date=completion_date))
+    
+    return jsonify({
+        "success": True,
+        "returned_count": len(undocked),
+        "waste_ids": [item['id'] for item in undocked],
+        "completion_date": completion_date
+    })
+
 # 4. Time Simulation API
 @app.route('/api/simulate/day', methods=['POST'])
 def simulate_day():
-    # Check for expired items
-    expired_items = []
+    # Optional body: {"days": N, "seed": S, "rates": {"Food": [low, high]}, "commit": false}
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    days = data.get('days', 1)
+    seed = data.get('seed')
+    commit = data.get('commit', True)
+    if not isinstance(commit, bool):
+        return jsonify({"error": "commit must be true or false"}), 400
+    if not is_positive_int(days) or days > MAX_SIMULATION_DAYS:
+        return jsonify({"error": f"days must be an integer between 1 and {MAX_SIMULATION_DAYS}"}), 400
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+        return jsonify({"error": "seed must be a non-negative integer"}), 400
+    try:
+        rates = parse_rates(data.get('rates'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    rng = np.random.default_rng(seed)
     today = datetime.datetime.utcnow()
+    last_day = today + datetime.timedelta(days=days - 1)
     
-    for item in inventory_items:
-        if 'expiry_date' in item and item['expiry_date']:
-            expiry_date = datetime.datetime.strptime(item['expiry_date'], "%Y-%m-%d")
-            days_left = (expiry_date - today).days
-            
-            if days_left <= 0:
-                expired_items.append({
-                    "item_id": item['id'],
-                    "name": item['name'],
-                    "expiry_date": item['expiry_date'],
-                    "status": "expired"
-                })
-            elif days_left <= 30:
-                expired_items.append({
-                    "item_id": item['id'],
-                    "name": item['name'],
-                    "expiry_date": item['expiry_date'],
-                    "days_left": days_left,
-                    "status": "expiring_soon"
-                })
-    
-    # Simulate usage of consumables
-    consumables_used = []
-    for item in inventory_items:
-        if "Food" in item['name'] or "Water" in item['name'] or "Medical" in item['name']:
-            # Simulate random daily usage between 1-5% of quantity
-            import random
-            usage = max(1, int(item['quantity'] * random.uniform(0.01, 0.05)))
-            
-            if item['quantity'] >= usage:
-                item['quantity'] -= usage
-                consumables_used.append({
-                    "item_id": item['id'],
-                    "name": item['name'],
-                    "used": usage,
-                    "remaining": item['quantity']
-                })
-                
-                # Log the usage
-                add_log("Use", item['id'], -usage, "simulation")
-    
-    # Save changes
-    save_data(INVENTORY_FILE, inventory_items)
+    # Quantities and expiry dates are simulated column-wise; only the
+    # final quantities are written back, in one transaction with their logs
+    with storage.transaction():
+        columns = Columns(list(inventory_items), rates)
+        remaining, used, timeline = simulate(columns, days, rng, today)
+        
+        consumables_used = []
+        for index in np.flatnonzero(used):
+            item = columns.items[index]
+            consumables_used.append({
+                "item_id": item['id'],
+                "name": item['name'],
+                "used": int(used[index]),
+                "remaining": int(remaining[index])
+            })
+            if commit:
+                item = copy.deepcopy(item)
+                item['quantity'] = int(remaining[index])
+                save_data(INVENTORY_FILE, item)
+                add_log("Use", item['id'], -int(used[index]), "simulation")
+    
+    # Check for expired items as of the last simulated day, by the same rule
+    # as the timeline's expired counts
+    expired_items = inventory_items.indexes['expiry'].report(expiry_as_of(last_day))
     
     return jsonify({
         "success": True,
-        "date_simulated": today.strftime("%Y-%m-%d"),
+        "date_simulated": last_day.strftime("%Y-%m-%d"),
+        "days": days,
+        "committed": commit,
         "expired_items": expired_items,
-        "consumables_used": consumables_used
+        "consumables_used": consumables_used,
+        "timeline": timeline
+    })
+
+@app.route('/api/expiry', methods=['GET'])
+def get_expiry():
+    date = request.args.get('date', '')
+    try:
+        as_of = datetime.date.fromisoformat(date) if date else datetime.datetime.utcnow().date()
+    except ValueError:
+        return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+    try:
+        within = int(request.args.get('within', EXPIRING_SOON_DAYS))
+    except ValueError:
+        within = -1
+    if within < 0:
+        return jsonify({"error": "within must be a non-negative integer"}), 400
+    
+    # Only items expired by `date` or expiring within `within` days are visited
+    report = inventory_items.indexes['expiry'].report(as_of, within)
+    note_scanned(len(report))
+    expired = [entry for entry in report if entry["status"] == "expired"]
+    expiring_soon = [entry for entry in report if entry["status"] == "expiring_soon"]
+    
+    return jsonify({
+        "date": as_of.isoformat(),
+        "within_days": within,
+        "expired": expired,
+        "expiring_soon": expiring_soon,
+        "expired_count": len(expired),
+        "expiring_soon_count": len(expiring_soon)
     })
 
 # 5. Import/Export API
 @app.route('/api/import/items', methods=['POST'])
 def import_items():
-    data = request.json
-    if not data or 'items' not in data:
+    # Accepts {"items": [...]}, or NDJSON/CSV bodies streamed row by row
+    rows = read_rows(request, 'items')
+    if rows is None:
         return jsonify({"error": "Missing required field: items"}), 400
     
-    items = data['items']
-    imported_count = 0
+    # Validate the whole payload before touching the inventory
+    try:
+        valid_items, errors = validate_rows(rows, validate_item)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     new_items = []
     
-    for item_data in items:
-        if 'name' not in item_data or 'quantity' not in item_data:
-            continue
-        
-        new_id = 1
-        if inventory_items:
-            new_id = max([item["id"] for item in inventory_items]) + 1
+    # Assign ids in one block and commit items and logs together
+    with storage.transaction():
+        first_id = inventory_items.allocate_id(len(valid_items))
+        for offset, fields in enumerate(valid_items):
+            new_item = {"id": first_id + offset, **fields}
+            save_data(INVENTORY_FILE, new_item)
+            new_items.append(new_item)
             
-        new_item = {
-            "id": new_id,
-            "name": item_data['name'],
-            "quantity": item_data['quantity'],
-            "location": item_data.get('location', 'Receiving Bay'),
-            "expiry_date": item_data.get('expiry_date', ''),
-            "container_id": item_data.get('container_id', None)
-        }
-        
-        inventory_items.append(new_item)
-        new_items.append(new_item)
-        imported_count += 1
-        
-        # Log the import
-        add_log("Import", new_id, item_data['quantity'])
-    
-    save_data(INVENTORY_FILE, inventory_items)
+            # Log the import
+            add_log("Import", new_item["id"], new_item["quantity"])
     
     return jsonify({
         "success": True,
-        "imported_count": imported_count,
-        "items": new_items
+        "imported_count": len(new_items),
+        "items": new_items,
+        "errors": errors
     })
 
 @app.route('/api/import/containers', methods=['POST'])
 def import_containers():
-    data = request.json
-    if not data or 'containers' not in data:
+    rows = read_rows(request, 'containers')
+    if rows is None:
         return jsonify({"error": "Missing required field: containers"}), 400
     
-    container_data = data['containers']
-    imported_count = 0
+    try:
+        valid_containers, errors = validate_rows(rows, validate_container)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     new_containers = []
     
-    for container in container_data:
-        if 'name' not in container or 'capacity' not in container:
-            continue
-        
-        new_id = 1
-        if containers:
-            new_id = max([c["id"] for c in containers]) + 1
-            
-        new_container = {
-            "id": new_id,
-            "name": container['name'],
-            "capacity": container['capacity'],
-            "current_fill": container.get('current_fill', 0),
-            "location": container.get('location', 'Receiving Bay')
-        }
-        
-        containers.append(new_container)
-        new_containers.append(new_container)
-        imported_count += 1
-    
-    save_data(CONTAINERS_FILE, containers)
+    with storage.transaction():
+        first_id = containers.allocate_id(len(valid_containers))
+        for offset, fields in enumerate(valid_containers):
+            new_container = {"id": first_id + offset, **fields}
+            save_data(CONTAINERS_FILE, new_container)
+            new_containers.append(new_container)
     
     return jsonify({
         "success": True,
-        "imported_count": imported_count,
-        "containers": new_containers
+        "imported_count": len(new_containers),
+        "containers": new_containers,
+        "errors": errors
     })
 
 @app.route('/api/export/arrangement', methods=['GET'])
+@cached(containers, inventory_items)
 def export_arrangement():
-    # Build comprehensive data structure of current arrangement
-    export_data = {
+    # Build comprehensive data structure of current arrangement; it is
+    # rebuilt only when containers or inventory have changed
+    return versioned_json(lambda: {
         "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
-        "containers": containers,
-        "inventory": inventory_items,
-        "storage_stats": {
-            "total_containers": len(containers),
-            "total_items": len(inventory_items),
-            "total_capacity": sum(c['capacity'] for c in containers),
-            "total_used": sum(c['current_fill'] for c in containers),
-            "utilization_percentage": 
-                round(sum(c['current_fill'] for c in containers) / 
-                      sum(c['capacity'] for c in containers) * 100 
-                      if sum(c['capacity'] for c in containers) > 0 else 0, 2)
-        }
+        "containers": list(containers),
+        "inventory": list(inventory_items),
+        "storage_stats": storage_stats()
+    })
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    stats = storage_stats()
+    stats["container_item_counts"] = {
+        str(container_id): inventory_items.indexes['container_id'].count(container_id)
+        for container_id in containers.records
     }
-    
-    return jsonify(export_data)
+    return jsonify(stats)
+
+def storage_stats():
+    stats = containers.indexes['stats'].summary()
+    stats["total_items"] = len(inventory_items)
+    return stats
 
 # 6. Logging API
 @app.route('/api/logs', methods=['GET'])
+@cached(logs)
 def get_logs():
     start_date = request.args.get('start_date', '')
     end_date = request.args.get('end_date', '')
     action_type = request.args.get('action', '')
     user = request.args.get('user', '')
+    after = request.args.get('after', '')
+    stream = request.args.get('stream', 'false').lower() == 'true'
     
-    filtered_logs = logs
-    
+    start = end = limit = None
     if start_date:
         try:
-            start = datetime.datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            filtered_logs = [log for log in filtered_logs 
-                             if datetime.datetime.fromisoformat(log['timestamp'].replace('Z', '+00:00')) >= start]
-        except:
+            start = parse_timestamp(start_date)
+        except ValueError:
             pass
     
     if end_date:
         try:
-            end = datetime.datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            filtered_logs = [log for log in filtered_logs 
-                             if datetime.datetime.fromisoformat(log['timestamp'].replace('Z', '+00:00')) <= end]
-        except:
+            end = parse_timestamp(end_date)
+        except ValueError:
             pass
     
-    if action_type:
-        filtered_logs = [log for log in filtered_logs if log['action'] == action_type]
+    if 'limit' in request.args:
+        try:
+            limit = int(request.args['limit'])
+        except ValueError:
+            limit = -1
+        if limit < 1:
+            return jsonify({"error": "limit must be a positive integer"}), 400
+    
+    try:
+        filtered_logs, next_cursor = logs.query(start=start, end=end,
+                                                action=action_type or None,
+                                                user=user or None,
+                                                after=after or None,
+                                                limit=limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    note_scanned(len(filtered_logs))
     
-    if user:
-        filtered_logs = [log for log in filtered_logs if log['user'] == user]
+    if stream:
+        return Response(stream_page('logs', filtered_logs, next_cursor), mimetype='application/json')
     
     return jsonify({
         "count": len(filtered_logs),
-        "logs": filtered_logs
+        "logs": filtered_logs,
+        "next_cursor": next_cursor
+    })
+
+# 7. Metrics API
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/metrics/profiles', methods=['GET'])
+def get_profiles():
+    return jsonify({"enabled": profiler.enabled, "profiles": list(profiler.reports)})
+
+# 8. Change feed API
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    # Without since, only the current version is returned to sync from
+    try:
+        since = int(request.args['since']) if 'since' in request.args else None
+        limit = int(request.args.get('limit', CHANGES_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "since and limit must be integers"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    
+    if since is None:
+        return jsonify({"version": change_feed.latest, "transactions": [], "more": False})
+    
+    transactions = change_feed.since(since, limit)
+    if transactions is None:
+        return jsonify({
+            "error": "Changes since this version are no longer available; reload the full lists",
+            "version": change_feed.latest
+        }), 410
+    
+    version = transactions[-1]["version"] if transactions else since
+    return jsonify({
+        "version": version,
+        "transactions": transactions,
+        "more": version < change_feed.latest
     })
 
+@app.route('/api/changes/stream', methods=['GET'])
+def stream_changes():
+    # Server-Sent Events: one "change" event per transaction, with the
+    # version as event id so reconnecting clients resume via Last-Event-ID
+    since = request.args.get('since') or request.headers.get('Last-Event-ID')
+    try:
+        since = int(since) if since else change_feed.latest
+    except ValueError:
+        return jsonify({"error": "since must be an integer"}), 400
+    
+    def events(version):
+        yield 'retry: 3000\n\n'
+        idle = 0
+        while True:
+            if not change_feed.wait(version, CHANGES_POLL_SECONDS):
+                # Commits by other worker processes only arrive on refresh
+                storage.refresh()
+            transactions = change_feed.since(version, CHANGES_PAGE_SIZE)
+            if transactions is None:
+                version = change_feed.latest
+                yield 'event: resync\ndata: %s\n\n' % serializers.dumps({"version": version}).decode('utf-8')
+                continue
+            for transaction in transactions:
+                version = transaction["version"]
+                yield 'id: %d\nevent: change\ndata: %s\n\n' % (
+                    version, serializers.dumps(transaction, sort_keys=True).decode('utf-8'))
+            idle = 0 if transactions else idle + CHANGES_POLL_SECONDS
+            if idle >= CHANGES_KEEPALIVE_SECONDS:
+                idle = 0
+                yield ': keepalive\n\n'
+    
+    return Response(events(since), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Emit {"<name>": [...], "count": N, "next_cursor": C} one entry at a time
+def stream_page(name, entries, next_cursor):
+    yield b'{"%s":[' % name.encode('utf-8')
+    for index, entry in enumerate(entries):
+        yield (b',' if index else b'') + serializers.dumps(entry)
+    yield b'],"count":%d,"next_cursor":%s}' % (len(entries), serializers.dumps(next_cursor))
+
 # Serve React app
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -615,4 +1185,4 @@ def serve(path):
 
 if __name__ == '__main__':
     debug_mode = os.environ.get('DEBUG', 'False').lower() == 'true'
-    app.run(host='0.0.0.0', port=8000, debug=debug_mode)
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', '8000')), debug=debug_mode)
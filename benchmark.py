@@ -0,0 +1,230 @@
+"""Benchmark the REST API against synthetic datasets.
+
+    python benchmark.py --sizes 100,1000,10000 --requests 200 --output bench.json
+
+Every size runs in a fresh process with its own temporary data directory
+holding that many inventory items, containers and log entries, generated
+from --seed so runs are comparable across commits. Requests go through
+Flask's test client; the JSON report gives throughput, p50/p99 latency and
+bytes written per endpoint. The response cache is cleared before every
+measured request, so results are cold; endpoints served from the cache are
+measured a second time with it left on and reported as warm.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import serializers
+from storage import write_snapshot
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+ITEM_WORDS = ["Food", "Water", "Medical", "Oxygen", "Filter", "Battery", "Tool", "Sample", "Cable", "Sensor"]
+ITEM_KINDS = ["Rations", "Pack", "Kit", "Tank", "Cartridge", "Module", "Case", "Spare"]
+LOCATIONS = ["Module A", "Module B", "Storage Bay", "Airlock", "Lab Module", "Node 1", "Node 2", "Cupola"]
+ACTIONS = ["Add", "Retrieve", "Place", "Use", "Update"]
+USERS = ["astronaut%d" % n for n in range(1, 21)] + ["system", "simulation"]
+
+# Endpoints whose cost grows with the whole dataset get fewer requests.
+HEAVY_ENDPOINTS = {"simulate_day", "export_arrangement"}
+# Endpoints answered from the response cache while their collections are unchanged.
+CACHED_ENDPOINTS = {"get_item", "search_items", "get_logs", "export_arrangement"}
+
+
+def write_dataset(data_dir, size, rng):
+    os.makedirs(data_dir)
+    start = datetime.date(2025, 1, 1)
+    containers = []
+    for container_id in range(1, size + 1):
+        capacity = rng.randint(100, 1000)
+        containers.append({
+            "id": container_id,
+            "name": "%s Locker %d" % (rng.choice(ITEM_WORDS), container_id),
+            "capacity": capacity,
+            "current_fill": rng.randint(0, capacity),
+            "location": rng.choice(LOCATIONS),
+        })
+    items = []
+    for item_id in range(1, size + 1):
+        items.append({
+            "id": item_id,
+            "name": "%s %s %d" % (rng.choice(ITEM_WORDS), rng.choice(ITEM_KINDS), item_id),
+            "quantity": rng.randint(500, 5000),
+            "location": rng.choice(LOCATIONS),
+            "expiry_date": (start + datetime.timedelta(days=rng.randint(0, 2000))).isoformat(),
+            "container_id": rng.randint(1, size),
+        })
+    logs = []
+    for log_id in range(1, size + 1):
+        timestamp = datetime.datetime(2025, 1, 1) + datetime.timedelta(seconds=rng.randint(0, 365 * 86400))
+        logs.append({
+            "id": "log-%d" % log_id,
+            "timestamp": timestamp.isoformat() + "Z",
+            "action": rng.choice(ACTIONS),
+            "item_id": rng.randint(1, size),
+            "quantity": rng.randint(-10, 10),
+            "user": rng.choice(USERS),
+        })
+    write_snapshot(os.path.join(data_dir, 'inventory.json'), items)
+    write_snapshot(os.path.join(data_dir, 'containers.json'), containers)
+    # Migrated into the log segment when the app starts
+    write_snapshot(os.path.join(data_dir, 'logs.json'), logs)
+    write_snapshot(os.path.join(data_dir, 'waste.json'), [])
+
+
+def process_bytes_written():
+    # Bytes this process passed to write(); Linux only
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def measure(storage, name, call, count, warmup, reset=None):
+    # reset() runs before every request and is left out of the latencies
+    for _ in range(warmup):
+        if reset is not None:
+            reset()
+        call()
+    latencies = []
+    written = process_bytes_written()
+    journal = storage.bytes_written
+    elapsed = 0
+    for _ in range(count):
+        if reset is not None:
+            reset()
+        request_started = time.perf_counter()
+        response = call()
+        latency = time.perf_counter() - request_started
+        latencies.append(latency)
+        elapsed += latency
+        if response.status_code >= 400:
+            raise RuntimeError("%s returned %d: %s" % (name, response.status_code, response.get_data(as_text=True)[:200]))
+    latencies.sort()
+    after = process_bytes_written()
+    return {
+        "endpoint": name,
+        "cache": "cold" if reset is not None else "warm",
+        "requests": count,
+        "throughput_rps": round(count / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "bytes_written": None if written is None else after - written,
+        "journal_bytes": storage.bytes_written - journal,
+    }
+
+
+def run_size(size, requests, warmup, seed):
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    try:
+        os.chdir(workdir)
+        write_dataset('data', size, rng)
+        started = time.perf_counter()
+        import app
+        startup = time.perf_counter() - started
+        client = app.app.test_client()
+
+        def import_rows():
+            return {"items": [{"name": "%s %s" % (rng.choice(ITEM_WORDS), rng.choice(ITEM_KINDS)),
+                               "quantity": rng.randint(1, 100),
+                               "location": rng.choice(LOCATIONS)} for _ in range(100)]}
+
+        benchmarks = [
+            ("get_item", lambda: client.get('/api/inventory/%d' % rng.randint(1, size))),
+            ("search_items", lambda: client.get('/api/search?q=%s&limit=20' % rng.choice(ITEM_WORDS))),
+            ("get_placement_recommendations", lambda: client.post('/api/placement', json={
+                "item_type": rng.choice(ITEM_WORDS), "quantity": rng.randint(1, 50)})),
+            ("get_logs", lambda: client.get('/api/logs?action=%s&start_date=2025-%02d-01&limit=100' % (
+                rng.choice(ACTIONS), rng.randint(1, 12)))),
+            ("retrieve_item", lambda: client.post('/api/retrieve', json={
+                "item_id": rng.randint(1, size), "quantity": 1})),
+            ("import_items", lambda: client.post('/api/import/items', json=import_rows())),
+            ("simulate_day", lambda: client.post('/api/simulate/day', json={
+                "days": 1, "seed": rng.randint(0, 2 ** 31), "commit": False})),
+            ("export_arrangement", lambda: client.get('/api/export/arrangement')),
+        ]
+        results = []
+        for name, call in benchmarks:
+            count = max(1, requests // 10) if name in HEAVY_ENDPOINTS else requests
+            results.append(measure(app.storage, name, call, count, warmup, reset=app.response_cache.clear))
+            if name in CACHED_ENDPOINTS:
+                results.append(measure(app.storage, name, call, count, warmup))
+        return {"size": size, "startup_seconds": round(startup, 3), "results": results}
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help='comma-separated dataset sizes (items, containers and logs each)')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per endpoint')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    # Internal: run a single size in this process and print its result
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size is not None:
+        print(json.dumps(run_size(args.size, args.requests, args.warmup, args.seed)))
+        return
+
+    runs = []
+    for size in (int(s) for s in args.sizes.split(',') if s):
+        print("benchmarking %d records..." % size, file=sys.stderr)
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--size', str(size),
+                                    '--requests', str(args.requests), '--warmup', str(args.warmup),
+                                    '--seed', str(args.seed)],
+                                   capture_output=True, text=True)
+        if completed.returncode != 0:
+            sys.stderr.write(completed.stderr)
+            sys.exit(completed.returncode)
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "json_backend": serializers.BACKEND,
+        "seed": args.seed,
+        "requests": args.requests,
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import collections
+import os
+import threading
+
+# Most responses kept per worker, and most body bytes they may hold in total
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '1024'))
+RESPONSE_CACHE_BYTES = int(os.environ.get('RESPONSE_CACHE_BYTES', str(64 * 1024 * 1024)))
+
+
+class ResponseCache:
+    """Least recently used response bodies, each tagged with the revisions
+    of the collections it was built from.
+
+    An entry is served only while those revisions are unchanged, so a write
+    invalidates exactly the responses that read the collection it touched.
+    Hits and misses are counted per endpoint (the first element of the key).
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, max_bytes=RESPONSE_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = {}
+        self.misses = {}
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, revisions):
+        """The value stored under `key` for these revisions, or None."""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] != revisions:
+                self._drop(key)
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses[key[0]] = self.misses.get(key[0], 0) + 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits[key[0]] = self.hits.get(key[0], 0) + 1
+            return entry[1]
+
+    def put(self, key, revisions, value, size):
+        """Store `value`, taking `size` bytes, evicting the least recently used."""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (revisions, value, size)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self.entries),
+                "bytes": self.size,
+            }
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _drop(self, key):
+        self.size -= self.entries.pop(key)[2]
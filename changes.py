@@ -0,0 +1,67 @@
+import collections
+import os
+import threading
+
+import serializers
+
+# Transactions kept for delta sync; clients further behind must resync.
+CHANGE_FEED_SIZE = int(os.environ.get('CHANGE_FEED_SIZE', '10000'))
+
+
+class ChangeFeed:
+    """The most recent committed transactions, keyed by storage sequence.
+
+    Entries are the journal lines themselves, so they are immutable and
+    cheap to keep; they are decoded only when a client asks for them.
+    Register `append` as a storage listener.
+    """
+
+    def __init__(self, keys, size=CHANGE_FEED_SIZE):
+        # collection name -> key field, to report the key of put records
+        self.keys = keys
+        self.entries = collections.deque(maxlen=size)
+        self.latest = 0
+        self._cond = threading.Condition()
+
+    def append(self, sequence, line):
+        """Storage listener; `line` is None when a compacted journal starts at `sequence`."""
+        with self._cond:
+            # Reloading replays the journal again; keep the first copy.
+            if sequence <= self.latest:
+                return
+            if line is None or sequence != self.latest + 1:
+                # Transactions in between were compacted away before this
+                # process saw them, so older versions can no longer be served.
+                self.entries.clear()
+            if line is not None:
+                self.entries.append((sequence, line))
+            self.latest = sequence
+            self._cond.notify_all()
+
+    def since(self, version, limit=None):
+        """Changes after `version`, oldest first, or None if they are no longer kept."""
+        with self._cond:
+            if version == self.latest:
+                return []
+            first = self.entries[0][0] if self.entries else self.latest + 1
+            if version > self.latest or version < first - 1:
+                return None
+            selected = [entry for entry in self.entries if entry[0] > version]
+        if limit is not None:
+            selected = selected[:limit]
+        return [self.decode(sequence, line) for sequence, line in selected]
+
+    def wait(self, version, timeout):
+        """Block until a change after `version` is appended or `timeout` passes."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.latest > version, timeout)
+
+    def decode(self, sequence, line):
+        changes = []
+        for name, op, value in serializers.loads(line):
+            if op == 'put':
+                changes.append({"collection": name, "op": "put", "key": value.get(self.keys.get(name, 'id')),
+                                "record": value})
+            else:
+                changes.append({"collection": name, "op": "delete", "key": value})
+        return {"version": sequence, "changes": changes}
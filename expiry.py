@@ -0,0 +1,85 @@
+import bisect
+import datetime
+
+EXPIRING_SOON_DAYS = 30
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+class ExpiryIndex:
+    """Items sorted by expiry date, for range queries in O(log n + result).
+
+    Items without a parseable expiry_date are not indexed. Reports run
+    without the storage lock, so keys removed by a concurrent write are
+    skipped rather than looked up.
+    """
+
+    name = 'expiry'
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.dates = {}
+        self.records = {}
+        self.ordinals = []
+        self.keys = []
+
+    def add(self, key, record):
+        ordinal = parse_date(record.get('expiry_date'))
+        if key in self.dates and self.dates[key] == ordinal:
+            self.records[key] = record
+            return
+        self.remove(key)
+        if ordinal is None:
+            return
+        position = bisect.bisect_right(self.ordinals, ordinal)
+        self.ordinals.insert(position, ordinal)
+        self.keys.insert(position, key)
+        self.dates[key] = ordinal
+        self.records[key] = record
+
+    def remove(self, key):
+        ordinal = self.dates.pop(key, None)
+        self.records.pop(key, None)
+        if ordinal is None:
+            return
+        lo = bisect.bisect_left(self.ordinals, ordinal)
+        hi = bisect.bisect_right(self.ordinals, ordinal)
+        position = self.keys.index(key, lo, hi)
+        del self.ordinals[position]
+        del self.keys[position]
+
+    def between(self, after, until):
+        """Keys whose expiry ordinal lies in (after, until]; None is open."""
+        lo = 0 if after is None else bisect.bisect_right(self.ordinals, after)
+        hi = bisect.bisect_right(self.ordinals, until)
+        return self.keys[lo:hi]
+
+    def report(self, as_of, within=EXPIRING_SOON_DAYS):
+        """Expired items (expiry <= as_of) and those expiring within `within` days."""
+        as_of = as_of.toordinal()
+        entries = []
+        for key in self.between(None, as_of + within):
+            record = self.records.get(key)
+            ordinal = self.dates.get(key)
+            if record is None or ordinal is None or ordinal > as_of + within:
+                continue
+            days_left = ordinal - as_of
+            entry = {
+                "item_id": record['id'],
+                "name": record['name'],
+                "expiry_date": record['expiry_date'],
+            }
+            if days_left <= 0:
+                entry["status"] = "expired"
+            else:
+                entry["days_left"] = days_left
+                entry["status"] = "expiring_soon"
+            entries.append(entry)
+        return entries
@@ -0,0 +1,22 @@
+"""Production server settings: gunicorn -c gunicorn.conf.py app:app
+
+Every value can be overridden from the environment. Workers are separate
+processes sharing data/ through the journal (see README); each runs a pool
+of threads, since requests mostly wait on journal locks and fsync and
+change streams hold a thread for as long as the client stays connected.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', str(min(2 * multiprocessing.cpu_count() + 1, 9))))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+# Each worker loads the snapshots itself; loading them in the master and
+# forking would share one journal handle between processes.
+preload_app = False
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = 30
+keepalive = 5
+accesslog = os.environ.get('GUNICORN_ACCESSLOG')
+errorlog = '-'
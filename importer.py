@@ -0,0 +1,150 @@
+import csv
+import io
+
+from placement import DIMENSIONS, parse_dimensions
+import serializers
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+CSV_MIMETYPES = ('text/csv',)
+
+
+def read_rows(req, key):
+    """Return an iterator of (row_number, row, error) for an import request.
+
+    JSON bodies carry the rows under `key`; NDJSON and CSV bodies are read
+    line by line from the request stream so large manifests are never
+    buffered whole. Returns None when a JSON body lacks `key`. Iterating a
+    CSV body that is not UTF-8 raises ValueError.
+    """
+    if req.mimetype in NDJSON_MIMETYPES:
+        return _ndjson_rows(req.stream)
+    if req.mimetype in CSV_MIMETYPES:
+        return _csv_rows(req.stream)
+    data = req.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get(key), list):
+        return None
+    return ((number, row, None) for number, row in enumerate(data[key], 1))
+
+
+def _ndjson_rows(stream):
+    number = 0
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        number += 1
+        try:
+            yield number, serializers.loads(line), None
+        except ValueError:
+            yield number, None, "Invalid JSON"
+
+
+def _csv_rows(stream):
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+    try:
+        for number, row in enumerate(reader, 1):
+            # Empty cells behave like missing fields so defaults still apply.
+            yield number, {k: v for k, v in row.items() if k and v not in (None, '')}, None
+    except UnicodeDecodeError:
+        raise ValueError("CSV body must be UTF-8 text")
+
+
+def _field_error(row, fields):
+    """Error for the first of `fields` present in `row` that is not text."""
+    for field in fields:
+        if field in row and not isinstance(row[field], str):
+            return f"{field} must be a string"
+    return None
+
+
+def validate_rows(rows, validate):
+    valid = []
+    errors = []
+    for number, row, error in rows:
+        if error is None:
+            fields, error = validate(row)
+        if error is not None:
+            errors.append({"row": number, "error": error})
+        else:
+            valid.append(fields)
+    return valid, errors
+
+
+def validate_item(row):
+    if not isinstance(row, dict):
+        return None, "Row must be an object"
+    for field in ("name", "quantity"):
+        if field not in row:
+            return None, f"Missing required field: {field}"
+    error = _field_error(row, ("name", "location"))
+    if error is not None:
+        return None, error
+    if not isinstance(row.get('expiry_date') or '', str):
+        return None, "expiry_date must be a date string"
+    quantity = _to_int(row['quantity'])
+    if quantity is None or quantity < 0:
+        return None, "Invalid quantity"
+    container_id = row.get('container_id')
+    if container_id is not None:
+        container_id = _to_int(container_id)
+        if container_id is None or container_id < 1:
+            return None, "Invalid container_id"
+    try:
+        dimensions = parse_dimensions(row)
+    except ValueError as e:
+        return None, str(e)
+    fields = {
+        "name": row['name'],
+        "quantity": quantity,
+        "location": row.get('location', 'Receiving Bay'),
+        "expiry_date": row.get('expiry_date', ''),
+        "container_id": container_id
+    }
+    if dimensions is not None:
+        fields.update(zip(DIMENSIONS, dimensions))
+    return fields, None
+
+
+def validate_container(row):
+    if not isinstance(row, dict):
+        return None, "Row must be an object"
+    for field in ("name", "capacity"):
+        if field not in row:
+            return None, f"Missing required field: {field}"
+    error = _field_error(row, ("name", "location"))
+    if error is not None:
+        return None, error
+    capacity = _to_int(row['capacity'])
+    if capacity is None or capacity < 0:
+        return None, "Invalid capacity"
+    current_fill = _to_int(row.get('current_fill', 0))
+    if current_fill is None or current_fill < 0:
+        return None, "Invalid current_fill"
+    try:
+        dimensions = parse_dimensions(row)
+    except ValueError as e:
+        return None, str(e)
+    fields = {
+        "name": row['name'],
+        "capacity": capacity,
+        "current_fill": current_fill,
+        "location": row.get('location', 'Receiving Bay')
+    }
+    if dimensions is not None:
+        fields.update(zip(DIMENSIONS, dimensions))
+    return fields, None
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            return None
+    return None
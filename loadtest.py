@@ -0,0 +1,205 @@
+"""Load-test the API under concurrent HTTP clients, one server setup at a time.
+
+    python loadtest.py --setups dev,gunicorn,gunicorn-async --clients 32 --duration 20 --output load.json
+
+Each setup starts a real server on a fresh copy of the same synthetic
+dataset (see benchmark.py) and is driven by --clients threads over
+keep-alive connections for --duration seconds, with --write-ratio of the
+requests being retrieves and the rest reads. Setups:
+
+    dev             python app.py (Flask's development server)
+    gunicorn        gunicorn -c gunicorn.conf.py app:app
+    gunicorn-async  the same with DURABILITY=async
+
+The JSON report gives throughput, errors and p50/p99 latency per setup and
+per request kind, so runs can be compared across commits.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmark import ACTIONS, ITEM_WORDS, git_commit, percentile, write_dataset
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+SETUPS = {
+    "dev": ([sys.executable, os.path.join(ROOT, 'app.py')], {}),
+    "gunicorn": ([sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+                  '--pythonpath', ROOT, 'app:app'], {}),
+    "gunicorn-async": ([sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+                        '--pythonpath', ROOT, 'app:app'], {"DURABILITY": "async"}),
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited with status %d" % process.returncode)
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/api/stats')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start within %d seconds" % timeout)
+
+
+def request_mix(size, write_ratio, rng):
+    """Return (kind, method, path, body) for one randomly chosen request."""
+    if rng.random() < write_ratio:
+        return "retrieve_item", 'POST', '/api/retrieve', {"item_id": rng.randint(1, size), "quantity": 1}
+    kind = rng.choice(("get_item", "search_items", "get_inventory_page", "get_logs"))
+    if kind == "get_item":
+        return kind, 'GET', '/api/inventory/%d' % rng.randint(1, size), None
+    if kind == "search_items":
+        return kind, 'GET', '/api/search?q=%s&limit=20' % rng.choice(ITEM_WORDS), None
+    if kind == "get_inventory_page":
+        return kind, 'GET', '/api/inventory?sort=expiry&limit=50', None
+    return kind, 'GET', '/api/logs?action=%s&limit=100' % rng.choice(ACTIONS), None
+
+
+def client(port, size, write_ratio, seed, stop, samples):
+    rng = random.Random(seed)
+    connection = None
+    while not stop.is_set():
+        kind, method, path, body = request_mix(size, write_ratio, rng)
+        started = time.perf_counter()
+        try:
+            if connection is None:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            payload = json.dumps(body) if body is not None else None
+            connection.request(method, path, body=payload,
+                               headers={'Content-Type': 'application/json'} if payload else {})
+            response = connection.getresponse()
+            response.read()
+            ok = response.status < 400
+            # The development server speaks HTTP/1.0 and closes every connection
+            if response.will_close:
+                connection.close()
+                connection = None
+        except OSError:
+            ok = False
+            connection = None
+        samples.append((kind, time.perf_counter() - started, ok))
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for _, latency, _ in samples)
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+    }
+
+
+def run_setup(name, args):
+    command, env = SETUPS[name]
+    workdir = tempfile.mkdtemp(prefix='load-')
+    port = free_port()
+    process = None
+    try:
+        write_dataset(os.path.join(workdir, 'data'), args.size, random.Random(args.seed))
+        environ = dict(os.environ, PORT=str(port), BIND='127.0.0.1:%d' % port, **env)
+        process = subprocess.Popen(command, cwd=workdir, env=environ,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wait_ready(port, process)
+
+        stop = threading.Event()
+        samples = []
+        threads = [threading.Thread(target=client, args=(port, args.size, args.write_ratio,
+                                                         args.seed + n, stop, samples))
+                   for n in range(args.clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        by_kind = {}
+        for sample in samples:
+            by_kind.setdefault(sample[0], []).append(sample)
+        return {
+            "setup": name,
+            **summarize(samples, elapsed),
+            "endpoints": {kind: summarize(kind_samples, elapsed) for kind, kind_samples in sorted(by_kind.items())},
+        }
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--setups', default='dev,gunicorn,gunicorn-async',
+                        help='comma-separated server setups: %s' % ', '.join(SETUPS))
+    parser.add_argument('--size', type=int, default=10000,
+                        help='items, containers and log entries in the dataset')
+    parser.add_argument('--clients', type=int, default=32, help='concurrent client connections')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load per setup')
+    parser.add_argument('--write-ratio', type=float, default=0.1, help='fraction of requests that write')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    setups = [s for s in args.setups.split(',') if s]
+    unknown = [s for s in setups if s not in SETUPS]
+    if unknown:
+        parser.error("unknown setups: %s" % ', '.join(unknown))
+
+    runs = []
+    for name in setups:
+        print("load testing %s..." % name, file=sys.stderr)
+        runs.append(run_setup(name, args))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "size": args.size,
+        "clients": args.clients,
+        "duration_seconds": args.duration,
+        "write_ratio": args.write_ratio,
+        "seed": args.seed,
+        "runs": runs,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,609 @@
+import bisect
+import datetime
+import functools
+import gzip
+import heapq
+import mmap
+import os
+import time
+from operator import itemgetter
+
+import numpy as np
+
+import serializers
+from store import Table, decode_cursor, encode_cursor
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# One fixed-size row per sealed log: where its JSON line lives in the data
+# file plus the fields queries filter on, with action and user interned.
+INDEX_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('seq', '<i8'),
+    ('offset', '<i8'),
+    ('length', '<u4'),
+    ('action', '<i4'),
+    ('user', '<i4'),
+])
+
+# Rows scanned per step when filtering a sealed range by action or user.
+SCAN_CHUNK = 4096
+
+# Archives compress their records in independent gzip members of this many
+# rows, so a page only decompresses the members it reads, and keep the
+# decoded indexes of this many archives in memory.
+ARCHIVE_CHUNK_ROWS = 1024
+ARCHIVE_INDEX_CACHE = int(os.environ.get('LOG_ARCHIVE_INDEX_CACHE', '16'))
+
+# The live segment is rolled into a gzip archive once it holds this many
+# logs or spans this many days. Archives whose newest log is older than
+# LOG_RETENTION_DAYS, or beyond the newest LOG_MAX_ARCHIVES, are deleted;
+# 0 keeps them forever.
+LOG_SEGMENT_RECORDS = int(os.environ.get('LOG_SEGMENT_RECORDS', '100000'))
+LOG_SEGMENT_DAYS = int(os.environ.get('LOG_SEGMENT_DAYS', '30'))
+LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', '0'))
+LOG_MAX_ARCHIVES = int(os.environ.get('LOG_MAX_ARCHIVES', '0'))
+
+DAY = 86400 * 1000000
+
+
+def parse_timestamp(value):
+    """Parse an ISO-8601 timestamp into epoch microseconds, assuming UTC if naive."""
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return (parsed - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def log_timestamp(entry):
+    try:
+        return parse_timestamp(entry['timestamp'])
+    except (KeyError, TypeError, ValueError):
+        return 0
+
+
+def _filter_codes(action, user, action_codes, user_codes):
+    """Interned codes to match, or None if a value never occurs at all."""
+    codes = {}
+    for field, value, table in (('action', action, action_codes), ('user', user, user_codes)):
+        if value is not None:
+            if value not in table:
+                return None
+            codes[field] = table[value]
+    return codes
+
+
+def _matching_rows(index, codes, start, end, after, row_id):
+    """Yield index rows in [start, end] after the cursor, in chunks.
+
+    Rows sharing the cursor's timestamp are ordered by log id, which
+    `row_id(row)` reads from the record; there are rarely more than a few.
+    """
+    ts = index['ts']
+    lo = 0 if start is None else int(np.searchsorted(ts, start, 'left'))
+    hi = len(index) if end is None else int(np.searchsorted(ts, end, 'right'))
+    if after is not None:
+        after_ts, after_id = after
+        position = int(np.searchsorted(ts, after_ts, 'left'))
+        same_hi = int(np.searchsorted(ts, after_ts, 'right'))
+        while position < same_hi and row_id(index[position]) <= after_id:
+            position += 1
+        lo = max(lo, position)
+
+    for chunk_start in range(lo, hi, SCAN_CHUNK):
+        rows = index[chunk_start:min(hi, chunk_start + SCAN_CHUNK)]
+        if codes:
+            mask = np.ones(len(rows), dtype=bool)
+            for field, code in codes.items():
+                mask &= rows[field] == code
+            rows = rows[mask]
+        yield rows
+
+
+def _write_file(path, chunks, compress=False):
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as raw:
+        f = gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) if compress else raw
+        for chunk in chunks:
+            f.write(chunk)
+        if compress:
+            f.close()
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+
+
+class Segment:
+    """Sealed logs: a file of JSON lines plus a sorted, memory-mapped row index.
+
+    Rows are ordered by (ts, id), the same order as the tail, so cursors
+    stay valid when logs are sealed; records are read from the data file
+    only when a query returns them. `seq` numbers rows in the order they
+    were sealed. The manifest names the index file, since re-sorting it
+    writes a new one.
+    """
+
+    def __init__(self, base, manifest=None):
+        manifest = manifest or {}
+        self.base = base
+        self.data_path = base + '.ndjson'
+        self.index_path = os.path.join(os.path.dirname(base), manifest.get('index', os.path.basename(base) + '.idx'))
+        self.count = manifest.get('count', 0)
+        self.data_length = manifest.get('data_length', 0)
+        self.next_seq = manifest.get('next_seq', 0)
+        self.actions = manifest.get('actions', [])
+        self.users = manifest.get('users', [])
+        self.action_codes = {value: code for code, value in enumerate(self.actions)}
+        self.user_codes = {value: code for code, value in enumerate(self.users)}
+        self.index = np.zeros(0, dtype=INDEX_DTYPE)
+        self.data = b''
+        if self.count:
+            self.index = np.memmap(self.index_path, dtype=INDEX_DTYPE, mode='r', shape=(self.count,))
+        if self.data_length:
+            with open(self.data_path, 'rb') as f:
+                self.data = mmap.mmap(f.fileno(), self.data_length, access=mmap.ACCESS_READ)
+
+    def record(self, row):
+        offset = int(row['offset'])
+        return serializers.loads(self.data[offset:offset + int(row['length'])])
+
+    def row_id(self, row):
+        return str(self.record(row).get('id'))
+
+    def first_ts(self):
+        return int(self.index['ts'][0]) if self.count else None
+
+    def last_ts(self):
+        return int(self.index['ts'][-1]) if self.count else None
+
+    def scan(self, start=None, end=None, action=None, user=None, after=None):
+        """Yield (sort_key, record) in order for rows matching every filter."""
+        codes = _filter_codes(action, user, self.action_codes, self.user_codes)
+        if not self.count or codes is None:
+            return
+        for rows in _matching_rows(self.index, codes, start, end, after, self.row_id):
+            for row in rows:
+                record = self.record(row)
+                yield (int(row['ts']), str(record.get('id'))), record
+
+    def append(self, entries, tmp_suffix):
+        """Seal `entries` (already in (ts, id) order) and return the new manifest."""
+        rows = np.zeros(len(entries), dtype=INDEX_DTYPE)
+        actions = list(self.actions)
+        users = list(self.users)
+        action_codes = dict(self.action_codes)
+        user_codes = dict(self.user_codes)
+        with open(self.data_path, 'ab') as f:
+            # Drop bytes past the manifest left by an interrupted seal.
+            f.truncate(self.data_length)
+            offset = self.data_length
+            for position, (timestamp, entry) in enumerate(entries):
+                line = serializers.dumps(entry)
+                f.write(line + b'\n')
+                for field, value, table, values in (('action', entry.get('action'), action_codes, actions),
+                                                    ('user', entry.get('user'), user_codes, users)):
+                    if value not in table:
+                        table[value] = len(values)
+                        values.append(value)
+                    rows[position][field] = table[value]
+                rows[position]['ts'] = timestamp
+                rows[position]['seq'] = self.next_seq + position
+                rows[position]['offset'] = offset
+                rows[position]['length'] = len(line)
+                offset += len(line) + 1
+            f.flush()
+            os.fsync(f.fileno())
+
+        count = self.count + len(entries)
+        next_seq = self.next_seq + len(entries)
+        index_path = self.index_path
+        first = (int(rows['ts'][0]), str(entries[0][1].get('id'))) if len(entries) else None
+        if self.count and first is not None and first <= (self.last_ts(), self.row_id(self.index[-1])):
+            # Out-of-order logs: merge the overlapping rows in (ts, id) order
+            # into a new index file, which the manifest switches to, so a
+            # crash before then leaves the old index in place.
+            split = int(np.searchsorted(self.index['ts'], first[0], 'left'))
+            keys = [(int(row['ts']), self.row_id(row)) for row in self.index[split:]]
+            keys += [(int(timestamp), str(entry.get('id'))) for timestamp, entry in entries]
+            tail = np.concatenate([np.asarray(self.index[split:]), rows])
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            merged = np.concatenate([np.asarray(self.index[:split]), tail[order]])
+            index_path = '%s.%d.idx' % (self.base, next_seq)
+            _write_file(index_path, [merged.tobytes()])
+        else:
+            with open(self.index_path, 'ab') as f:
+                f.truncate(self.count * INDEX_DTYPE.itemsize)
+                f.write(rows.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        return {
+            "count": count,
+            "data_length": offset,
+            "next_seq": next_seq,
+            "index": os.path.basename(index_path),
+            "actions": actions,
+            "users": users,
+        }
+
+    def archive(self, name, directory):
+        """Write this segment as a gzip archive named `name`; returns its manifest entry.
+
+        Records are written in index order, ARCHIVE_CHUNK_ROWS per gzip
+        member; offsets in the archived index point into the decompressed
+        data and `chunks` lists where each member starts, as
+        [compressed offset, decompressed offset]. The members together are
+        still one valid gzip file.
+        """
+        rows = np.array(self.index)
+        chunks = []
+
+        def members():
+            compressed = offset = 0
+            for first in range(0, self.count, ARCHIVE_CHUNK_ROWS):
+                lines = []
+                chunks.append([compressed, offset])
+                for position in range(first, min(self.count, first + ARCHIVE_CHUNK_ROWS)):
+                    row = self.index[position]
+                    line = self.data[int(row['offset']):int(row['offset']) + int(row['length'])]
+                    lines.append(line + b'\n')
+                    rows[position]['offset'] = offset
+                    offset += len(line) + 1
+                member = gzip.compress(b''.join(lines), mtime=0)
+                compressed += len(member)
+                yield member
+
+        _write_file(os.path.join(directory, name + '.ndjson.gz'), members())
+        _write_file(os.path.join(directory, name + '.idx.gz'), [rows.tobytes()], compress=True)
+        return {
+            "name": name,
+            "chunks": chunks,
+            "count": self.count,
+            "first_ts": self.first_ts(),
+            "last_ts": self.last_ts(),
+            "actions": self.actions,
+            "users": self.users,
+        }
+
+
+@functools.lru_cache(maxsize=ARCHIVE_INDEX_CACHE)
+def _archive_index(path):
+    # Archive files are never rewritten under the same name, so a decoded
+    # index stays valid for as long as it is cached
+    with gzip.open(path, 'rb') as f:
+        return np.frombuffer(f.read(), dtype=INDEX_DTYPE)
+
+
+class _ArchiveReader:
+    """Reads records of an archive by decompressed offset.
+
+    With a chunk table only the gzip member holding a record is read and
+    decompressed. Archives written without one are a single gzip stream,
+    which is read forward; seeking back would restart it, so the last
+    record read is kept for the cursor check that reads it twice.
+    """
+
+    def __init__(self, path, chunks):
+        self.chunks = chunks
+        if chunks:
+            self.file = open(path, 'rb')
+            self.starts = [chunk[1] for chunk in chunks]
+            self.ends = [chunk[0] for chunk in chunks[1:]] + [None]
+        else:
+            self.file = gzip.open(path, 'rb')
+        self.chunk = None
+        self.data = b''
+        self.last = (None, None)
+
+    def read(self, offset, length):
+        if not self.chunks:
+            if self.last[0] != offset:
+                self.file.seek(offset)
+                self.last = (offset, self.file.read(length))
+            return self.last[1]
+        chunk = bisect.bisect_right(self.starts, offset) - 1
+        if chunk != self.chunk:
+            begin, end = self.chunks[chunk][0], self.ends[chunk]
+            self.file.seek(begin)
+            self.data = gzip.decompress(self.file.read(-1 if end is None else end - begin))
+            self.chunk = chunk
+        start = offset - self.starts[chunk]
+        return self.data[start:start + length]
+
+    def close(self):
+        self.file.close()
+
+
+class Archive:
+    """A read-only, gzip-compressed segment that was rolled over.
+
+    Only its manifest entry is kept in memory, plus its decoded index while
+    it is among the recently queried; queries skip archives outside the
+    requested time range and read the rest from disk a chunk at a time.
+    """
+
+    def __init__(self, directory, entry):
+        self.entry = entry
+        self.name = entry['name']
+        self.count = entry['count']
+        self.first_ts = entry['first_ts']
+        self.last_ts = entry['last_ts']
+        self.data_path = os.path.join(directory, self.name + '.ndjson.gz')
+        self.index_path = os.path.join(directory, self.name + '.idx.gz')
+        self.chunks = entry.get('chunks')
+        self.action_codes = {value: code for code, value in enumerate(entry['actions'])}
+        self.user_codes = {value: code for code, value in enumerate(entry['users'])}
+
+    def scan(self, start=None, end=None, action=None, user=None, after=None):
+        if (start is not None and self.last_ts < start) or \
+                (end is not None and self.first_ts > end) or \
+                (after is not None and self.last_ts < after[0]):
+            return
+        codes = _filter_codes(action, user, self.action_codes, self.user_codes)
+        if codes is None:
+            return
+        index = _archive_index(self.index_path)
+        reader = _ArchiveReader(self.data_path, self.chunks)
+        try:
+            def record(row):
+                return serializers.loads(reader.read(int(row['offset']), int(row['length'])))
+
+            def row_id(row):
+                return str(record(row).get('id'))
+
+            for rows in _matching_rows(index, codes, start, end, after, row_id):
+                for row in rows:
+                    entry = record(row)
+                    yield (int(row['ts']), str(entry.get('id'))), entry
+        finally:
+            reader.close()
+
+
+class _Run:
+    """Live log entries kept sorted by (ts, id)."""
+
+    def __init__(self):
+        self.times = []
+        self.keys = []
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def insert(self, sort_key, entry):
+        if not self.keys or sort_key > self.keys[-1]:
+            position = len(self.keys)
+        else:
+            position = bisect.bisect_left(self.keys, sort_key)
+        self.times.insert(position, sort_key[0])
+        self.keys.insert(position, sort_key)
+        self.entries.insert(position, entry)
+
+    def remove(self, sort_key):
+        position = bisect.bisect_left(self.keys, sort_key)
+        if position < len(self.keys) and self.keys[position] == sort_key:
+            del self.times[position]
+            del self.keys[position]
+            del self.entries[position]
+
+    def scan(self, start=None, end=None, action=None, user=None, after=None):
+        lo = 0 if start is None else bisect.bisect_left(self.times, start)
+        hi = len(self.times) if end is None else bisect.bisect_right(self.times, end)
+        if after is not None:
+            lo = max(lo, bisect.bisect_right(self.keys, tuple(after)))
+        for position in range(lo, hi):
+            entry = self.entries[position]
+            if action is not None and entry.get('action') != action:
+                continue
+            if user is not None and entry.get('user') != user:
+                continue
+            yield self.keys[position], entry
+
+
+class LogTable(Table):
+    """Logs split into archives, a sealed live segment and a small in-memory tail.
+
+    Logs committed since the last compaction live in the tail, sorted by
+    time with per-action and per-user runs. Compaction appends the tail to
+    the live segment instead of rewriting history, so startup and memory only
+    depend on the tail, and rolls a full live segment into a compressed
+    archive. `path` names the legacy logs.json snapshot, which is migrated
+    into the segment on first start.
+    """
+
+    def __init__(self, name, path, key='id', indexes=(), record_type=None):
+        self.directory = os.path.dirname(path)
+        self.stem = os.path.splitext(os.path.basename(path))[0]
+        self.manifest_path = os.path.join(self.directory, self.stem + '.manifest.json')
+        self.live = self.stem
+        self.segment = self._segment()
+        self.archives = []
+        self.sealed_position = (0, 0)
+        self._reset_tail()
+        super().__init__(name, path, key=key, indexes=indexes, record_type=record_type)
+
+    def _reset_tail(self):
+        self.timeline = _Run()
+        self.by_action = {}
+        self.by_user = {}
+        self.sort_keys = {}
+
+    def __len__(self):
+        return sum(archive.count for archive in self.archives) + self.segment.count + len(self.records)
+
+    def __iter__(self):
+        return (entry for _, entry in self._merged())
+
+    def reset(self):
+        super().reset()
+        self._reset_tail()
+
+    def apply(self, op, value):
+        if op == 'put':
+            value = self.coerce(value)
+            key = value[self.key]
+            self._unindex(key)
+            sort_key = (log_timestamp(value), str(key))
+            self.sort_keys[key] = sort_key
+            self.timeline.insert(sort_key, value)
+            self.by_action.setdefault(value.get('action'), _Run()).insert(sort_key, value)
+            self.by_user.setdefault(value.get('user'), _Run()).insert(sort_key, value)
+        elif op == 'del':
+            self._unindex(value)
+        super().apply(op, value)
+
+    def _unindex(self, key):
+        sort_key = self.sort_keys.pop(key, None)
+        if sort_key is None:
+            return
+        entry = self.records[key]
+        self.timeline.remove(sort_key)
+        self.by_action[entry.get('action')].remove(sort_key)
+        self.by_user[entry.get('user')].remove(sort_key)
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def create(self, default_func):
+        # Migrate a logs.json snapshot written before logs were segmented.
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                records = serializers.loads(f.read())
+        else:
+            records = default_func()
+        self.live = self.stem
+        self.segment = self._segment()
+        self.archives = []
+        self.records = {}
+        self._reset_tail()
+        for record in records:
+            self.apply('put', record)
+        self.write_snapshot((0, 0))
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def read_snapshot(self):
+        with open(self.manifest_path, 'rb') as f:
+            manifest = serializers.loads(f.read())
+        self.sealed_position = tuple(manifest.get('sealed_position', (0, 0)))
+        self.live = manifest.get('live', self.stem)
+        self.segment = self._segment(manifest)
+        self.archives = [Archive(self.directory, entry) for entry in manifest.get('archives', [])]
+        return []
+
+    def write_snapshot(self, position):
+        entries = [(key[0], entry) for key, entry in zip(self.timeline.keys, self.timeline.entries)]
+        manifest = self.segment.append(entries, '.%d.tmp' % os.getpid())
+        segment = self._segment(manifest)
+        archives = [archive.entry for archive in self.archives]
+        stale = []
+        if segment.index_path != self.segment.index_path:
+            # Out-of-order logs were merged into a new index file
+            stale.append(self.segment.index_path)
+        if segment.count and (segment.count >= LOG_SEGMENT_RECORDS or
+                              segment.last_ts() - segment.first_ts() >= LOG_SEGMENT_DAYS * DAY):
+            # Roll over into a fresh live segment under a new name, so readers
+            # still mapping the old files are never cut short.
+            name = '%s.%d-%d' % (self.stem, segment.index['seq'].min(), segment.index['seq'].max())
+            archives.append(segment.archive(name, self.directory))
+            stale += [segment.data_path, segment.index_path]
+            self.live = '%s.%d' % (self.stem, manifest['next_seq'])
+            manifest = {"next_seq": manifest['next_seq']}
+
+        archives, expired = self._retain(archives)
+        for entry in expired:
+            stale += [os.path.join(self.directory, entry['name'] + suffix) for suffix in ('.ndjson.gz', '.idx.gz')]
+
+        manifest['live'] = self.live
+        manifest['archives'] = archives
+        manifest['sealed_position'] = list(position)
+        tmp_path = '%s.%d.tmp' % (self.manifest_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(serializers.dumps(manifest))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        for path in stale:
+            if os.path.exists(path):
+                os.remove(path)
+        self.sealed_position = tuple(position)
+        self.segment = self._segment(manifest)
+        self.archives = [Archive(self.directory, entry) for entry in archives]
+        # Everything in the tail is sealed now.
+        self.records = {}
+        self._reset_tail()
+        # The tail moved into the segment and retention may have dropped archives
+        self.revision += 1
+
+    def _segment(self, manifest=None):
+        base = os.path.join(self.directory, self.live)
+        return Segment(base, manifest)
+
+    def _retain(self, archives):
+        """Split archive entries into (kept, expired) under the retention policy."""
+        kept = archives
+        if LOG_RETENTION_DAYS:
+            cutoff = int(time.time() * 1000000) - LOG_RETENTION_DAYS * DAY
+            kept = [entry for entry in kept if entry['last_ts'] >= cutoff]
+        if LOG_MAX_ARCHIVES:
+            kept = sorted(kept, key=itemgetter('last_ts'))[-LOG_MAX_ARCHIVES:]
+        names = {entry['name'] for entry in kept}
+        return kept, [entry for entry in archives if entry['name'] not in names]
+
+    def _merged(self, start=None, end=None, action=None, user=None, after=None):
+        runs = []
+        if action is not None:
+            runs.append(self.by_action.get(action, _Run()))
+        if user is not None:
+            runs.append(self.by_user.get(user, _Run()))
+        # Walk the smallest live run and check the remaining filter per entry.
+        run = min(runs, key=len) if runs else self.timeline
+        scans = [self._archived(start, end, action, user, after)]
+        scans.append(self.segment.scan(start, end, action, user, after))
+        scans.append(run.scan(start, end, action, user, after))
+        return heapq.merge(*scans, key=itemgetter(0))
+
+    def _archived(self, start, end, action, user, after):
+        """Yield matching archived logs in order, opening each archive only when reached.
+
+        Archives are rolled in time order, so they are chained by first_ts
+        and only those whose time ranges overlap are merged with each other;
+        a query that stops early never opens the later ones.
+        """
+        group = []
+        group_end = None
+        for archive in sorted(self.archives, key=lambda archive: (archive.first_ts, archive.last_ts)):
+            if group and archive.first_ts > group_end:
+                yield from self._merge_archives(group, start, end, action, user, after)
+                group = []
+            group_end = archive.last_ts if not group else max(group_end, archive.last_ts)
+            group.append(archive)
+        if group:
+            yield from self._merge_archives(group, start, end, action, user, after)
+
+    def _merge_archives(self, archives, start, end, action, user, after):
+        scans = [archive.scan(start, end, action, user, after) for archive in archives]
+        return scans[0] if len(scans) == 1 else heapq.merge(*scans, key=itemgetter(0))
+
+    def query(self, start=None, end=None, action=None, user=None, after=None, limit=None):
+        """Return (entries, next_cursor) for logs matching every given filter.
+
+        `start` and `end` are epoch microseconds. `after` is the cursor
+        returned with the previous page; next_cursor is None once the final
+        page has been returned. Raises ValueError for a malformed cursor.
+        """
+        if after:
+            after = decode_cursor(after, length=2)
+            timestamp, tiebreak = after
+            if not isinstance(timestamp, int) or isinstance(timestamp, bool) or not isinstance(tiebreak, str):
+                raise ValueError("Invalid cursor")
+        else:
+            after = None
+        results = []
+        last_key = None
+        for sort_key, entry in self._merged(start, end, action, user, after):
+            if limit is not None and len(results) == limit:
+                return results, encode_cursor(last_key)
+            results.append(entry)
+            last_key = sort_key
+        return results, None
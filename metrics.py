@@ -0,0 +1,188 @@
+import cProfile
+import collections
+import datetime
+import io
+import pstats
+import random
+import threading
+
+# Upper bounds, in seconds, of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Upper bounds of the records-scanned-per-request histogram buckets.
+SCAN_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for _, v in pairs)
+    return '{' + ','.join('%s="%s"' % (name, value) for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self.values)
+        suffix = '_total' if self.kind == 'counter' else ''
+        for label_values, value in sorted(values.items()):
+            yield self.name + suffix, _format_labels(self.labels, label_values), value
+
+
+class Gauge(Counter):
+    """A value read at scrape time from `func`, which returns a number or
+    a {label_values: number} dict."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, func, labels=()):
+        super().__init__(name, help, labels)
+        self.func = func
+
+    def samples(self):
+        values = self.func()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labels, label_values), value
+
+
+class SampledCounter(Gauge):
+    """A counter kept elsewhere (e.g. on Storage) and read at scrape time."""
+
+    kind = 'counter'
+
+    def samples(self):
+        for name, labels, value in super().samples():
+            yield name + '_total', labels, value
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = [[0] * len(self.buckets), 0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][position] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self.values.items()}
+        for label_values, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield (self.name + '_bucket',
+                       _format_labels(self.labels, label_values, [('le', _format_value(float(bound)))]),
+                       cumulative)
+            yield self.name + '_sum', _format_labels(self.labels, label_values), total
+            yield self.name + '_count', _format_labels(self.labels, label_values), count
+
+
+class Registry:
+    """Metrics rendered together in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+            for name, labels, value in metric.samples():
+                lines.append('%s%s %s' % (name, labels, _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class Profiler:
+    """Samples cProfile output for slow requests.
+
+    A `sample_rate` fraction of requests runs under cProfile, one at a time;
+    those taking at least `slow_seconds` keep their top functions by
+    cumulative time in a ring of the last `keep` reports.
+    """
+
+    def __init__(self, slow_seconds=None, sample_rate=0.1, keep=20, top=30):
+        self.slow_seconds = slow_seconds
+        self.sample_rate = sample_rate
+        self.top = top
+        self.reports = collections.deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.slow_seconds is not None
+
+    def start(self):
+        """Return a running profile for this request, or None if not sampled."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        # cProfile cannot profile two threads of one process at once.
+        if not self._lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            self._lock.release()
+            return None
+        return profile
+
+    def finish(self, profile, elapsed, endpoint):
+        profile.disable()
+        self._lock.release()
+        if elapsed < self.slow_seconds:
+            return
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(self.top)
+        self.reports.append({
+            "endpoint": endpoint,
+            "duration_ms": round(elapsed * 1000, 3),
+            "time": datetime.datetime.utcnow().isoformat() + "Z",
+            "profile": out.getvalue(),
+        })
@@ -0,0 +1,102 @@
+import copy
+
+from placement import box_of, dimensions_of
+
+
+class Changeset:
+    """Retrieve and place operations applied to working copies of records.
+
+    Nothing is stored until the caller saves `items`, `containers` and
+    `logs`, so a group of operations can be checked as a whole and then
+    committed together or not at all. Later operations see the effect of
+    earlier ones on the same item or container.
+
+    With a placement engine, items with dimensions placed into a container
+    with dimensions are given a 3D position, and refused if they do not fit.
+    """
+
+    def __init__(self, inventory, containers, placement=None):
+        self.inventory = inventory
+        self.all_containers = containers
+        self.placement = placement
+        self.items = {}
+        self.containers = {}
+        self.logs = []
+
+    def item(self, item_id):
+        if item_id not in self.items:
+            record = self.inventory.get(item_id)
+            if record is None:
+                return None
+            self.items[item_id] = copy.deepcopy(record)
+        return self.items[item_id]
+
+    def container(self, container_id):
+        if container_id not in self.containers:
+            record = self.all_containers.get(container_id)
+            if record is None:
+                return None
+            self.containers[container_id] = copy.deepcopy(record)
+        return self.containers[container_id]
+
+    def retrieve(self, item_id, quantity, user):
+        """Returns (result, error, status); on error nothing is changed."""
+        item = self.item(item_id)
+        if not item:
+            return None, "Item not found", 404
+        if item['quantity'] < quantity:
+            return None, "Insufficient quantity available", 400
+
+        item['quantity'] -= quantity
+        if item['container_id']:
+            container = self.container(item['container_id'])
+            if container:
+                container['current_fill'] -= quantity
+        self.logs.append(("Retrieve", item_id, -quantity, user))
+        return {
+            "item_id": item_id,
+            "name": item['name'],
+            "quantity_retrieved": quantity,
+            "remaining_quantity": item['quantity']
+        }, None, 200
+
+    def place(self, item_id, container_id, quantity, user):
+        """Returns (result, error, status); on error nothing is changed."""
+        item = self.item(item_id)
+        if not item:
+            return None, "Item not found", 404
+        container = self.container(container_id)
+        if not container:
+            return None, "Container not found", 404
+        if container['capacity'] - container['current_fill'] < quantity:
+            return None, "Container does not have enough space", 400
+
+        spot = None
+        if self.placement is not None and (item['container_id'] != container_id or box_of(item) is None):
+            # Boxes of items changed earlier in this changeset replace their saved ones
+            extra = [box_of(other) for key, other in self.items.items()
+                     if key != item_id and other['container_id'] == container_id and box_of(other) is not None]
+            spot = self.placement.fit(container, dimensions_of(item), exclude=self.items, extra=extra)
+            if spot is None:
+                return None, "Item does not fit in container", 400
+
+        item['quantity'] += quantity
+        item['container_id'] = container_id
+        item['location'] = container['location']
+        if spot is not None:
+            if spot[0] is None:
+                item.pop('position', None)
+            else:
+                item['position'] = spot[0]
+        container['current_fill'] += quantity
+        self.logs.append(("Place", item_id, quantity, user))
+        result = {
+            "item_id": item_id,
+            "name": item['name'],
+            "quantity_placed": quantity,
+            "container": container['name'],
+            "location": container['location']
+        }
+        if spot is not None and spot[0] is not None:
+            result["position"], result["retrieval_steps"] = spot
+        return result, None, 200
@@ -0,0 +1,380 @@
+import bisect
+import heapq
+import itertools
+
+import numpy as np
+
+SIMILAR_ITEM_BONUS = 20
+# Score lost for each item that would have to be moved to reach a placement
+RETRIEVAL_STEP_PENALTY = 5
+
+# Axes of container and item sizes and of positions. Depth 0 is a
+# container's open face, so items are retrieved along the depth axis.
+DIMENSIONS = ("width", "depth", "height")
+# Slack for float rounding when comparing coordinates
+EPSILON = 1e-9
+
+
+def parse_dimensions(data):
+    """(width, depth, height) from a request or import row, None if absent.
+
+    Raises ValueError unless all three are positive numbers.
+    """
+    if not any(data.get(axis) is not None for axis in DIMENSIONS):
+        return None
+    size = []
+    for axis in DIMENSIONS:
+        value = data.get(axis)
+        if isinstance(value, str):
+            try:
+                value = float(value.strip())
+            except ValueError:
+                value = None
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 < value < float('inf'):
+            raise ValueError("width, depth and height must all be positive numbers")
+        size.append(value)
+    return tuple(size)
+
+
+def dimensions_of(record):
+    """(width, depth, height) of a stored container or item, or None."""
+    try:
+        return parse_dimensions(record)
+    except ValueError:
+        return None
+
+
+def box_of(record):
+    """(x0, y0, z0, x1, y1, z1) of an item's `position`, or None."""
+    position = record.get('position')
+    if not isinstance(position, dict):
+        return None
+    try:
+        return tuple(position['start'][axis] for axis in DIMENSIONS) + \
+            tuple(position['end'][axis] for axis in DIMENSIONS)
+    except (KeyError, TypeError):
+        return None
+
+
+def position_of(box):
+    values = [int(v) if float(v).is_integer() else float(v) for v in box]
+    return {"start": dict(zip(DIMENSIONS, values[:3])), "end": dict(zip(DIMENSIONS, values[3:]))}
+
+
+def volume_of(box):
+    return (box[3] - box[0]) * (box[4] - box[1]) * (box[5] - box[2])
+
+
+def locate(size, dims, boxes):
+    """Best spot for a `dims` item in a container of `size` holding `boxes`.
+
+    Candidate corners are the container origin and the points just past
+    each placed box along every axis, tried with every orientation of the
+    item. The chosen spot has the fewest boxes in front of it, then the
+    least depth, height and width. Returns (box, retrieval_steps), or None
+    when the item fits nowhere.
+    """
+    boxes = np.asarray(list(boxes), dtype=float).reshape(-1, 6)
+    lows, highs = boxes[:, :3], boxes[:, 3:]
+    corners = np.zeros((1 + 3 * len(boxes), 3))
+    for axis in range(3):
+        block = corners[1 + axis * len(boxes):1 + (axis + 1) * len(boxes)]
+        block[:] = lows
+        block[:, axis] = highs[:, axis]
+    corners = np.unique(corners, axis=0)
+
+    best = None
+    # The item's own orientation first, so it wins ties against rotations
+    for orientation in dict.fromkeys(itertools.permutations(dims)):
+        starts = corners
+        ends = corners + np.asarray(orientation, dtype=float)
+        inside = (ends <= np.asarray(size, dtype=float) + EPSILON).all(axis=1)
+        starts, ends = starts[inside], ends[inside]
+        # overlap[c, b, axis]: corner c's box and placed box b share that axis' interval
+        overlap = (starts[:, None, :] < highs[None] - EPSILON) & (lows[None] < ends[:, None, :] - EPSILON)
+        free = ~overlap.all(axis=2).any(axis=1)
+        starts, ends, overlap = starts[free], ends[free], overlap[free]
+        if not len(starts):
+            continue
+        # Boxes nearer the open face whose width/height footprint covers the spot
+        in_front = (highs[None, :, 1] <= starts[:, None, 1] + EPSILON) & overlap[:, :, 0] & overlap[:, :, 2]
+        steps = in_front.sum(axis=1)
+        first = np.lexsort((starts[:, 0], starts[:, 2], starts[:, 1], steps))[0]
+        rank = (int(steps[first]), starts[first, 1], starts[first, 2], starts[first, 0])
+        if best is None or rank < best[0]:
+            best = (rank, tuple(starts[first]) + tuple(ends[first]))
+    if best is None:
+        return None
+    return best[1], best[0][0]
+
+
+class OccupancyIndex:
+    """Boxes taken by positioned items, grouped by container.
+
+    An inventory index: fitting an item into a container only looks at the
+    boxes of the items already in that container.
+    """
+
+    name = 'occupancy'
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.placed = {}
+        self.containers = {}
+        self.volumes = {}
+
+    def add(self, key, record):
+        self.remove(key)
+        box = box_of(record)
+        container_id = record.get('container_id')
+        if box is None or container_id is None:
+            return
+        self.placed[key] = (container_id, box)
+        self.containers.setdefault(container_id, {})[key] = box
+        self.volumes[container_id] = self.volumes.get(container_id, 0) + volume_of(box)
+
+    def remove(self, key):
+        entry = self.placed.pop(key, None)
+        if entry is None:
+            return
+        container_id, box = entry
+        boxes = self.containers[container_id]
+        del boxes[key]
+        self.volumes[container_id] -= volume_of(box)
+        if not boxes:
+            del self.containers[container_id]
+            del self.volumes[container_id]
+
+    def boxes(self, container_id):
+        """{item key: box} of the items positioned in a container."""
+        return self.containers.get(container_id, {})
+
+    def used_volume(self, container_id):
+        return self.volumes.get(container_id, 0)
+
+
+class FreeSpaceIndex:
+    """Containers sorted by free space (capacity - current_fill).
+
+    Entries are (free, -id) so the tail of the list holds the emptiest
+    containers, lowest id first among equals.
+    """
+
+    name = 'free_space'
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.free = {}
+        self.entries = []
+
+    def copy(self):
+        clone = FreeSpaceIndex()
+        clone.free = dict(self.free)
+        clone.entries = list(self.entries)
+        return clone
+
+    def add(self, key, record):
+        free = record.get('capacity', 0) - record.get('current_fill', 0)
+        if self.free.get(key) == free:
+            return
+        self.remove(key)
+        self.set(key, free)
+
+    def set(self, key, free):
+        self.free[key] = free
+        bisect.insort(self.entries, (free, -key))
+
+    def remove(self, key):
+        free = self.free.pop(key, None)
+        if free is not None:
+            position = bisect.bisect_left(self.entries, (free, -key))
+            del self.entries[position]
+
+    def descending(self, minimum):
+        """(free, id) of containers with free space >= minimum, emptiest first."""
+        for free, negated in reversed(self.entries):
+            if free < minimum:
+                return
+            yield free, -negated
+
+    def emptiest(self, count, minimum):
+        """Ids of up to `count` containers with the most free space >= minimum."""
+        start = max(bisect.bisect_left(self.entries, (minimum,)), len(self.entries) - count)
+        return [-negated for _, negated in reversed(self.entries[start:])]
+
+
+class PlacementEngine:
+    """Scores containers for new items without scanning every container.
+
+    A container scores half its free space, plus a bonus when it already
+    holds items whose name contains the requested item type. Only the
+    emptiest containers and those holding similar items can make the top k,
+    so those are the only ones scored.
+
+    When the request gives the item's dimensions, containers with
+    dimensions must also have room for it in 3D: each candidate gets a
+    position from `locate` and loses RETRIEVAL_STEP_PENALTY per item in
+    front of it. Containers are then visited emptiest first until none of
+    the rest could outscore the top k.
+    """
+
+    def __init__(self, containers, inventory):
+        self.containers = containers
+        self.inventory = inventory
+
+    def similar_containers(self, item_type):
+        if not item_type:
+            return set()
+        _, items = self.inventory.indexes['text'].search([("name", item_type)])
+        return {item['container_id'] for item in items if item['container_id'] is not None}
+
+    def fit(self, container, dims, exclude=(), extra=()):
+        """(position, retrieval_steps) for an item of `dims` in `container`.
+
+        Returns (None, None) when either has no dimensions, so only the
+        scalar capacity applies, and None when the item does not fit.
+        Boxes of items in `exclude` are ignored and `extra` boxes added, so
+        unsaved changes can be taken into account.
+        """
+        size = dimensions_of(container)
+        if size is None or dims is None:
+            return None, None
+        if any(d > s + EPSILON for d, s in zip(sorted(dims), sorted(size))):
+            return None
+        boxes = [box for key, box in self.inventory.indexes['occupancy'].boxes(container['id']).items()
+                 if key not in exclude]
+        boxes.extend(extra)
+        spot = locate(size, dims, boxes)
+        if spot is None:
+            return None
+        box, steps = spot
+        return position_of(box), steps
+
+    def recommend(self, item_type, quantity, limit=3, space=None, similar=None, dimensions=None,
+                  reserved=None):
+        """Top `limit` containers for the item; `reserved` maps container ids
+        to boxes already promised to other items."""
+        space = space or self.containers.indexes['free_space']
+        if similar is None:
+            similar = self.similar_containers(item_type)
+        if dimensions is not None:
+            return self._recommend_fitted(quantity, limit, space, similar, dimensions, reserved or {})
+        candidates = set(space.emptiest(limit, quantity))
+        candidates.update(c for c in similar if space.free.get(c, float('-inf')) >= quantity)
+
+        def score(container_id):
+            value = space.free[container_id] * 0.5
+            if container_id in similar:
+                value += SIMILAR_ITEM_BONUS
+            return value
+
+        best = heapq.nlargest(limit, sorted(candidates), key=score)
+        return [self._recommendation(container_id, space, score(container_id)) for container_id in best]
+
+    def _recommend_fitted(self, quantity, limit, space, similar, dimensions, reserved):
+        occupancy = self.inventory.indexes['occupancy']
+        item_volume = dimensions[0] * dimensions[1] * dimensions[2]
+        scored = {}
+
+        def consider(container_id):
+            container = self.containers.get(container_id)
+            extra = reserved.get(container_id, ())
+            size = dimensions_of(container)
+            if size is not None:
+                used = occupancy.used_volume(container_id) + sum(volume_of(box) for box in extra)
+                if size[0] * size[1] * size[2] - used < item_volume - EPSILON:
+                    scored[container_id] = None
+                    return
+            scored[container_id] = self.fit(container, dimensions, extra=extra)
+
+        def score(container_id):
+            value = space.free[container_id] * 0.5
+            if container_id in similar:
+                value += SIMILAR_ITEM_BONUS
+            steps = scored[container_id][1]
+            if steps:
+                value -= steps * RETRIEVAL_STEP_PENALTY
+            return value
+
+        # The `limit` best scores so far, lowest first
+        top = []
+        for container_id in itertools.chain(
+                (c for c in similar if space.free.get(c, float('-inf')) >= quantity),
+                (c for _, c in space.descending(quantity))):
+            # Unvisited containers score at most half their free space
+            if len(top) >= limit and space.free[container_id] * 0.5 <= top[0] and container_id not in similar:
+                break
+            if container_id in scored:
+                continue
+            consider(container_id)
+            if scored[container_id] is not None:
+                heapq.heappush(top, score(container_id))
+                if len(top) > limit:
+                    heapq.heappop(top)
+
+        fitting = sorted(c for c, spot in scored.items() if spot is not None)
+        best = heapq.nlargest(limit, fitting, key=score)
+        recommendations = []
+        for container_id in best:
+            position, steps = scored[container_id]
+            recommendation = self._recommendation(container_id, space, score(container_id))
+            recommendation["position"] = position
+            recommendation["retrieval_steps"] = steps
+            recommendations.append(recommendation)
+        return recommendations
+
+    def _recommendation(self, container_id, space, score):
+        container = self.containers.get(container_id)
+        return {
+            "container_id": container_id,
+            "container_name": container['name'],
+            "location": container['location'],
+            "available_space": space.free[container_id],
+            "score": score
+        }
+
+    def plan(self, requests):
+        """Assign every request to one container without overfilling any.
+
+        Largest requests are placed first against a private copy of the free
+        space index, which is debited as each request is assigned; positions
+        given to earlier requests are reserved for the later ones.
+        """
+        space = self.containers.indexes['free_space'].copy()
+        similar_cache = {}
+        reserved = {}
+        assignments = [None] * len(requests)
+        order = sorted(range(len(requests)), key=lambda i: -requests[i]['quantity'])
+        for position in order:
+            request = requests[position]
+            item_type = request.get('item_type', '')
+            if item_type not in similar_cache:
+                similar_cache[item_type] = self.similar_containers(item_type)
+            dimensions = dimensions_of(request)
+            best = self.recommend(item_type, request['quantity'], limit=1, space=space,
+                                  similar=similar_cache[item_type], dimensions=dimensions,
+                                  reserved=reserved)
+            if not best:
+                assignments[position] = {**request, "error": "No container has enough space"}
+                continue
+            choice = best[0]
+            container_id = choice['container_id']
+            free = space.free[container_id]
+            space.remove(container_id)
+            space.set(container_id, free - request['quantity'])
+            assignments[position] = {
+                **request,
+                "container_id": container_id,
+                "container_name": choice['container_name'],
+                "location": choice['location']
+            }
+            if dimensions is not None:
+                assignments[position]["position"] = choice['position']
+                assignments[position]["retrieval_steps"] = choice['retrieval_steps']
+                if choice['position'] is not None:
+                    reserved.setdefault(container_id, []).append(box_of(choice))
+        return assignments
@@ -0,0 +1,180 @@
+import bisect
+import heapq
+import re
+
+GRAM_SIZE = 3
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _grams(text):
+    """Every substring of length 1..GRAM_SIZE, so short queries hit the index too."""
+    grams = set()
+    for size in range(1, GRAM_SIZE + 1):
+        for start in range(len(text) - size + 1):
+            grams.add(text[start:start + size])
+    return grams
+
+
+def _query_grams(needle):
+    if len(needle) <= GRAM_SIZE:
+        return [needle]
+    return [needle[i:i + GRAM_SIZE] for i in range(len(needle) - GRAM_SIZE + 1)]
+
+
+class TextIndex:
+    """Inverted n-gram and token index over lower-cased text fields.
+
+    Substring queries intersect the posting sets of the query's n-grams and
+    verify the survivors against the cached lower-cased text, so results
+    match a plain `needle in text.lower()` scan. Tokens are kept sorted per
+    field for prefix (typeahead) matching and ranking.
+
+    Searches run without the storage lock while a write may be updating the
+    index, so they look records up with .get and skip keys removed meanwhile.
+    """
+
+    def __init__(self, fields, name='text'):
+        self.name = name
+        self.fields = tuple(fields)
+        self.clear()
+
+    def clear(self):
+        self.docs = {}
+        self.records = {}
+        self.grams = {field: {} for field in self.fields}
+        self.tokens = {field: {} for field in self.fields}
+        self.sorted_tokens = {field: [] for field in self.fields}
+
+    def add(self, key, record):
+        doc = tuple(str(record.get(field) or '').lower() for field in self.fields)
+        self.records[key] = record
+        if self.docs.get(key) == doc:
+            return
+        self._unindex(key)
+        self.docs[key] = doc
+        for field, text in zip(self.fields, doc):
+            postings = self.grams[field]
+            for gram in _grams(text):
+                postings.setdefault(gram, set()).add(key)
+            tokens = self.tokens[field]
+            for token in set(_TOKEN_RE.findall(text)):
+                keys = tokens.get(token)
+                if keys is None:
+                    keys = tokens[token] = set()
+                    bisect.insort(self.sorted_tokens[field], token)
+                keys.add(key)
+
+    def remove(self, key):
+        self.records.pop(key, None)
+        self._unindex(key)
+
+    def _unindex(self, key):
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        for field, text in zip(self.fields, doc):
+            postings = self.grams[field]
+            for gram in _grams(text):
+                keys = postings[gram]
+                keys.discard(key)
+                if not keys:
+                    del postings[gram]
+            tokens = self.tokens[field]
+            sorted_tokens = self.sorted_tokens[field]
+            for token in set(_TOKEN_RE.findall(text)):
+                keys = tokens[token]
+                keys.discard(key)
+                if not keys:
+                    del tokens[token]
+                    del sorted_tokens[bisect.bisect_left(sorted_tokens, token)]
+
+    def _substring_keys(self, field, needle):
+        postings = self.grams[field]
+        sets = []
+        for gram in _query_grams(needle):
+            keys = postings.get(gram)
+            if not keys:
+                return set()
+            sets.append(keys)
+        sets.sort(key=len)
+        keys = set(sets[0])
+        for other in sets[1:]:
+            keys &= other
+        return self._verified(keys, field, needle)
+
+    def _verified(self, keys, field, needle):
+        index = self.fields.index(field)
+        verified = set()
+        for key in keys:
+            doc = self.docs.get(key)
+            if doc is not None and needle in doc[index]:
+                verified.add(key)
+        return verified
+
+    def _prefix_keys(self, field, prefix):
+        keys = set()
+        tokens = self.tokens[field]
+        sorted_tokens = self.sorted_tokens[field]
+        start = bisect.bisect_left(sorted_tokens, prefix)
+        for token in sorted_tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            keys.update(tokens.get(token, ()))
+        return keys
+
+    def search(self, terms, rank=None, prefix=False, limit=None, offset=0):
+        """Return (total, records) matching every (field, substring) in `terms`.
+
+        Results are ranked by how well the first field matches `rank`: exact,
+        leading, token-prefix, then plain substring matches. With `prefix`,
+        only records whose first field has a token starting with `rank` are
+        kept, which is what typeahead wants.
+        """
+        candidates = None
+        for field, needle in terms:
+            if not needle:
+                continue
+            needle = needle.lower()
+            if candidates is None:
+                candidates = self._substring_keys(field, needle)
+            else:
+                candidates = self._verified(candidates, field, needle)
+            if not candidates:
+                return 0, []
+
+        rank = (rank or '').lower()
+        if rank and prefix:
+            prefixed = self._prefix_keys(self.fields[0], rank)
+            candidates = prefixed if candidates is None else candidates & prefixed
+
+        end = None if limit is None else offset + limit
+        if candidates is None:
+            records = list(self.records.values())
+            return len(records), records[offset:end]
+
+        ranked = []
+        for key in candidates:
+            doc = self.docs.get(key)
+            if doc is not None:
+                ranked.append((-self._score(doc[0], rank), self._order(key), key))
+        if end is None:
+            ordered = sorted(ranked)[offset:]
+        else:
+            ordered = heapq.nsmallest(end, ranked)[offset:]
+        records = [self.records.get(key) for _, _, key in ordered]
+        return len(candidates), [record for record in records if record is not None]
+
+    def _order(self, key):
+        return (0, key, '') if isinstance(key, int) else (1, 0, str(key))
+
+    def _score(self, text, rank):
+        if not rank:
+            return 0
+        if text == rank:
+            return 3
+        if text.startswith(rank):
+            return 2
+        if any(token.startswith(rank) for token in _TOKEN_RE.findall(text)):
+            return 1
+        return 0
@@ -0,0 +1,105 @@
+import datetime
+import json
+import os
+import uuid
+from collections.abc import Mapping
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Every backend raises ValueError from loads on malformed input.
+# JSON_BACKEND picks orjson, msgspec or json; the fastest installed one is the default.
+_AVAILABLE = [name for name, module in (('orjson', orjson), ('msgspec', msgspec)) if module] + ['json']
+BACKEND = os.environ.get('JSON_BACKEND', _AVAILABLE[0])
+if BACKEND not in _AVAILABLE:
+    BACKEND = _AVAILABLE[0]
+
+
+def _default(obj):
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    # Slotted records (store.Record) and other non-dict mappings
+    if isinstance(obj, Mapping):
+        return obj.to_dict() if hasattr(obj, 'to_dict') else dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _str_keys(obj):
+    """Copy of `obj` with non-str dict keys converted the way json.dumps does."""
+    if isinstance(obj, Mapping):
+        if hasattr(obj, 'to_dict'):
+            obj = obj.to_dict()
+        return {key if isinstance(key, str) else json.dumps(key): _str_keys(value)
+                for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_str_keys(value) for value in obj]
+    return obj
+
+
+if BACKEND == 'orjson':
+    def dumps(obj, sort_keys=False):
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, default=_default, option=option)
+
+    loads = orjson.loads
+
+elif BACKEND == 'msgspec':
+    _encoder = msgspec.json.Encoder(enc_hook=_default)
+    _sorted_encoder = msgspec.json.Encoder(enc_hook=_default, order='sorted')
+
+    def dumps(obj, sort_keys=False):
+        try:
+            return (_sorted_encoder if sort_keys else _encoder).encode(obj)
+        except TypeError:
+            # Sorted output only supports str keys; retry with keys converted
+            return (_sorted_encoder if sort_keys else _encoder).encode(_str_keys(obj))
+
+    def loads(s):
+        try:
+            return msgspec.json.decode(s)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+else:
+    def dumps(obj, sort_keys=False):
+        try:
+            return json.dumps(obj, separators=(',', ':'), sort_keys=sort_keys, ensure_ascii=False,
+                              default=_default).encode('utf-8')
+        except TypeError:
+            if not sort_keys:
+                raise
+            # Mixed str and non-str keys cannot be sorted; sort them as strings
+            return json.dumps(_str_keys(obj), separators=(',', ':'), sort_keys=True, ensure_ascii=False,
+                              default=_default).encode('utf-8')
+
+    loads = json.loads
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider encoding through the selected backend.
+
+    Keys stay sorted, as with Flask's default provider, so responses are
+    byte-for-byte stable regardless of the backend (floats with exponents
+    aside: json writes 1e+20 where the others write 1e20).
+    """
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, sort_keys=True).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, sort_keys=True), mimetype=self.mimetype)
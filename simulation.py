@@ -0,0 +1,103 @@
+import datetime
+
+import numpy as np
+
+from expiry import parse_date
+
+# Daily consumption as a (low, high) fraction of the remaining quantity,
+# applied to items whose name contains the category.
+DEFAULT_RATES = {
+    "Food": (0.01, 0.05),
+    "Water": (0.01, 0.05),
+    "Medical": (0.01, 0.05),
+}
+
+_EPOCH = datetime.date(1970, 1, 1).toordinal()
+_NAT = np.iinfo(np.int64).min
+
+
+class Columns:
+    """Inventory fields needed by the simulation, as parallel NumPy arrays."""
+
+    def __init__(self, items, rates):
+        self.items = items
+        self.ids = [item['id'] for item in items]
+        self.names = [item['name'] for item in items]
+        # Quantities that are not integers count as nothing left to consume.
+        self.quantity = np.array([item['quantity'] if isinstance(item['quantity'], int) else 0
+                                  for item in items], dtype=np.int64)
+        # Missing or unparseable expiry dates become NaT, which never compares as expired.
+        days = [parse_date(item.get('expiry_date')) for item in items]
+        self.expiry = np.array([_NAT if day is None else day - _EPOCH for day in days],
+                               dtype=np.int64).astype('datetime64[D]')
+        categories = list(rates)
+        self.low = np.array([rates[c][0] for c in categories] + [0.0])
+        self.high = np.array([rates[c][1] for c in categories] + [0.0])
+        none = len(categories)
+        self.category = np.array(
+            [next((i for i, c in enumerate(categories) if c in name), none) for name in self.names],
+            dtype=np.int64)
+        self.consumable = self.category != none
+
+
+def expiry_as_of(moment):
+    """Latest expiry date that counts as expired at `moment`.
+
+    Like timedelta.days, any time past midnight counts as a full day, so
+    items expiring tomorrow are already expired in the afternoon.
+    """
+    as_of = moment.date()
+    if moment.time() != datetime.time():
+        as_of += datetime.timedelta(days=1)
+    return as_of
+
+
+def simulate(columns, days, rng, start):
+    """Run `days` days of consumption; returns (remaining, used, timeline).
+
+    Each day every consumable item uses a uniform random fraction of what is
+    left (at least one unit), skipped when not enough remains. A day's
+    expired_count uses the expiry_as_of rule, so it matches an expiry report
+    for that day.
+    """
+    quantity = columns.quantity.copy()
+    used = np.zeros_like(quantity)
+    consumable = columns.consumable
+    low = columns.low[columns.category]
+    high = columns.high[columns.category]
+    sorted_expiry = np.sort(columns.expiry[~np.isnat(columns.expiry)])
+    start_day = np.datetime64(start.date(), 'D')
+    expired_by = np.datetime64(expiry_as_of(start), 'D')
+    timeline = []
+    for day in range(days):
+        fraction = rng.uniform(low, high)
+        usage = np.maximum(1, (quantity * fraction).astype(np.int64))
+        applied = consumable & (quantity >= usage)
+        usage = np.where(applied, usage, 0)
+        quantity -= usage
+        used += usage
+        timeline.append({
+            "date": str(start_day + day),
+            "units_used": int(usage.sum()),
+            "expired_count": int(np.searchsorted(sorted_expiry, expired_by + day, side='right')),
+        })
+    return quantity, used, timeline
+
+
+def parse_rates(overrides):
+    """Merge user-supplied {category: rate or [low, high]} into DEFAULT_RATES."""
+    if overrides is not None and not isinstance(overrides, dict):
+        raise ValueError("rates must be an object mapping categories to rates")
+    rates = dict(DEFAULT_RATES)
+    for category, rate in (overrides or {}).items():
+        if isinstance(rate, (int, float)) and not isinstance(rate, bool):
+            low = high = float(rate)
+        elif isinstance(rate, (list, tuple)) and len(rate) == 2 and \
+                all(isinstance(r, (int, float)) and not isinstance(r, bool) for r in rate):
+            low, high = float(rate[0]), float(rate[1])
+        else:
+            raise ValueError(f"Invalid rate for {category}")
+        if not 0 <= low <= high <= 1:
+            raise ValueError(f"Rate for {category} must satisfy 0 <= low <= high <= 1")
+        rates[category] = (low, high)
+    return rates
@@ -0,0 +1,62 @@
+class StorageStats:
+    """Running capacity and fill totals over containers, overall and per location."""
+
+    name = 'stats'
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.rows = {}
+        self.total_capacity = 0
+        self.total_used = 0
+        self.locations = {}
+
+    def add(self, key, record):
+        row = (record.get('capacity', 0), record.get('current_fill', 0), record.get('location'))
+        if self.rows.get(key) == row:
+            return
+        self.remove(key)
+        self.rows[key] = row
+        capacity, used, location = row
+        self.total_capacity += capacity
+        self.total_used += used
+        totals = self.locations.setdefault(location, [0, 0, 0])
+        totals[0] += capacity
+        totals[1] += used
+        totals[2] += 1
+
+    def remove(self, key):
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        capacity, used, location = row
+        self.total_capacity -= capacity
+        self.total_used -= used
+        totals = self.locations[location]
+        totals[0] -= capacity
+        totals[1] -= used
+        totals[2] -= 1
+        if not totals[2]:
+            del self.locations[location]
+
+    def summary(self):
+        return {
+            "total_containers": len(self.rows),
+            "total_capacity": self.total_capacity,
+            "total_used": self.total_used,
+            "utilization_percentage": utilization(self.total_used, self.total_capacity),
+            "locations": {
+                location: {
+                    "containers": count,
+                    "capacity": capacity,
+                    "used": used,
+                    "utilization_percentage": utilization(used, capacity)
+                }
+                for location, (capacity, used, count) in self.locations.items()
+            }
+        }
+
+
+def utilization(used, capacity):
+    return round(used / capacity * 100 if capacity > 0 else 0, 2)
@@ -0,0 +1,487 @@
+import atexit
+import contextlib
+import copy
+import os
+import threading
+import time
+
+import serializers
+
+try:
+    import fcntl
+except ImportError:  # Windows: locking is per-process only
+    fcntl = None
+
+# Number of journal records written before the collections are compacted into
+# fresh snapshots and the journal is truncated.
+COMPACT_EVERY = int(os.environ.get('COMPACT_EVERY', '1000'))
+
+# 'sync' fsyncs the journal before each transaction returns. 'group' appends
+# under the lock but leaves the fsync to one thread at a time, which waits up
+# to GROUP_COMMIT_WINDOW_MS (or until GROUP_COMMIT_MAX transactions are
+# pending) and then makes the whole batch durable with a single fsync.
+# Either way a transaction only returns once its record is on disk.
+# 'async' hands both the fsync and compaction to a background writer thread,
+# which syncs at most GROUP_COMMIT_WINDOW_MS after each append: transactions
+# return once appended, so a power failure (not a process crash) can lose
+# the last few milliseconds of commits.
+DURABILITY = os.environ.get('DURABILITY', 'sync')
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get('GROUP_COMMIT_WINDOW_MS', '2'))
+GROUP_COMMIT_MAX = int(os.environ.get('GROUP_COMMIT_MAX', '64'))
+
+JOURNAL_NAME = 'journal.log'
+LOCK_NAME = 'journal.lock'
+
+
+class Collection:
+    """In-memory view of one data file, keyed by record id.
+
+    The JSON file on disk is only a snapshot; changes made since the last
+    compaction live in the shared journal and are replayed on startup.
+    Subclasses may store their snapshot differently by overriding
+    exists/create/read_snapshot/write_snapshot.
+    """
+
+    # Journal (generation, offset) the snapshot already covers; records
+    # before it are skipped on replay. Full snapshots can leave it at the
+    # start since replaying puts and deletes over them is idempotent.
+    sealed_position = (0, 0)
+
+    def __init__(self, name, path, key='id'):
+        self.name = name
+        self.path = path
+        self.key = key
+        self.records = {}
+        # Bumped on every change, including replayed ones, so anything
+        # derived from the records can tell whether it is still current
+        self.revision = 0
+
+    def __iter__(self):
+        return iter(list(self.records.values()))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def get(self, key, default=None):
+        return self.records.get(key, default)
+
+    def load(self, records):
+        # Built on a fresh copy and swapped in, so threads reading meanwhile
+        # see the old records or the new ones, never a half-filled table
+        fresh = copy.copy(self)
+        fresh.reset()
+        fresh.revision = self.revision + 1
+        for record in records:
+            fresh.apply('put', record)
+        self.__dict__.update(fresh.__dict__)
+
+    def reset(self):
+        """Drop every record; only called on the copy `load` fills."""
+        self.records = {}
+
+    def apply(self, op, value):
+        self.revision += 1
+        if op == 'put':
+            self.records[value[self.key]] = value
+        elif op == 'del':
+            self.records.pop(value, None)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def create(self, default_func):
+        write_snapshot(self.path, default_func())
+
+    def read_snapshot(self):
+        return read_snapshot(self.path)
+
+    def write_snapshot(self, position):
+        write_snapshot(self.path, list(self.records.values()))
+
+
+class Storage:
+    """Snapshot files plus one append-only journal shared by all collections.
+
+    Each committed transaction is written as a single JSON line, so a crash
+    mid-write leaves at most one truncated line, which recovery drops.
+
+    Several processes may share one data directory. Transactions hold an
+    exclusive lock on journal.lock and first replay whatever other processes
+    appended since this one last looked; compaction swaps in a new journal
+    file, which tells the other processes to reload the snapshots.
+    """
+
+    def __init__(self, data_dir, compact_every=COMPACT_EVERY, durability=DURABILITY,
+                 group_window=GROUP_COMMIT_WINDOW_MS / 1000, group_max=GROUP_COMMIT_MAX):
+        if durability not in ('sync', 'group', 'async'):
+            raise ValueError("durability must be 'sync', 'group' or 'async'")
+        self.data_dir = data_dir
+        self.durability = durability
+        self.group_window = group_window
+        self.group_max = group_max
+        self.journal_path = os.path.join(data_dir, JOURNAL_NAME)
+        self.lock_path = os.path.join(data_dir, LOCK_NAME)
+        self.compact_every = compact_every
+        self.collections = {}
+        self._defaults = {}
+        self._by_path = {}
+        self._journal = None
+        self._journal_records = 0
+        self._inode = None
+        self._offset = 0
+        self._generation = 0
+        self._sequence = 0
+        # Called with (sequence, journal line) for every transaction applied,
+        # whether committed here or replayed from another process, and with
+        # (sequence, None) when a compacted journal starts at that sequence
+        self.listeners = []
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._lock_pid = None
+        self._lock_depth = 0
+        self._local = threading.local()
+        # Running totals for this process, reported by /api/metrics
+        self.bytes_written = 0
+        self.commits = 0
+        self.commit_seconds = 0.0
+        self.compactions = 0
+        self.syncs = 0
+        # Group commit: bytes_written is also the position of this process's
+        # appends; _synced is how much of it is known to be durable.
+        self._synced = 0
+        self._pending = 0
+        self._syncing = False
+        self._sync_cond = threading.Condition()
+        # Async mode: the process whose writer thread is running, and
+        # whether it should compact on its next pass
+        self._writer_pid = None
+        self._compact_due = False
+
+    def collection(self, path, default_func, cls=Collection, **kwargs):
+        name = os.path.splitext(os.path.basename(path))[0]
+        collection = cls(name, path, **kwargs)
+        with self._locked():
+            if not collection.exists():
+                collection.create(default_func)
+        self.collections[name] = collection
+        self._defaults[name] = default_func
+        self._by_path[path] = collection
+        return collection
+
+    @property
+    def version(self):
+        """Identifies the committed state; equal in every process that has caught up."""
+        return '%d.%d' % (self._generation, self._offset)
+
+    @property
+    def sequence(self):
+        """Number of transactions ever committed; survives compaction."""
+        return self._sequence
+
+    def recover(self):
+        """Load the snapshots, replay the journal and open it for appending."""
+        with self._locked():
+            self._reload()
+
+    def refresh(self):
+        """Apply transactions committed by other processes since the last look."""
+        if self._changed():
+            with self._locked(exclusive=False):
+                self._catch_up(truncate=False)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group every put/delete made inside the block into one journal record.
+
+        Reads and checks made inside the block see the latest committed state
+        and no other thread or process can commit until it ends. If the block
+        raises, its puts and deletes are undone in memory and nothing is written.
+        """
+        position = None
+        with self._lock:
+            if getattr(self._local, 'ops', None) is not None:
+                yield
+                return
+            with self._locked():
+                self._catch_up(truncate=True)
+                self._local.ops = []
+                self._local.undo = []
+                try:
+                    yield
+                    ops = self._local.ops
+                except BaseException:
+                    self._undo(self._local.undo)
+                    raise
+                finally:
+                    self._local.ops = None
+                    self._local.undo = None
+                if ops:
+                    position = self._write(ops)
+        # Locks are released, so other transactions can append while this
+        # one waits for its batch to be flushed.
+        if position is not None and self.durability == 'group':
+            self._wait_durable(position)
+
+    def put(self, path, record):
+        with self.transaction():
+            collection = self._by_path[path]
+            key = record[collection.key]
+            self._local.undo.append((collection, key, collection.get(key)))
+            collection.apply('put', record)
+            self._local.ops.append([collection.name, 'put', record])
+
+    def delete(self, path, key):
+        with self.transaction():
+            collection = self._by_path[path]
+            self._local.undo.append((collection, key, collection.get(key)))
+            collection.apply('del', key)
+            self._local.ops.append([collection.name, 'del', key])
+
+    def _undo(self, undo):
+        # Put back what each staged op replaced, newest first
+        for collection, key, previous in reversed(undo):
+            if previous is None:
+                collection.apply('del', key)
+            else:
+                collection.apply('put', previous)
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive=True):
+        with self._lock:
+            if self._lock_depth or fcntl is None:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            # flock is tied to the open file, which forked workers would share.
+            if self._lock_pid != os.getpid():
+                self._lock_file = open(self.lock_path, 'a')
+                self._lock_pid = os.getpid()
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._lock_depth = 1
+            try:
+                yield
+            finally:
+                self._lock_depth = 0
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _changed(self):
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return True
+        return stat.st_ino != self._inode or stat.st_size != self._offset
+
+    def _catch_up(self, truncate):
+        try:
+            inode = os.stat(self.journal_path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode is None or inode != self._inode:
+            self._reload(truncate)
+        else:
+            self._replay(truncate)
+
+    def _reload(self, truncate=True):
+        for name, collection in self.collections.items():
+            try:
+                records = collection.read_snapshot()
+            except (OSError, ValueError):
+                records = self._defaults[name]()
+            collection.load(records)
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.journal_path, 'ab')
+        self._inode = os.fstat(self._journal.fileno()).st_ino
+        self._offset = 0
+        self._generation = 0
+        self._sequence = 0
+        self._journal_records = 0
+        self._replay(truncate)
+
+    def _replay(self, truncate):
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    ops = serializers.loads(line)
+                except ValueError:
+                    break
+                if isinstance(ops, dict):
+                    # Header written by compaction
+                    self._generation = ops.get('generation', 0)
+                    self._sequence = ops.get('sequence', 0)
+                    self._notify(None)
+                else:
+                    self._apply_ops(ops, (self._generation, self._offset))
+                    self._journal_records += 1
+                    self._sequence += 1
+                    self._notify(line)
+                self._offset += len(line)
+        # Drop a torn write left behind by a crash before appending after it.
+        if truncate and os.path.getsize(self.journal_path) > self._offset:
+            self._journal.truncate(self._offset)
+
+    def _notify(self, line):
+        for listener in self.listeners:
+            listener(self._sequence, line and line.rstrip(b'\n'))
+
+    def _apply_ops(self, ops, position):
+        for name, op, value in ops:
+            collection = self.collections.get(name)
+            if collection is not None and collection.sealed_position <= position:
+                collection.apply(op, value)
+
+    def _write(self, ops):
+        """Append one transaction; returns the position to wait on in group mode."""
+        started = time.perf_counter()
+        line = serializers.dumps(ops) + b'\n'
+        self._journal.write(line)
+        self._journal.flush()
+        if self.durability == 'sync':
+            os.fsync(self._journal.fileno())
+            self.syncs += 1
+        self._offset += len(line)
+        self._journal_records += 1
+        self.bytes_written += len(line)
+        self.commits += 1
+        self.commit_seconds += time.perf_counter() - started
+        self._sequence += 1
+        self._notify(line)
+        if self.durability == 'group':
+            with self._sync_cond:
+                self._pending += 1
+                if self._pending >= self.group_max:
+                    self._sync_cond.notify_all()
+        elif self.durability == 'async':
+            self._start_writer()
+            with self._sync_cond:
+                self._pending += 1
+                if self._journal_records >= self.compact_every:
+                    self._compact_due = True
+                self._sync_cond.notify_all()
+            return None
+        if self._journal_records >= self.compact_every:
+            self.compact()
+        return self.bytes_written
+
+    def _start_writer(self):
+        # Threads do not survive fork, so every worker process starts its own.
+        if self._writer_pid == os.getpid():
+            return
+        self._writer_pid = os.getpid()
+        threading.Thread(target=self._run_writer, name='journal-writer', daemon=True).start()
+        atexit.register(self.flush)
+
+    def _run_writer(self):
+        while True:
+            with self._sync_cond:
+                self._sync_cond.wait_for(lambda: self._compact_due or self._synced < self.bytes_written)
+                compact, self._compact_due = self._compact_due, False
+            try:
+                if compact:
+                    self.compact()
+                else:
+                    self._wait_durable(self.bytes_written)
+            except Exception:
+                # Keep the thread alive and retry; the appended records are not lost.
+                with self._sync_cond:
+                    self._compact_due = self._compact_due or compact
+                time.sleep(max(self.group_window, 0.01))
+
+    def flush(self):
+        """Block until everything this process appended is on disk."""
+        if self._synced < self.bytes_written:
+            self._wait_durable(self.bytes_written)
+
+    def _wait_durable(self, position):
+        with self._sync_cond:
+            while True:
+                if self._synced >= position:
+                    return
+                if not self._syncing:
+                    break
+                self._sync_cond.wait()
+            # Become the leader: give concurrent requests a moment to join.
+            self._syncing = True
+            self._sync_cond.wait_for(lambda: self._pending >= self.group_max, self.group_window)
+        durable = None
+        try:
+            with self._lock:
+                target = self.bytes_written
+                with self._sync_cond:
+                    self._pending = 0
+                # A duplicate descriptor survives compaction closing the journal.
+                fd = os.dup(self._journal.fileno())
+            started = time.perf_counter()
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            durable = target
+            with self._lock:
+                self.syncs += 1
+                self.commit_seconds += time.perf_counter() - started
+        finally:
+            # On failure the next waiter takes over as leader and retries.
+            with self._sync_cond:
+                self._syncing = False
+                if durable is not None:
+                    self._synced = max(self._synced, durable)
+                self._sync_cond.notify_all()
+
+    def compact(self):
+        """Write every collection to a fresh snapshot and start a new journal."""
+        with self._locked():
+            self._catch_up(truncate=True)
+            for collection in self.collections.values():
+                collection.write_snapshot((self._generation, self._offset))
+            # Snapshots are replaced atomically; replaying the old journal on
+            # top of them after a crash is harmless since puts and deletes
+            # are idempotent.
+            header = serializers.dumps({'generation': self._generation + 1, 'sequence': self._sequence}) + b'\n'
+            tmp_path = '%s.%d.tmp' % (self.journal_path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                f.write(header)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+            self._journal.close()
+            self._journal = open(self.journal_path, 'ab')
+            self._inode = os.fstat(self._journal.fileno()).st_ino
+            self._offset = len(header)
+            self._generation += 1
+            self._journal_records = 0
+            self.compactions += 1
+            # Snapshots and the new journal were fsynced, so everything
+            # appended before is durable.
+            with self._sync_cond:
+                self._synced = self.bytes_written
+                self._pending = 0
+                self._sync_cond.notify_all()
+
+
+def read_snapshot(path):
+    with open(path, 'rb') as f:
+        return serializers.loads(f.read())
+
+
+def write_snapshot(path, records):
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    # A compact JSON array with one record per line
+    with open(tmp_path, 'wb') as f:
+        f.write(b'[')
+        for index, record in enumerate(records):
+            f.write(b'\n' if index == 0 else b',\n')
+            f.write(serializers.dumps(record))
+        f.write(b'\n]\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
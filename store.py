@@ -0,0 +1,269 @@
+import base64
+import copy
+import heapq
+import sys
+from collections.abc import Mapping, MutableMapping
+from operator import itemgetter
+
+import serializers
+from storage import Collection
+
+_MISSING = object()
+
+
+class FieldIndex:
+    """Secondary index mapping one field's value to the records holding it.
+
+    The value last indexed for each key is remembered, so records that were
+    changed in place are moved to their new bucket on the next put.
+    """
+
+    def __init__(self, field):
+        self.name = field
+        self.field = field
+        self.values = {}
+        self.buckets = {}
+
+    def clear(self):
+        self.values = {}
+        self.buckets = {}
+
+    def add(self, key, record):
+        value = record.get(self.field)
+        old = self.values.get(key, _MISSING)
+        if old is not _MISSING and old != value:
+            self._discard(key, old)
+        self.values[key] = value
+        self.buckets.setdefault(value, {})[key] = record
+
+    def remove(self, key):
+        value = self.values.pop(key, _MISSING)
+        if value is not _MISSING:
+            self._discard(key, value)
+
+    def lookup(self, value):
+        return list(self.buckets.get(value, {}).values())
+
+    def count(self, value):
+        return len(self.buckets.get(value, ()))
+
+    def _discard(self, key, value):
+        bucket = self.buckets.get(value)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self.buckets[value]
+
+
+class Record(MutableMapping):
+    """A mapping whose known fields live in __slots__ rather than a dict.
+
+    Subclasses come from `record_type`. They behave like the dicts they
+    replace, including missing keys and extra fields, but drop the per-record
+    hash table, and interned fields share one string object per distinct
+    value. serializers encode them as plain JSON objects.
+    """
+
+    __slots__ = ('_extra',)
+    fields = ()
+    interned = frozenset()
+    _slots = frozenset()
+
+    def __init__(self, values=()):
+        self._extra = None
+        for key, value in (values.items() if isinstance(values, Mapping) else values):
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key in self._slots:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._slots:
+            if key in self.interned and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._slots:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._slots:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def get(self, key, default=None):
+        if key in self._slots:
+            return getattr(self, key, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __iter__(self):
+        for field in self.fields:
+            if hasattr(self, field):
+                yield field
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self):
+        result = {}
+        for field in self.fields:
+            value = getattr(self, field, _MISSING)
+            if value is not _MISSING:
+                result[field] = value
+        if self._extra:
+            result.update(self._extra)
+        return result
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.to_dict())
+
+
+def record_type(name, fields, interned=()):
+    """Create a Record subclass storing `fields` in slots."""
+    clashes = [field for field in fields if hasattr(Record, field)]
+    if clashes:
+        raise ValueError("Record fields would shadow mapping methods: %s" % ', '.join(clashes))
+    return type(name, (Record,), {
+        '__slots__': tuple(fields),
+        'fields': tuple(fields),
+        'interned': frozenset(interned),
+        '_slots': frozenset(fields),
+        '__module__': __name__,
+    })
+
+
+class Table(Collection):
+    """Collection with a monotonic id allocator and secondary indexes.
+
+    An index is any object with a `name` and clear/add(key, record)/remove(key)
+    methods; it is updated on every put and delete, including journal replay.
+    With a `record_type`, records are stored as that Record subclass.
+    """
+
+    def __init__(self, name, path, key='id', indexes=(), record_type=None):
+        self.indexes = {index.name: index for index in indexes}
+        self.record_type = record_type
+        self.next_id = 1
+        super().__init__(name, path, key=key)
+
+    def coerce(self, value):
+        if self.record_type is None or isinstance(value, self.record_type):
+            return value
+        return self.record_type(value)
+
+    def reset(self):
+        super().reset()
+        indexes = {}
+        for name, index in self.indexes.items():
+            indexes[name] = copy.copy(index)
+            indexes[name].clear()
+        self.indexes = indexes
+        self.next_id = 1
+
+    def apply(self, op, value):
+        if op == 'put':
+            value = self.coerce(value)
+            key = value[self.key]
+            for index in self.indexes.values():
+                index.add(key, value)
+            if isinstance(key, int) and key >= self.next_id:
+                self.next_id = key + 1
+        elif op == 'del':
+            for index in self.indexes.values():
+                index.remove(value)
+        super().apply(op, value)
+
+    def allocate_id(self, count=1):
+        """Reserve `count` consecutive ids and return the first one."""
+        first = self.next_id
+        self.next_id += count
+        return first
+
+    def lookup(self, name, value):
+        return self.indexes[name].lookup(value)
+
+
+def _ranked(value):
+    # Numbers, strings and anything else each sort in their own group, so
+    # values of different types are never compared with each other
+    if isinstance(value, (int, float)):
+        return 0, value
+    if isinstance(value, str):
+        return 1, value
+    return 2, serializers.dumps(value).decode('utf-8')
+
+
+def sort_key(record, field, key='id', descending=False):
+    """Total order on `field` with missing values last and the id as tiebreak."""
+    value = record.get(field)
+    missing = value is None or value == ''
+    rank, value = (0, 0) if missing else _ranked(value)
+    # Descending order reverses the whole key, so flip the flag to keep missing values last
+    return (missing != descending, rank, value, record[key])
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(serializers.dumps(list(position))).decode('ascii')
+
+
+def decode_cursor(cursor, length=3):
+    try:
+        position = serializers.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, list) or len(position) != length:
+        raise ValueError("Invalid cursor")
+    return tuple(position)
+
+
+def paginate(records, field, descending=False, after=None, limit=None, key='id'):
+    """Return (page, next_cursor) of `records` ordered by `field`.
+
+    `after` is a cursor from a previous page of the same sort; one from a
+    different field or direction raises ValueError. With a limit only the
+    top limit + 1 records are kept (heap selection), never a full sort.
+    """
+    keyed = ((sort_key(record, field, key, descending), record) for record in records)
+    if after is not None:
+        cursor = decode_cursor(after, length=6)
+        if list(cursor[:2]) != [field, descending]:
+            raise ValueError("Cursor belongs to a different sort")
+        position = cursor[2:]
+        missing, rank, value, last = position
+        # Group 2 values are kept as their JSON text
+        if not isinstance(missing, bool) or rank not in (0, 1, 2) or _ranked(value)[0] != min(rank, 1):
+            raise ValueError("Invalid cursor")
+        keyed = (pair for pair in keyed if (pair[0] < position if descending else pair[0] > position))
+    try:
+        if limit is None:
+            return [record for _, record in sorted(keyed, key=itemgetter(0), reverse=descending)], None
+        select = heapq.nlargest if descending else heapq.nsmallest
+        page = select(limit + 1, keyed, key=itemgetter(0))
+    except TypeError:
+        # Only a tampered cursor, e.g. with an id of another type, gets here
+        raise ValueError("Invalid cursor")
+    next_cursor = encode_cursor([field, descending] + list(page[limit - 1][0])) if len(page) > limit else None
+    return [record for _, record in page[:limit]], next_cursor
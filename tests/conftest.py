@@ -0,0 +1,18 @@
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """A freshly imported app serving its own data directory under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    sys.modules.pop('app', None)
+    import app
+    yield app
+    sys.modules.pop('app', None)
+
+
+@pytest.fixture
+def client(api):
+    return api.app.test_client()
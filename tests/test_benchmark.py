@@ -0,0 +1,41 @@
+import json
+import os
+import random
+import subprocess
+import sys
+
+import benchmark
+
+
+def read_dataset(directory):
+    return {name: open(os.path.join(directory, name), 'rb').read() for name in sorted(os.listdir(directory))}
+
+
+def test_dataset_depends_only_on_the_seed(tmp_path):
+    benchmark.write_dataset(str(tmp_path / 'a'), 50, random.Random(7))
+    benchmark.write_dataset(str(tmp_path / 'b'), 50, random.Random(7))
+    benchmark.write_dataset(str(tmp_path / 'c'), 50, random.Random(8))
+    assert read_dataset(tmp_path / 'a') == read_dataset(tmp_path / 'b')
+    assert read_dataset(tmp_path / 'a') != read_dataset(tmp_path / 'c')
+    assert sorted(os.listdir(tmp_path / 'a')) == ['containers.json', 'inventory.json', 'logs.json', 'waste.json']
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert benchmark.percentile(values, 0.5) == 51
+    assert benchmark.percentile(values, 0.99) == 100
+    assert benchmark.percentile([3], 0.99) == 3
+
+
+def test_report_covers_every_endpoint(tmp_path):
+    output = tmp_path / 'bench.json'
+    subprocess.run([sys.executable, benchmark.__file__, '--sizes', '20', '--requests', '3', '--warmup', '1',
+                    '--output', str(output)], check=True, capture_output=True)
+    report = json.loads(output.read_text())
+    results = report["runs"][0]["results"]
+    assert report["runs"][0]["size"] == 20
+    assert [r["endpoint"] for r in results if r["cache"] == "warm"] == [
+        name for name in dict.fromkeys(r["endpoint"] for r in results) if name in benchmark.CACHED_ENDPOINTS]
+    assert len([r for r in results if r["cache"] == "cold"]) == 8
+    assert all(r["requests"] >= 1 and r["p50_ms"] <= r["p99_ms"] for r in results)
+    assert any(r["journal_bytes"] > 0 for r in results if r["endpoint"] == "retrieve_item")
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from cache import ResponseCache
+from storage import Storage
+from store import Table
+
+
+def test_entries_are_served_only_for_their_revisions():
+    cache = ResponseCache()
+    cache.put(('items', 1), (1, 4), b'old', 3)
+    assert cache.get(('items', 1), (1, 4)) == b'old'
+    assert cache.get(('items', 1), (2, 4)) is None
+    assert cache.get(('items', 1), (1, 4)) is None
+    assert cache.stats() == {"hits": {"items": 1}, "misses": {"items": 2}, "evictions": 0,
+                             "invalidations": 1, "entries": 0, "bytes": 0}
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(max_entries=2, max_bytes=10)
+    cache.put(('a',), (), 'a', 4)
+    cache.put(('b',), (), 'b', 4)
+    cache.get(('a',), ())
+    cache.put(('c',), (), 'c', 1)
+    assert cache.get(('b',), ()) is None and cache.get(('a',), ()) == 'a'
+    cache.put(('d',), (), 'd', 9)
+    assert list(cache.entries) == [('d',)] and cache.size == 9
+    cache.put(('e',), (), 'e', 11)
+    assert cache.get(('e',), ()) is None
+    assert cache.stats()["evictions"] == 3
+
+
+@pytest.mark.parametrize('path', [
+    '/api/inventory', '/api/inventory?sort=-quantity&limit=3', '/api/inventory/1',
+    '/api/search?q=medical', '/api/logs?item_id=1', '/api/export/arrangement',
+])
+def test_cached_responses_follow_writes(client, path):
+    before = client.get(path).get_data()
+    assert client.get(path).get_data() == before
+    client.post('/api/retrieve', json={"item_id": 1, "quantity": 1, "user": "astronaut2"})
+    after = client.get(path).get_data()
+    assert after != before
+    assert client.get(path).get_data() == after
+
+
+def test_unrelated_writes_keep_entries(api, client):
+    client.get('/api/inventory/1')
+    client.post('/api/waste/identify', json={"name": "Filter", "weight": 1})
+    client.get('/api/inventory/1')
+    assert api.response_cache.stats()["hits"]["get_item"] == 1
+
+
+def test_errors_are_not_cached(client):
+    assert client.get('/api/inventory/6').status_code == 404
+    client.post('/api/inventory', json={"name": "Filter", "quantity": 1, "location": "Node 1"})
+    assert client.get('/api/inventory/6').status_code == 200
+
+
+def test_writes_from_another_process_invalidate(api, client):
+    assert client.get('/api/inventory/1').get_json()["quantity"] == 50
+    other = Storage(api.DATA_DIR, durability='sync')
+    items = other.collection(os.path.join(api.DATA_DIR, 'inventory.json'), list, cls=Table)
+    other.recover()
+    other.put(items.path, dict(items.get(1), quantity=7))
+    assert client.get('/api/inventory/1').get_json()["quantity"] == 7
@@ -0,0 +1,64 @@
+from changes import ChangeFeed
+
+
+def test_feed_serves_changes_after_a_version():
+    feed = ChangeFeed({"items": "id"}, size=3)
+    for sequence in range(1, 5):
+        feed.append(sequence, b'[["items","put",{"id":%d}]]' % sequence)
+    assert [t["version"] for t in feed.since(2)] == [3, 4]
+    assert feed.since(4) == []
+    assert feed.since(3, limit=1)[0]["changes"] == [
+        {"collection": "items", "op": "put", "key": 4, "record": {"id": 4}}]
+    # Version 1 fell out of the feed, so version 0 can no longer be served
+    assert feed.since(0) is None
+    assert feed.since(9) is None
+
+
+def test_compacted_gap_drops_older_versions():
+    feed = ChangeFeed({"items": "id"})
+    feed.append(1, b'[["items","del",1]]')
+    feed.append(5, None)
+    assert feed.latest == 5
+    assert feed.since(1) is None
+    assert feed.since(5) == []
+
+
+def test_changes_follow_writes(client):
+    version = client.get('/api/changes').get_json()["version"]
+    client.put('/api/inventory/1', json={"quantity": 7})
+    body = client.get('/api/changes?since=%d' % version).get_json()
+    assert body["more"] is False
+    assert [change["key"] for t in body["transactions"] for change in t["changes"]][0] == 1
+    assert client.get('/api/changes?since=%d' % body["version"]).get_json()["transactions"] == []
+    assert client.get('/api/changes?since=x').status_code == 400
+
+
+def test_changes_gone_after_feed_overflow(api, client):
+    api.change_feed.entries = api.change_feed.entries.__class__(maxlen=1)
+    client.put('/api/inventory/1', json={"quantity": 7})
+    client.put('/api/inventory/1', json={"quantity": 8})
+    response = client.get('/api/changes?since=0')
+    assert response.status_code == 410
+    assert response.get_json()["version"] == api.change_feed.latest
+
+
+def test_change_version_is_read_before_the_body(api, client):
+    before = api.storage.sequence
+
+    def build():
+        # A commit landing while the body is being built
+        items = [dict(item) for item in api.inventory_items]
+        api.save_data(api.INVENTORY_FILE, dict(api.inventory_items.get(1), quantity=999))
+        return items
+
+    with api.app.test_request_context('/api/inventory'):
+        response = api.versioned_json(build)
+    assert response.headers['X-Change-Version'] == str(before)
+    changes = client.get('/api/changes?since=%s' % response.headers['X-Change-Version']).get_json()
+    assert changes["transactions"][0]["changes"][0]["record"]["quantity"] == 999
+
+
+def test_full_list_is_conditional(client):
+    response = client.get('/api/inventory')
+    assert response.headers['X-Change-Version']
+    assert client.get('/api/inventory', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
@@ -0,0 +1,47 @@
+import datetime
+
+from expiry import ExpiryIndex
+
+
+def item(key, expiry_date):
+    return {"id": key, "name": f"item-{key}", "expiry_date": expiry_date}
+
+
+def test_report_splits_expired_and_expiring_items():
+    index = ExpiryIndex()
+    for key, expiry_date in [(1, "2025-06-30"), (2, "2025-07-10"), (3, "2025-09-01"), (4, ""), (5, "soon")]:
+        index.add(key, item(key, expiry_date))
+    report = index.report(datetime.date(2025, 6, 30), within=10)
+    assert report == [
+        {"item_id": 1, "name": "item-1", "expiry_date": "2025-06-30", "status": "expired"},
+        {"item_id": 2, "name": "item-2", "expiry_date": "2025-07-10", "days_left": 10, "status": "expiring_soon"},
+    ]
+    assert index.report(datetime.date(2025, 6, 1), within=0) == []
+
+
+def test_changed_and_removed_items_move_in_the_index():
+    index = ExpiryIndex()
+    index.add(1, item(1, "2025-06-30"))
+    index.add(2, item(2, "2025-06-30"))
+    index.add(1, item(1, "2026-01-01"))
+    index.remove(2)
+    assert index.report(datetime.date(2025, 7, 1)) == []
+    assert [entry["item_id"] for entry in index.report(datetime.date(2026, 1, 1))] == [1]
+    index.add(1, item(1, None))
+    assert index.ordinals == [] and index.keys == [] and index.records == {}
+
+
+def test_expiry_endpoint(client):
+    body = client.get('/api/expiry?date=2025-07-01&within=90').get_json()
+    assert [entry["item_id"] for entry in body["expired"]] == [2]
+    assert [(entry["item_id"], entry["days_left"]) for entry in body["expiring_soon"]] == [(4, 83)]
+    client.put('/api/inventory/4', json={"expiry_date": "2025-06-01"})
+    body = client.get('/api/expiry?date=2025-07-01&within=90').get_json()
+    assert [entry["item_id"] for entry in body["expired"]] == [4, 2]
+    assert body["expiring_soon_count"] == 0
+
+
+def test_invalid_expiry_queries_are_rejected(client):
+    assert client.get('/api/expiry?date=July').status_code == 400
+    assert client.get('/api/expiry?within=-1').status_code == 400
+    assert client.get('/api/expiry?within=many').status_code == 400
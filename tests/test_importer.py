@@ -0,0 +1,74 @@
+import io
+
+import pytest
+
+from importer import _csv_rows, validate_container, validate_item, validate_rows
+
+
+def test_validate_item_coerces_csv_text():
+    fields, error = validate_item({"name": "Kit", "quantity": "3", "container_id": "2", "width": "1.5",
+                                   "depth": "2", "height": "3"})
+    assert error is None
+    assert (fields["quantity"], fields["container_id"], fields["location"]) == (3, 2, "Receiving Bay")
+    assert (fields["width"], fields["depth"], fields["height"]) == (1.5, 2.0, 3.0)
+
+
+@pytest.mark.parametrize('row', [
+    [1],
+    {"quantity": 1},
+    {"name": "Kit", "quantity": -1},
+    {"name": {"en": "Kit"}, "quantity": 1},
+    {"name": "Kit", "quantity": 1, "location": ["Module A"]},
+    {"name": "Kit", "quantity": 1, "expiry_date": 20250101},
+    {"name": "Kit", "quantity": 1, "container_id": 0},
+    {"name": "Kit", "quantity": 1, "width": 1},
+])
+def test_validate_item_rejects(row):
+    assert validate_item(row)[1] is not None
+
+
+@pytest.mark.parametrize('row', [
+    {"name": "Locker", "capacity": 10, "location": {"deck": 1}},
+    {"name": ["Locker"], "capacity": 10},
+    {"name": "Locker", "capacity": "ten"},
+    {"name": "Locker", "capacity": 10, "current_fill": -1},
+])
+def test_validate_container_rejects(row):
+    assert validate_container(row)[1] is not None
+
+
+def test_csv_rows_skip_empty_cells():
+    rows = list(_csv_rows(io.BytesIO(b'name,quantity,location\nKit,2,\n')))
+    assert rows == [(1, {"name": "Kit", "quantity": "2"}, None)]
+
+
+def test_csv_that_is_not_utf8_raises():
+    with pytest.raises(ValueError):
+        validate_rows(_csv_rows(io.BytesIO(b'name,quantity\n\xff\xfe,1\n')), validate_item)
+
+
+def test_import_commits_valid_rows_and_reports_the_rest(api, client):
+    body = client.post('/api/import/items', json={"items": [
+        {"name": "Kit", "quantity": 2, "location": "Module A"},
+        {"name": "Kit", "quantity": 2, "location": ["Module A"]},
+    ]}).get_json()
+    assert body["imported_count"] == 1
+    assert body["errors"] == [{"row": 2, "error": "location must be a string"}]
+    assert len(api.inventory_items.lookup('location', "Module A")) == 2
+
+
+def test_import_streams_ndjson_and_csv(client):
+    ndjson = b'{"name": "Kit", "quantity": 1}\nnot json\n'
+    body = client.post('/api/import/items', data=ndjson, content_type='application/x-ndjson').get_json()
+    assert body["imported_count"] == 1 and body["errors"][0]["row"] == 2
+    body = client.post('/api/import/containers', data=b'name,capacity\nLocker,10\n',
+                       content_type='text/csv').get_json()
+    assert body["imported_count"] == 1
+
+
+@pytest.mark.parametrize('path', ['/api/import/items', '/api/import/containers'])
+def test_malformed_import_bodies_are_rejected(api, client, path):
+    sequence = api.storage.sequence
+    assert client.post(path, json=[1]).status_code == 400
+    assert client.post(path, data=b'name,quantity,capacity\n\xff,1,1\n', content_type='text/csv').status_code == 400
+    assert api.storage.sequence == sequence
@@ -0,0 +1,222 @@
+import datetime
+import os
+
+import pytest
+
+import logstore
+from logstore import LogTable
+from storage import Storage
+
+START = datetime.datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def small_segments(monkeypatch):
+    # Roll the live segment into an archive every five entries
+    monkeypatch.setattr(logstore, 'LOG_SEGMENT_RECORDS', 5)
+
+
+def open_logs(directory):
+    storage = Storage(str(directory), durability='sync')
+    logs = storage.collection(os.path.join(str(directory), 'logs.json'), list, cls=LogTable)
+    storage.recover()
+    return storage, logs
+
+
+def entry(n, minute=None):
+    return {
+        "id": "log-%d" % n,
+        "timestamp": (START + datetime.timedelta(minutes=n if minute is None else minute)).isoformat() + "Z",
+        "action": "Retrieve" if n % 2 else "Add",
+        "item_id": n,
+        "quantity": 1,
+        "user": "system",
+    }
+
+
+def add_entries(storage, logs, first, count, minute=None):
+    with storage.transaction():
+        for n in range(first, first + count):
+            storage.put(logs.path, entry(n, minute))
+
+
+def page_all(logs, limit, **filters):
+    seen, cursor = [], None
+    while True:
+        page, cursor = logs.query(after=cursor, limit=limit, **filters)
+        seen += ids(page)
+        if cursor is None:
+            return seen
+
+
+def ids(entries):
+    return [entry['id'] for entry in entries]
+
+
+def test_cursor_paging_across_compaction_and_rollover(tmp_path, small_segments):
+    storage, logs = open_logs(tmp_path)
+    add_entries(storage, logs, 0, 12)
+    storage.compact()
+    assert len(logs.archives) == 1
+    add_entries(storage, logs, 12, 3)
+
+    page, cursor = logs.query(limit=4)
+    assert ids(page) == ['log-0', 'log-1', 'log-2', 'log-3']
+
+    # The tail is sealed into the segment, which rolls over into a second
+    # archive, while the client is between pages
+    add_entries(storage, logs, 15, 4)
+    storage.compact()
+    assert len(logs.archives) == 2
+    assert len(logs.records) == 0
+
+    seen = ids(page)
+    while cursor is not None:
+        page, cursor = logs.query(after=cursor, limit=4)
+        seen += ids(page)
+    assert seen == ['log-%d' % n for n in range(19)]
+
+
+def test_filtered_paging_after_reopening(tmp_path, small_segments):
+    storage, logs = open_logs(tmp_path)
+    add_entries(storage, logs, 0, 8)
+    storage.compact()
+    add_entries(storage, logs, 8, 4)
+
+    _, logs = open_logs(tmp_path)
+    assert page_all(logs, 2, action='Retrieve') == ['log-%d' % n for n in range(1, 12, 2)]
+
+
+def test_equal_timestamps_survive_sealing_between_pages(tmp_path):
+    storage, logs = open_logs(tmp_path)
+    add_entries(storage, logs, 0, 3, minute=0)
+    page, cursor = logs.query(limit=1)
+    assert ids(page) == ['log-0']
+
+    storage.compact()
+    seen = ids(page)
+    while cursor is not None:
+        page, cursor = logs.query(after=cursor, limit=1)
+        seen += ids(page)
+    assert seen == ['log-0', 'log-1', 'log-2']
+
+
+def test_out_of_order_logs_are_merged_by_time_and_id(tmp_path):
+    storage, logs = open_logs(tmp_path)
+    add_entries(storage, logs, 10, 3)
+    storage.compact()
+    old_index = logs.segment.index_path
+    # Earlier than everything sealed, and one tied with the last sealed log
+    add_entries(storage, logs, 1, 2)
+    add_entries(storage, logs, 0, 1, minute=12)
+    storage.compact()
+
+    assert logs.segment.index_path != old_index
+    assert not os.path.exists(old_index)
+    expected = ['log-1', 'log-2', 'log-10', 'log-11', 'log-0', 'log-12']
+    assert page_all(logs, 2) == expected
+    _, reopened = open_logs(tmp_path)
+    assert page_all(reopened, 4) == expected
+
+
+def test_crash_before_manifest_keeps_the_old_index(tmp_path):
+    storage, logs = open_logs(tmp_path)
+    add_entries(storage, logs, 10, 3)
+    storage.compact()
+    add_entries(storage, logs, 1, 2)
+    # Seal the out-of-order tail but stop before the manifest is rewritten
+    logs.segment.append([(key[0], e) for key, e in zip(logs.timeline.keys, logs.timeline.entries)], '.tmp')
+
+    _, reopened = open_logs(tmp_path)
+    assert page_all(reopened, 2) == ['log-1', 'log-2', 'log-10', 'log-11', 'log-12']
+
+
+def test_lazy_startup_loads_on_first_request(tmp_path, monkeypatch):
+    monkeypatch.setenv('LAZY_STARTUP', 'true')
+    monkeypatch.chdir(tmp_path)
+    import sys
+    sys.modules.pop('app', None)
+    import app
+    try:
+        client = app.app.test_client()
+        assert client.get('/api/logs?limit=1').status_code == 200
+        assert len(client.get('/api/inventory').get_json()) == 5
+    finally:
+        sys.modules.pop('app', None)
+
+
+def test_logs_endpoint_pages_with_cursors(client):
+    for quantity in range(3):
+        client.post('/api/retrieve', json={"item_id": 2, "quantity": 1})
+    first = client.get('/api/logs?action=Retrieve&limit=2').get_json()
+    assert first["count"] == 2 and first["next_cursor"]
+    rest = client.get('/api/logs?action=Retrieve&limit=2&after=%s' % first["next_cursor"]).get_json()
+    assert rest["count"] == 1 and rest["next_cursor"] is None
+    assert client.get('/api/logs?after=bogus').status_code == 400
+    assert client.get('/api/logs?limit=0').status_code == 400
+
+
+def test_malformed_cursor_is_rejected(tmp_path):
+    _, logs = open_logs(tmp_path)
+    with pytest.raises(ValueError):
+        logs.query(after='not-a-cursor')
+
+
+def test_archive_pages_read_only_the_chunks_they_need(tmp_path, monkeypatch, small_segments):
+    monkeypatch.setattr(logstore, 'LOG_SEGMENT_RECORDS', 400)
+    monkeypatch.setattr(logstore, 'ARCHIVE_CHUNK_ROWS', 50)
+    storage, logs = open_logs(tmp_path)
+    add_entries(storage, logs, 0, 400)
+    storage.compact()
+    assert len(logs.archives) == 1 and len(logs.archives[0].chunks) == 8
+
+    decompressed = []
+    real_decompress = logstore.gzip.decompress
+    monkeypatch.setattr(logstore.gzip, 'decompress', lambda data: decompressed.append(len(data)) or real_decompress(data))
+    logstore._archive_index.cache_clear()
+    seen, cursor = [], None
+    while True:
+        page, cursor = logs.query(after=cursor, limit=25)
+        seen += ids(page)
+        if cursor is None:
+            break
+    assert seen == ['log-%d' % n for n in range(400)]
+    # Each page decompresses at most the two members it spans, and the
+    # index is decoded once
+    assert len(decompressed) <= 2 * 16
+    assert logstore._archive_index.cache_info().misses == 1
+
+
+def test_archives_without_chunk_table_are_read_as_one_stream(tmp_path, small_segments):
+    storage, logs = open_logs(tmp_path)
+    add_entries(storage, logs, 0, 6, minute=0)
+    storage.compact()
+    entry = dict(logs.archives[0].entry)
+    del entry['chunks']
+    logs.archives = [logstore.Archive(str(tmp_path), entry)]
+    assert page_all(logs, 2) == ['log-%d' % n for n in range(6)]
+    assert ids(logs.query(action='Retrieve')[0]) == ['log-1', 'log-3', 'log-5']
+
+
+def test_time_action_and_user_filters_span_every_tier(tmp_path, small_segments):
+    storage, logs = open_logs(tmp_path)
+    add_entries(storage, logs, 0, 6)
+    storage.compact()
+    add_entries(storage, logs, 6, 3)
+    storage.compact()
+    add_entries(storage, logs, 9, 3)
+    assert len(logs.archives) == 1 and logs.segment.count == 3 and len(logs.records) == 3
+
+    minute = 60 * 1000000
+    start = logstore.parse_timestamp(START.isoformat() + "Z")
+    entries, cursor = logs.query(start=start + 2 * minute, end=start + 10 * minute, action='Add')
+    assert ids(entries) == ['log-2', 'log-4', 'log-6', 'log-8', 'log-10'] and cursor is None
+    assert logs.query(user='nobody') == ([], None)
+    assert len(logs) == 12
+
+
+def test_logs_endpoint_filters_by_date(client):
+    client.post('/api/retrieve', json={"item_id": 2, "quantity": 1, "user": "astronaut7"})
+    body = client.get('/api/logs?start_date=2025-04-02&user=astronaut7').get_json()
+    assert [log["action"] for log in body["logs"]] == ["Retrieve"]
+    assert client.get('/api/logs?end_date=2025-04-02').get_json()["count"] == 1
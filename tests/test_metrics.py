@@ -0,0 +1,48 @@
+import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    histogram = registry.register(metrics.Histogram('latency', 'Latency', (0.1, 1), labels=('endpoint',)))
+    counter = registry.register(metrics.Counter('hits', 'Hits', labels=('path',)))
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, 'search')
+    counter.inc(2, 'a "quoted"\npath')
+    assert registry.render().splitlines() == [
+        '# HELP latency Latency',
+        '# TYPE latency histogram',
+        'latency_bucket{endpoint="search",le="0.1"} 1',
+        'latency_bucket{endpoint="search",le="1"} 3',
+        'latency_bucket{endpoint="search",le="+Inf"} 4',
+        'latency_sum{endpoint="search"} 4.05',
+        'latency_count{endpoint="search"} 4',
+        '# HELP hits Hits',
+        '# TYPE hits counter',
+        'hits_total{path="a \\"quoted\\"\\npath"} 2',
+    ]
+
+
+def test_profiler_keeps_only_slow_sampled_requests():
+    assert metrics.Profiler().start() is None
+    profiler = metrics.Profiler(slow_seconds=0.5, sample_rate=1)
+    profiler.finish(profiler.start(), 0.1, 'fast')
+    profile = profiler.start()
+    assert profiler.start() is None
+    sum(range(1000))
+    profiler.finish(profile, 0.6, 'slow')
+    assert [report["endpoint"] for report in profiler.reports] == ['slow']
+    assert 'function calls' in profiler.reports[0]["profile"]
+
+
+def test_metrics_endpoint_counts_requests_and_scans(client):
+    client.get('/api/inventory?limit=2')
+    client.get('/api/inventory?limit=2')
+    client.post('/api/retrieve', json={"item_id": 1, "quantity": 1})
+    lines = client.get('/api/metrics').get_data(as_text=True).splitlines()
+    assert 'http_responses_total{endpoint="get_inventory",status="200"} 2' in lines
+    assert 'records_scanned_count{endpoint="get_inventory"} 1' in lines
+    assert 'records_scanned_sum{endpoint="get_inventory"} 5' in lines
+    assert 'response_cache_hits_total{endpoint="get_inventory"} 1' in lines
+    assert any(line.startswith('storage_commits_total ') and line != 'storage_commits_total 0' for line in lines)
+    assert 'collection_records{collection="inventory"} 5' in lines
+    assert client.get('/api/metrics/profiles').get_json() == {"enabled": False, "profiles": []}
@@ -0,0 +1,81 @@
+import pytest
+
+
+def test_retrieve_updates_item_container_and_logs(api, client):
+    body = client.post('/api/retrieve', json={"item_id": 1, "quantity": 5, "user": "astronaut2"}).get_json()
+    assert body["remaining_quantity"] == 45
+    assert api.containers.get(1)['current_fill'] == 45
+    assert client.get('/api/logs?user=astronaut2').get_json()["logs"][0]["quantity"] == -5
+    assert client.post('/api/retrieve', json={"item_id": 1, "quantity": 46}).status_code == 400
+
+
+def test_place_moves_item(api, client):
+    body = client.post('/api/place', json={"item_id": 4, "container_id": 2, "quantity": 1}).get_json()
+    assert body["success"] is True
+    item = api.inventory_items.get(4)
+    assert (item['container_id'], item['location'], item['quantity']) == (2, "Storage Bay", 26)
+    assert client.post('/api/place', json={"item_id": 4, "container_id": 9}).status_code == 404
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/api/retrieve', [1]),
+    ('/api/retrieve', {"item_id": [1]}),
+    ('/api/retrieve', {"item_id": 1, "quantity": "2"}),
+    ('/api/retrieve', {"item_id": 1, "user": {"name": "x"}}),
+    ('/api/place', [1]),
+    ('/api/place', {"item_id": 1, "container_id": {"id": 2}}),
+    ('/api/place', {"item_id": True, "container_id": 2}),
+    ('/api/retrieve/batch', [1]),
+    ('/api/retrieve/batch', {"operations": []}),
+    ('/api/retrieve/batch', {"operations": [{"item_id": [1]}]}),
+    ('/api/place/batch', {"operations": [{"item_id": 1, "container_id": [2]}]}),
+    ('/api/place/batch', {"operations": [{"item_id": 1}]}),
+])
+def test_malformed_operations_are_rejected(client, path, body):
+    assert client.post(path, json=body).status_code == 400
+
+
+def test_unknown_string_id_is_not_found(client):
+    assert client.post('/api/retrieve', json={"item_id": "1"}).status_code == 404
+
+
+def test_batch_sees_earlier_operations(api, client):
+    body = client.post('/api/retrieve/batch', json={"operations": [
+        {"item_id": 4, "quantity": 20}, {"item_id": 4, "quantity": 5}]}).get_json()
+    assert body["success"] is True
+    assert [result["remaining_quantity"] for result in body["results"]] == [5, 0]
+
+
+def test_failed_batch_changes_nothing(api, client):
+    sequence = api.storage.sequence
+    response = client.post('/api/retrieve/batch', json={"operations": [
+        {"item_id": 4, "quantity": 20}, {"item_id": 4, "quantity": 6}, {"item_id": 99}]})
+    assert response.status_code == 400
+    results = response.get_json()["results"]
+    assert [result["success"] for result in results] == [True, False, False]
+    assert api.inventory_items.get(4)['quantity'] == 25
+    assert api.storage.sequence == sequence
+
+
+def test_place_batch_checks_capacity_across_operations(api, client):
+    response = client.post('/api/place/batch', json={"operations": [
+        {"item_id": 1, "container_id": 4, "quantity": 20}, {"item_id": 2, "container_id": 4, "quantity": 10}]})
+    assert response.status_code == 400
+    assert response.get_json()["results"][1]["error"] == "Container does not have enough space"
+    assert api.containers.get(4)['current_fill'] == 25
+
+
+def test_batch_is_one_transaction(api, client):
+    sequence = api.storage.sequence
+    body = client.post('/api/place/batch', json={"operations": [
+        {"item_id": 1, "container_id": 4, "quantity": 20},
+        {"item_id": 2, "container_id": 4, "quantity": 5, "user": "astronaut2"}]}).get_json()
+    assert body["count"] == 2
+    assert api.storage.sequence == sequence + 1
+    assert api.containers.get(4)['current_fill'] == 50
+    assert len(client.get('/api/logs?user=astronaut2').get_json()["logs"]) == 1
+
+
+def test_batch_size_is_limited(api, client):
+    operations = [{"item_id": 1}] * (api.MAX_BATCH_OPERATIONS + 1)
+    assert client.post('/api/retrieve/batch', json={"operations": operations}).status_code == 400
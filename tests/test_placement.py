@@ -0,0 +1,99 @@
+import pytest
+
+from placement import FreeSpaceIndex, locate
+
+
+def test_free_space_index_orders_emptiest_first():
+    space = FreeSpaceIndex()
+    for key, free in [(1, 50), (2, 100), (3, 50), (4, 25)]:
+        space.add(key, {"capacity": 100, "current_fill": 100 - free})
+    assert space.emptiest(3, 10) == [2, 1, 3]
+    assert space.emptiest(3, 60) == [2]
+    assert list(space.descending(50)) == [(100, 2), (50, 1), (50, 3)]
+    space.add(4, {"capacity": 100, "current_fill": 0})
+    space.remove(2)
+    assert space.emptiest(2, 10) == [4, 1]
+    assert space.entries == sorted(space.entries) and len(space.entries) == 3
+
+
+def test_recommend_scores_free_space_and_similar_items(api):
+    recommend = api.placement_engine.recommend
+    assert [r["container_id"] for r in recommend("", 10)] == [2, 1, 3]
+    assert [r["container_id"] for r in recommend("Oxygen", 10)] == [2, 4, 1]
+    assert [r["container_id"] for r in recommend("Oxygen", 30)] == [2, 1, 3]
+    assert recommend("", 101) == []
+
+
+def test_plan_never_overfills_a_container(api):
+    assignments = api.placement_engine.plan([{"quantity": 60}, {"quantity": 60}, {"quantity": 45}])
+    assert assignments[0]["container_id"] == 2
+    assert assignments[1]["error"] == "No container has enough space"
+    assert assignments[2]["container_id"] == 1
+
+
+def test_placement_endpoints(client):
+    body = client.post('/api/placement', json={"item_type": "Oxygen", "quantity": 10}).get_json()
+    assert [r["container_id"] for r in body["recommendations"]] == [2, 4, 1]
+    body = client.post('/api/placement/batch', json={"items": [{"quantity": 60}, {"quantity": 60}]}).get_json()
+    assert body["placed_count"] == 1
+
+
+@pytest.mark.parametrize("path, body", [
+    ('/api/placement', {"quantity": 0}),
+    ('/api/placement', {"quantity": "5"}),
+    ('/api/placement', {"quantity": True}),
+    ('/api/placement/batch', {"items": [{"quantity": -1}]}),
+    ('/api/placement/batch', {"items": ["oxygen"]}),
+    ('/api/placement/batch', {}),
+])
+def test_invalid_placement_requests_are_rejected(client, path, body):
+    assert client.post(path, json=body).status_code == 400
+
+
+def test_locate_prefers_the_open_face_and_rotates_items():
+    assert locate((10, 10, 10), (10, 5, 10), []) == ((0, 0, 0, 10, 5, 10), 0)
+    # The only spot left is behind the box at the open face
+    assert locate((10, 10, 10), (10, 5, 10), [(0, 0, 0, 10, 5, 10)]) == ((0, 5, 0, 10, 10, 10), 1)
+    # A spot beside the box beats one behind it
+    assert locate((10, 10, 10), (5, 5, 5), [(0, 0, 0, 5, 5, 5)]) == ((5, 0, 0, 10, 5, 5), 0)
+    assert locate((2, 10, 1), (10, 2, 1), []) == ((0, 0, 0, 2, 10, 1), 0)
+    assert locate((10, 10, 10), (10, 10, 10), [(0, 0, 0, 1, 1, 1)]) is None
+    assert locate((10, 10, 10), (11, 1, 1), []) is None
+
+
+def test_placed_items_get_positions_and_retrieval_steps(client):
+    ids = [client.post('/api/inventory', json={"name": "Tank", "quantity": 0, "location": "",
+                                               "width": 60, "depth": 30, "height": 180}).get_json()["id"]
+           for _ in range(3)]
+    first = client.post('/api/place', json={"item_id": ids[0], "container_id": 4}).get_json()
+    second = client.post('/api/place', json={"item_id": ids[1], "container_id": 4}).get_json()
+    assert first["position"]["start"] == {"width": 0, "depth": 0, "height": 0}
+    assert (second["position"]["start"]["depth"], second["retrieval_steps"]) == (30, 1)
+    response = client.post('/api/place', json={"item_id": ids[2], "container_id": 4})
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Item does not fit in container"
+
+
+def test_recommendations_need_room_in_three_dimensions(client):
+    body = client.post('/api/placement', json={"quantity": 1, "width": 200, "depth": 85, "height": 200}).get_json()
+    assert [(r["container_id"], r["retrieval_steps"]) for r in body["recommendations"]] == [(2, 0)]
+    body = client.post('/api/placement', json={"quantity": 1, "width": 210, "depth": 10, "height": 10}).get_json()
+    assert body["recommendations"] == []
+
+
+def test_batch_plan_reserves_positions(client):
+    item = {"quantity": 1, "width": 100, "depth": 85, "height": 200}
+    assignments = client.post('/api/placement/batch', json={"items": [item, item]}).get_json()["assignments"]
+    assert [a["container_id"] for a in assignments] == [2, 2]
+    assert sorted(a["position"]["start"]["width"] for a in assignments) == [0, 100]
+
+
+@pytest.mark.parametrize("body", [
+    {"width": 10},
+    {"width": 10, "depth": 10, "height": 0},
+    {"width": 10, "depth": "deep", "height": 10},
+    {"width": True, "depth": 10, "height": 10},
+])
+def test_invalid_dimensions_are_rejected(client, body):
+    assert client.post('/api/placement', json=body).status_code == 400
+    assert client.post('/api/placement/batch', json={"items": [body]}).status_code == 400
@@ -0,0 +1,51 @@
+from search import TextIndex
+
+
+def build(*names):
+    index = TextIndex(["name", "location"])
+    for key, (name, location) in enumerate(names, 1):
+        index.add(key, {"id": key, "name": name, "location": location})
+    return index
+
+
+def names(result):
+    return [record['name'] for record in result[1]]
+
+
+def test_substring_matches_equal_a_plain_scan():
+    index = build(("Food Rations", "Module A"), ("Seafood Pack", "Node 1"), ("Oxygen Tank", "Airlock"))
+    assert names(index.search([("name", "food")])) == ["Food Rations", "Seafood Pack"]
+    assert names(index.search([("name", "o")])) == ["Food Rations", "Seafood Pack", "Oxygen Tank"]
+    assert names(index.search([("name", "food"), ("location", "node")])) == ["Seafood Pack"]
+    assert index.search([("name", "xyz")]) == (0, [])
+
+
+def test_ranking_prefers_exact_then_leading_then_token_prefix():
+    index = build(("Pack of Food", "A"), ("Food", "A"), ("Seafood", "A"), ("Food Pack", "A"))
+    assert names(index.search([("name", "food")], rank="food")) == ["Food", "Food Pack", "Pack of Food", "Seafood"]
+    assert index.search([("name", "food")], rank="food", limit=2, offset=1)[0] == 4
+    assert names(index.search([("name", "food")], rank="food", limit=2, offset=1)) == ["Food Pack", "Pack of Food"]
+
+
+def test_prefix_matches_word_starts_of_the_first_field_only():
+    index = build(("Seafood Pack", "Food Court"), ("Food Rations", "A"), ("Spare Fuse", "A"))
+    assert names(index.search([], rank="fo", prefix=True)) == ["Food Rations"]
+    assert names(index.search([], rank="pa", prefix=True)) == ["Seafood Pack"]
+
+
+def test_changed_and_removed_records_leave_the_index():
+    index = build(("Food Rations", "A"), ("Water", "A"))
+    index.add(1, {"id": 1, "name": "Spare Fuse", "location": "A"})
+    index.remove(2)
+    assert index.search([("name", "food")]) == (0, [])
+    assert index.search([], rank="wa", prefix=True) == (0, [])
+    assert names(index.search([("name", "fuse")])) == ["Spare Fuse"]
+    assert all(index.grams["name"].values())
+
+
+def test_search_endpoint(client):
+    body = client.get('/api/search?q=food').get_json()
+    assert [item["name"] for item in body["results"]] == ["Food Rations"]
+    assert client.get('/api/search?q=fo&prefix=true').get_json()["total"] == 1
+    assert client.get('/api/search?location=module').get_json()["total"] == 3
+    assert client.get('/api/search?limit=-1').status_code == 400
@@ -0,0 +1,47 @@
+import datetime
+import importlib
+import json
+import uuid
+
+import pytest
+
+import serializers
+from store import record_type
+
+
+@pytest.fixture(params=serializers._AVAILABLE)
+def backend(request, monkeypatch):
+    monkeypatch.setenv('JSON_BACKEND', request.param)
+    module = importlib.reload(serializers)
+    assert module.BACKEND == request.param
+    yield module
+    monkeypatch.delenv('JSON_BACKEND')
+    importlib.reload(serializers)
+
+
+def test_dumps_matches_the_standard_library(backend):
+    Item = record_type('Item', ('id', 'name'))
+    value = {
+        "b": [1, 2.5, None, True, "ü"],
+        "a": {"nested": {"z": 1, "y": 2}},
+        "when": datetime.date(2025, 4, 1),
+        "uuid": uuid.UUID(int=1),
+        "item": Item({"id": 1, "name": "Oxygen", "note": "extra"}),
+    }
+    expected = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False,
+                          default=lambda obj: dict(obj) if isinstance(obj, Item) else str(obj))
+    assert backend.dumps(value, sort_keys=True) == expected.encode('utf-8')
+    assert backend.loads(expected) == json.loads(expected)
+
+
+def test_non_str_keys_are_converted(backend):
+    value = {1: "one", "2": "two", 3: {4: "four"}}
+    assert backend.loads(backend.dumps(value)) == {"1": "one", "2": "two", "3": {"4": "four"}}
+    assert list(backend.loads(backend.dumps(value, sort_keys=True))) == ["1", "2", "3"]
+
+
+def test_malformed_input_raises_value_error(backend):
+    with pytest.raises(ValueError):
+        backend.loads(b'{"id": 1')
+    with pytest.raises(TypeError):
+        backend.dumps({"value": object()})
@@ -0,0 +1,70 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from simulation import Columns, DEFAULT_RATES, expiry_as_of, parse_rates, simulate
+
+ITEMS = [
+    {"id": 1, "name": "Food Rations", "quantity": 100, "expiry_date": "2025-03-02"},
+    {"id": 2, "name": "Water Packs", "quantity": "lots", "expiry_date": "not a date"},
+    {"id": 3, "name": "Spanner", "quantity": 4, "expiry_date": "2025-03-01"},
+]
+
+
+def test_expiry_as_of_counts_part_days():
+    assert expiry_as_of(datetime.datetime(2025, 3, 1)) == datetime.date(2025, 3, 1)
+    assert expiry_as_of(datetime.datetime(2025, 3, 1, 9)) == datetime.date(2025, 3, 2)
+
+
+def test_columns_tolerate_bad_fields():
+    columns = Columns(ITEMS, DEFAULT_RATES)
+    assert list(columns.quantity) == [100, 0, 4]
+    assert list(np.isnat(columns.expiry)) == [False, True, False]
+    assert list(columns.consumable) == [True, True, False]
+
+
+def test_simulation_is_reproducible():
+    columns = Columns(ITEMS, DEFAULT_RATES)
+    start = datetime.datetime(2025, 2, 28, 12)
+    first = simulate(columns, 3, np.random.default_rng(7), start)
+    second = simulate(columns, 3, np.random.default_rng(7), start)
+    assert list(first[0]) == list(second[0]) and first[2] == second[2]
+    remaining, used, timeline = first
+    assert remaining[0] + used[0] == 100 and used[2] == 0
+    # Past midnight on Feb 28, the item expiring Mar 1 already counts
+    assert [day["expired_count"] for day in timeline] == [1, 2, 2]
+    assert [day["date"] for day in timeline] == ["2025-02-28", "2025-03-01", "2025-03-02"]
+
+
+@pytest.mark.parametrize('rates', [[1], {"Food": "fast"}, {"Food": [0.5, 0.1]}, {"Food": 2}])
+def test_parse_rates_rejects(rates):
+    with pytest.raises(ValueError):
+        parse_rates(rates)
+
+
+def test_what_if_run_changes_nothing(api, client):
+    sequence = api.storage.sequence
+    body = client.post('/api/simulate/day', json={"days": 30, "seed": 1, "commit": False}).get_json()
+    assert body["committed"] is False and len(body["timeline"]) == 30
+    assert api.storage.sequence == sequence
+    expired = [entry for entry in body["expired_items"] if entry["status"] == "expired"]
+    assert body["timeline"][-1]["expired_count"] == len(expired)
+
+
+def test_committed_run_saves_quantities(api, client):
+    body = client.post('/api/simulate/day', json={"seed": 1}).get_json()
+    assert body["committed"] is True
+    for entry in body["consumables_used"]:
+        assert api.inventory_items.get(entry["item_id"])['quantity'] == entry["remaining"]
+
+
+@pytest.mark.parametrize('body', [[1], {"commit": "false"}, {"days": 0}, {"seed": -1}, {"rates": [1]}])
+def test_malformed_simulation_requests_are_rejected(api, client, body):
+    sequence = api.storage.sequence
+    assert client.post('/api/simulate/day', json=body).status_code == 400
+    assert api.storage.sequence == sequence
+
+
+def test_simulation_without_body(client):
+    assert client.post('/api/simulate/day').status_code == 200
@@ -0,0 +1,37 @@
+from stats import StorageStats
+
+
+def test_totals_follow_changed_and_removed_containers():
+    stats = StorageStats()
+    stats.add(1, {"capacity": 100, "current_fill": 50, "location": "A"})
+    stats.add(2, {"capacity": 50, "current_fill": 0, "location": "A"})
+    stats.add(3, {"capacity": 50, "current_fill": 50, "location": "B"})
+    stats.add(2, {"capacity": 50, "current_fill": 25, "location": "B"})
+    stats.remove(3)
+    summary = stats.summary()
+    assert (summary["total_containers"], summary["total_capacity"], summary["total_used"]) == (2, 150, 75)
+    assert summary["utilization_percentage"] == 50.0
+    assert summary["locations"] == {
+        "A": {"containers": 1, "capacity": 100, "used": 50, "utilization_percentage": 50.0},
+        "B": {"containers": 1, "capacity": 50, "used": 25, "utilization_percentage": 50.0},
+    }
+    stats.remove(1)
+    stats.remove(2)
+    assert stats.summary()["locations"] == {} and stats.summary()["utilization_percentage"] == 0
+
+
+def test_stats_and_arrangement_follow_writes(client):
+    stats = client.get('/api/stats').get_json()
+    assert (stats["total_capacity"], stats["total_used"], stats["total_items"]) == (680, 405, 5)
+    assert stats["container_item_counts"]["4"] == 1
+    arrangement = client.get('/api/export/arrangement').get_json()
+    assert arrangement["storage_stats"]["total_used"] == 405
+
+    client.post('/api/retrieve', json={"item_id": 1, "quantity": 5})
+    stats = client.get('/api/stats').get_json()
+    assert stats["total_used"] == 400
+    assert stats["locations"]["Module A"]["used"] == 45
+    arrangement = client.get('/api/export/arrangement').get_json()
+    assert arrangement["storage_stats"]["total_used"] == 400
+    assert arrangement["containers"][0]["current_fill"] == 45
+    assert arrangement["inventory"][0]["quantity"] == 45
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+
+import storage as storage_module
+from storage import Storage
+from store import FieldIndex, Table
+
+
+def open_storage(directory, durability='sync', **kwargs):
+    storage = Storage(str(directory), durability=durability, **kwargs)
+    items = storage.collection(os.path.join(str(directory), 'items.json'), list,
+                               cls=Table, indexes=[FieldIndex('location')])
+    storage.recover()
+    return storage, items
+
+
+def item(key, location='Module A', quantity=1):
+    return {"id": key, "location": location, "quantity": quantity}
+
+
+def test_replay_stops_at_truncated_line(tmp_path):
+    storage, items = open_storage(tmp_path)
+    storage.put(items.path, item(1))
+    storage.put(items.path, item(2))
+    # A crash in the middle of appending the third transaction
+    with open(storage.journal_path, 'ab') as f:
+        f.write(b'[["items","put",{"id":3,"loca')
+
+    recovered, items = open_storage(tmp_path)
+    assert sorted(items.records) == [1, 2]
+    assert recovered.sequence == 2
+    # The torn line is dropped, so the next record starts on a fresh line
+    recovered.put(items.path, item(4))
+    _, items = open_storage(tmp_path)
+    assert sorted(items.records) == [1, 2, 4]
+
+
+def test_second_storage_sees_compaction(tmp_path):
+    first, first_items = open_storage(tmp_path)
+    second, second_items = open_storage(tmp_path)
+    first.put(first_items.path, item(1))
+    first.put(first_items.path, item(2, location='Airlock'))
+    first.compact()
+    with first.transaction():
+        first.put(first_items.path, item(3))
+        first.delete(first_items.path, 1)
+
+    second.refresh()
+    assert second.version == first.version
+    assert second.sequence == first.sequence == 3
+    assert sorted(second_items.records) == [2, 3]
+    assert [record['id'] for record in second_items.lookup('location', 'Module A')] == [3]
+
+    # The second storage appends to the new journal, not the replaced one
+    second.put(second_items.path, item(5))
+    first.refresh()
+    assert sorted(first_items.records) == [2, 3, 5]
+
+
+def test_compaction_every_n_transactions(tmp_path):
+    storage, items = open_storage(tmp_path, compact_every=2)
+    for key in range(1, 6):
+        storage.put(items.path, item(key))
+    assert storage.compactions == 2
+
+    reopened, items = open_storage(tmp_path)
+    assert sorted(items.records) == [1, 2, 3, 4, 5]
+    assert reopened.sequence == 5
+
+
+def test_group_commit_returns_only_durable_writes(tmp_path):
+    storage, items = open_storage(tmp_path, durability='group', group_window=0.02)
+    failures = []
+
+    def worker(first):
+        for key in range(first, first + 10):
+            with storage.transaction():
+                appended_from = storage.bytes_written
+                storage.put(items.path, item(key))
+            if storage._synced <= appended_from:
+                failures.append(key)
+
+    threads = [threading.Thread(target=worker, args=(n * 10,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert failures == []
+    assert storage.commits == 80
+    assert storage.syncs < storage.commits
+
+    _, items = open_storage(tmp_path)
+    assert len(items) == 80
+
+
+def test_group_commit_syncs_early_once_the_batch_is_full(tmp_path):
+    storage, items = open_storage(tmp_path, durability='group', group_window=10, group_max=2)
+    barrier = threading.Barrier(2)
+
+    def worker(key):
+        barrier.wait()
+        storage.put(items.path, item(key))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(key,)) for key in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.perf_counter() - started < 5
+    assert storage._synced == storage.bytes_written
+
+
+def test_async_mode_syncs_and_compacts_off_the_request_thread(tmp_path, monkeypatch):
+    fsyncs = []
+    fsync = os.fsync
+
+    def record_fsync(fd):
+        fsyncs.append(threading.current_thread().name)
+        fsync(fd)
+
+    storage, items = open_storage(tmp_path, durability='async', compact_every=5, group_window=0.005)
+    monkeypatch.setattr(storage_module.os, 'fsync', record_fsync)
+    for key in range(1, 13):
+        storage.put(items.path, item(key))
+    assert set(fsyncs) <= {'journal-writer'}
+
+    storage.flush()
+    assert storage._synced == storage.bytes_written
+    deadline = time.monotonic() + 5
+    # Compaction also runs on the writer, possibly once for all the records
+    while storage._journal_records >= storage.compact_every and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert storage.compactions >= 1
+    assert storage._journal_records < storage.compact_every
+
+    reopened, items = open_storage(tmp_path)
+    assert sorted(items.records) == list(range(1, 13))
+    assert reopened.sequence == 12
@@ -0,0 +1,166 @@
+import json
+import os
+
+import pytest
+
+from storage import Storage
+from store import FieldIndex, Record, Table, encode_cursor, paginate, record_type
+
+
+def open_table(directory, **kwargs):
+    storage = Storage(str(directory), durability='sync')
+    table = storage.collection(os.path.join(str(directory), 'items.json'), list, cls=Table, **kwargs)
+    storage.recover()
+    return storage, table
+
+
+def test_field_index_moves_changed_records():
+    index = FieldIndex('location')
+    index.add(1, {"id": 1, "location": "A"})
+    index.add(2, {"id": 2, "location": "A"})
+    index.add(1, {"id": 1, "location": "B"})
+    assert [record['id'] for record in index.lookup("A")] == [2]
+    assert index.count("B") == 1
+    index.remove(2)
+    index.remove(2)
+    assert index.lookup("A") == [] and "A" not in index.buckets
+
+
+def test_table_allocates_ids_past_every_stored_key(tmp_path):
+    storage, table = open_table(tmp_path, indexes=[FieldIndex('location')])
+    storage.put(table.path, {"id": 7, "location": "A"})
+    assert table.allocate_id(3) == 8
+    assert table.allocate_id() == 11
+
+    _, reopened = open_table(tmp_path, indexes=[FieldIndex('location')])
+    assert reopened.next_id == 8
+    assert [record['id'] for record in reopened.lookup('location', "A")] == [7]
+
+
+def test_table_indexes_follow_deletes(tmp_path):
+    storage, table = open_table(tmp_path, indexes=[FieldIndex('location')])
+    storage.put(table.path, {"id": 1, "location": "A"})
+    storage.delete(table.path, 1)
+    assert 1 not in table and table.lookup('location', "A") == []
+
+
+def test_inventory_crud_by_id(api, client):
+    created = client.post('/api/inventory', json={"name": "Kit", "quantity": 3, "location": "Node 1"})
+    assert created.status_code == 201
+    item_id = created.get_json()["id"]
+    assert item_id == 6
+    assert client.get('/api/inventory/%d' % item_id).get_json()["name"] == "Kit"
+    assert client.get('/api/inventory?location=Node%201').get_json()["count"] == 1
+    assert client.delete('/api/inventory/%d' % item_id).status_code == 200
+    assert client.get('/api/inventory/%d' % item_id).status_code == 404
+    assert client.delete('/api/inventory/%d' % item_id).status_code == 404
+    assert client.get('/api/inventory?location=Node%201').get_json()["count"] == 0
+    assert client.post('/api/inventory', json={"name": "Kit", "quantity": 1}).status_code == 400
+
+
+Item = record_type('Item', ('id', 'name', 'location'), interned=('location',))
+
+
+def test_record_behaves_like_the_dict_it_replaces():
+    record = Item({"id": 1, "name": "Oxygen", "note": "extra"})
+    assert record == {"id": 1, "name": "Oxygen", "note": "extra"}
+    assert list(record) == ["id", "name", "note"] and len(record) == 3
+    assert record.get("location") is None and "location" not in record
+    with pytest.raises(KeyError):
+        record["location"]
+    record["location"] = "".join(["Air", "lock"])
+    del record["note"]
+    assert record.to_dict() == {"id": 1, "name": "Oxygen", "location": "Airlock"}
+    assert record["location"] is Item({"location": "".join(["Airl", "ock"])})["location"]
+    assert not hasattr(record, '__dict__')
+    with pytest.raises(ValueError, match="shadow"):
+        record_type('Bad', ('id', 'items'))
+
+
+def test_table_stores_records_and_snapshots_plain_json(tmp_path):
+    storage, table = open_table(tmp_path, record_type=Item)
+    storage.put(table.path, {"id": 1, "name": "Oxygen", "location": "Airlock", "quantity": 5})
+    storage.compact()
+    assert isinstance(table.get(1), Item)
+    _, reopened = open_table(tmp_path)
+    assert not isinstance(reopened.get(1), Record)
+    assert reopened.get(1) == {"id": 1, "name": "Oxygen", "location": "Airlock", "quantity": 5}
+
+
+def test_api_serves_records_as_objects(api, client):
+    assert isinstance(api.inventory_items.get(4), Record)
+    assert client.get('/api/inventory/4').get_json()["name"] == "Oxygen Tanks"
+    assert client.get('/api/inventory?fields=id,name&limit=1').get_json()["items"] == [{"id": 1, "name": "Medical Supplies"}]
+
+
+RECORDS = [
+    {"id": 1, "quantity": 5},
+    {"id": 2, "quantity": ""},
+    {"id": 3, "quantity": "many"},
+    {"id": 4, "quantity": 5},
+    {"id": 5},
+    {"id": 6, "quantity": [1]},
+    {"id": 7, "quantity": 2.5},
+]
+
+
+def walk(records, field, descending, limit):
+    ids, cursor = [], None
+    while True:
+        page, cursor = paginate(records, field, descending=descending, after=cursor, limit=limit)
+        ids.extend(record['id'] for record in page)
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 10])
+def test_cursor_pages_match_a_full_sort(limit):
+    ascending = [7, 1, 4, 3, 6, 2, 5]
+    assert [record['id'] for record in paginate(RECORDS, 'quantity')[0]] == ascending
+    assert walk(RECORDS, 'quantity', False, limit) == ascending
+    # Missing values stay last in both directions
+    assert walk(RECORDS, 'quantity', True, limit) == [6, 3, 4, 1, 7, 5, 2]
+
+
+def test_cursor_from_another_sort_is_rejected():
+    _, cursor = paginate(RECORDS, 'quantity', limit=2)
+    with pytest.raises(ValueError, match="different sort"):
+        paginate(RECORDS, 'quantity', descending=True, after=cursor, limit=2)
+    with pytest.raises(ValueError, match="different sort"):
+        paginate(RECORDS, 'id', after=cursor, limit=2)
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    encode_cursor(['quantity', False, False, 0]),
+    encode_cursor(['quantity', False, False, 7, 5, 1]),
+    encode_cursor(['quantity', False, False, 1, 5, 1]),
+    encode_cursor(['quantity', False, False, 0, 5, "1"]),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        paginate(RECORDS, 'quantity', after=cursor, limit=2)
+
+
+def test_inventory_pages_projection_and_stream(client):
+    first = client.get('/api/inventory?sort=-quantity&limit=2&fields=id,quantity').get_json()
+    assert first["items"] == [{"id": 2, "quantity": 200}, {"id": 3, "quantity": 100}]
+    second = client.get('/api/inventory?sort=-quantity&limit=2&fields=id&after=' + first["next_cursor"]).get_json()
+    assert second["items"] == [{"id": 1}, {"id": 5}]
+    assert client.get('/api/inventory?location=Airlock').get_json()["items"][0]["id"] == 4
+
+    query = '/api/inventory?sort=name&limit=3'
+    streamed = client.get(query + '&stream=true')
+    assert json.loads(streamed.get_data()) == client.get(query).get_json()
+
+
+@pytest.mark.parametrize('query', [
+    'sort=weight', 'limit=0', 'limit=ten', 'container_id=one', 'after=garbage',
+])
+def test_invalid_inventory_queries_are_rejected(client, query):
+    assert client.get('/api/inventory?' + query).status_code == 400
+
+
+def test_cursor_for_another_sort_is_rejected_by_the_endpoint(client):
+    cursor = client.get('/api/inventory?sort=name&limit=1').get_json()["next_cursor"]
+    assert client.get('/api/inventory?sort=-name&limit=1&after=' + cursor).status_code == 400
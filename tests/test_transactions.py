@@ -0,0 +1,116 @@
+import datetime
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from expiry import ExpiryIndex
+from search import TextIndex
+from storage import Storage
+from store import FieldIndex, Table
+
+
+def open_storage(directory):
+    storage = Storage(str(directory), durability='sync')
+    items = storage.collection(os.path.join(str(directory), 'items.json'), list, cls=Table,
+                               indexes=[FieldIndex('location'), TextIndex(['name', 'location']), ExpiryIndex()])
+    storage.recover()
+    return storage, items
+
+
+def item(key, location='Module A', quantity=1):
+    return {"id": key, "name": "Item %d" % key, "location": location, "quantity": quantity,
+            "expiry_date": "2025-01-%02d" % key}
+
+
+def test_failed_transaction_is_rolled_back(tmp_path):
+    storage, items = open_storage(tmp_path)
+    storage.put(items.path, item(1))
+    storage.put(items.path, item(2, location='Airlock'))
+    journal_size = os.path.getsize(storage.journal_path)
+    version = storage.version
+
+    with pytest.raises(RuntimeError):
+        with storage.transaction():
+            storage.put(items.path, item(1, location='Airlock', quantity=9))
+            storage.put(items.path, item(3))
+            storage.delete(items.path, 2)
+            raise RuntimeError("rejected")
+
+    assert items.records == {1: item(1), 2: item(2, location='Airlock')}
+    assert [record['id'] for record in items.lookup('location', 'Module A')] == [1]
+    assert [record['id'] for record in items.lookup('location', 'Airlock')] == [2]
+    assert items.indexes['text'].search([("name", "item 3")]) == (0, [])
+    assert [entry["item_id"] for entry in items.indexes['expiry'].report(datetime.date(2025, 1, 31))] == [1, 2]
+    assert os.path.getsize(storage.journal_path) == journal_size
+    assert storage.version == version
+
+    # The storage is still usable and nothing of the failed block persisted
+    storage.put(items.path, item(4))
+    _, reopened = open_storage(tmp_path)
+    assert sorted(reopened.records) == [1, 2, 4]
+    assert reopened.get(1) == item(1)
+
+
+def test_reload_swaps_in_complete_tables(tmp_path):
+    storage, items = open_storage(tmp_path)
+    for key in range(1, 6):
+        storage.put(items.path, item(key))
+    text = items.indexes['text']
+    records = items.records
+    storage.recover()
+    # Readers holding the old table keep a complete one
+    assert len(records) == 5 and len(text.records) == 5
+    assert items.indexes['text'] is not text
+    assert items.indexes['text'].search([("name", "item 3")])[0] == 1
+
+
+def test_reads_tolerate_concurrent_writes(tmp_path):
+    storage, items = open_storage(tmp_path)
+    for key in range(1, 21):
+        storage.put(items.path, item(key))
+    stop = threading.Event()
+
+    def write():
+        moves = 0
+        while not stop.is_set():
+            moves += 1
+            key = moves % 20 + 1
+            storage.put(items.path, dict(item(key, location='Node %d' % (moves % 3)),
+                                         expiry_date="2025-02-%02d" % (moves % 28 + 1)))
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline:
+            items.indexes['text'].search([("name", "item"), ("location", "node")], rank="item", prefix=True)
+            items.indexes['text'].search([("location", "no")], rank="node", limit=5)
+            items.indexes['expiry'].report(datetime.date(2025, 2, 1))
+    finally:
+        stop.set()
+        writer.join()
+        sys.setswitchinterval(interval)
+
+
+def test_invalid_update_is_rejected_before_the_transaction(api, client):
+    sequence = api.storage.sequence
+    for body in ({"quantity": "x"}, {"quantity": -1}, {"location": ["Airlock"]}, {"container_id": "2"}, [1]):
+        assert client.put('/api/inventory/1', json=body).status_code == 400
+    assert client.post('/api/inventory', json={"name": {"en": "Kit"}, "quantity": 1, "location": "A"}).status_code == 400
+    assert api.storage.sequence == sequence
+    assert client.put('/api/inventory/1', json={"location": "Airlock"}).get_json()["location"] == "Airlock"
+    assert [record['id'] for record in api.inventory_items.lookup('location', "Airlock")] == [4, 1]
+
+
+def test_failed_request_leaves_stored_records_unchanged(api, client, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("journal unavailable")
+
+    monkeypatch.setattr(api, 'add_log', fail)
+    assert client.put('/api/inventory/1', json={"quantity": 7}).status_code == 500
+    assert api.inventory_items.get(1)['quantity'] == 50
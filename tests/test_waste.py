@@ -0,0 +1,115 @@
+import datetime
+
+import pytest
+
+from waste import default_vehicles, pack, parse_vehicles, planned_loads
+
+TODAY = datetime.date(2025, 3, 1)
+
+
+def vehicle(name, departure, capacity):
+    return {"id": name, "name": name, "departure_date": departure, "capacity": capacity}
+
+
+def waste(key, weight):
+    return {"id": key, "weight": weight}
+
+
+def test_pack_is_first_fit_decreasing_by_departure():
+    vehicles = [vehicle("late", "2025-05-01", 100), vehicle("early", "2025-04-01", 10)]
+    assigned, unplaced = pack([waste("a", 4), waste("b", 8), waste("c", 200), waste("d", "x")],
+                              vehicles, {})
+    assert [(item['id'], v['id']) for item, v in assigned] == [("b", "early"), ("a", "late")]
+    assert [item['id'] for item, _ in unplaced] == ["d", "c"]
+
+
+def test_pack_counts_existing_loads():
+    loads = {"early": 8}
+    assigned, _ = pack([waste("a", 4)], [vehicle("early", "2025-04-01", 10), vehicle("late", "2025-05-01", 10)],
+                       loads)
+    assert assigned[0][1]['id'] == "late"
+    assert loads == {"early": 8, "late": 4}
+
+
+def test_planned_loads_sum_by_vehicle():
+    planned = [dict(waste("a", 3), return_plan={"vehicle_id": "v"}),
+               dict(waste("b", 4), return_plan={"vehicle_id": "v"}),
+               dict(waste("c", 5), return_plan=None)]
+    assert planned_loads(planned) == {"v": 7}
+
+
+def test_default_vehicles_keep_ids_between_days():
+    first = {v['id'] for v in default_vehicles(TODAY)}
+    later = {v['id'] for v in default_vehicles(TODAY + datetime.timedelta(days=1))}
+    assert first & later
+    assert all(v['departure_date'] > TODAY.isoformat() for v in default_vehicles(TODAY))
+
+
+@pytest.mark.parametrize('vehicles', [
+    [],
+    [{"name": ["x"], "departure_date": "2025-04-01", "capacity": 5}],
+    [{"name": "x", "departure_date": "April", "capacity": 5}],
+    [{"name": "x", "departure_date": "2025-04-01", "capacity": 0}],
+    [{"name": "x", "departure_date": "2025-02-28", "capacity": 5}],
+])
+def test_parse_vehicles_rejects(vehicles):
+    with pytest.raises(ValueError):
+        parse_vehicles(vehicles, TODAY)
+
+
+def test_parse_vehicles_accepts_today():
+    parsed = parse_vehicles([{"name": "Soyuz MS", "departure_date": "2025-03-01", "capacity": 5}], TODAY)
+    assert parsed[0]['id'] == "soyuz-ms-2025-03-01"
+
+
+def identify(client, name, weight):
+    return client.post('/api/waste/identify', json={"name": name, "weight": weight}).get_json()["waste_id"]
+
+
+def upcoming(capacity):
+    departure = (datetime.datetime.utcnow().date() + datetime.timedelta(days=10)).isoformat()
+    return [{"name": "Shuttle", "departure_date": departure, "capacity": capacity}]
+
+
+def test_batch_plan_packs_duplicates_once(api, client):
+    heavy = identify(client, "Filters", 6)
+    body = client.post('/api/waste/return-plan/batch', json={
+        "waste_ids": [heavy, heavy], "vehicles": upcoming(10)}).get_json()
+    assert body["planned_count"] == 1
+    assert body["vehicles"][0]["load"] == 6
+    assert api.waste_items.get(heavy)['status'] == "return-planned"
+
+
+def test_waste_lifecycle(api, client):
+    body = client.post('/api/waste/return-plan/batch', json={"vehicles": upcoming(100)}).get_json()
+    assert body["planned_count"] == 1
+    vehicle_id = body["plans"][0]["return_plan"]["vehicle_id"]
+    assert client.get('/api/waste?status=return-planned').get_json()["count"] == 1
+    body = client.post('/api/waste/complete-undocking/batch', json={"vehicle_id": vehicle_id}).get_json()
+    assert body["waste_ids"] == ["waste-1"]
+    assert client.get('/api/waste').get_json()["status_counts"]["returned"] == 1
+    assert client.post('/api/waste/return-plan', json={"waste_id": "waste-1"}).status_code == 400
+
+
+def test_undocking_batch_is_all_or_nothing(api, client):
+    client.post('/api/waste/return-plan', json={"waste_id": "waste-1", "vehicles": upcoming(100)})
+    other = identify(client, "Foam", 1)
+    response = client.post('/api/waste/complete-undocking/batch', json={"waste_ids": ["waste-1", other]})
+    assert response.status_code == 400
+    assert api.waste_items.get("waste-1")['status'] == "return-planned"
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/api/waste/return-plan/batch', [1]),
+    ('/api/waste/return-plan/batch', {"waste_ids": [[1]]}),
+    ('/api/waste/return-plan/batch', {"waste_ids": [{"id": 1}]}),
+    ('/api/waste/return-plan/batch', {"vehicles": [{"name": "x", "departure_date": "2000-01-01", "capacity": 5}]}),
+    ('/api/waste/return-plan', ["waste_id"]),
+    ('/api/waste/return-plan', {"waste_id": ["waste-1"]}),
+    ('/api/waste/complete-undocking', {"waste_id": {"id": 1}}),
+    ('/api/waste/complete-undocking/batch', [1]),
+    ('/api/waste/complete-undocking/batch', {"waste_ids": [[1]]}),
+    ('/api/waste/identify', ["name", "weight"]),
+])
+def test_malformed_waste_requests_are_rejected(client, path, body):
+    assert client.post(path, json=body).status_code == 400
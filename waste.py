@@ -0,0 +1,128 @@
+import datetime
+
+# Return vehicle schedule as (name, first departure, days between
+# departures, weight capacity in kg). Departures fall on fixed dates, so a
+# vehicle keeps its id from day to day and loads planned earlier count
+# against it. Used when a planning request does not list its own vehicles.
+RETURN_VEHICLES = (
+    ("SpaceX Dragon", datetime.date(2025, 1, 15), 60, 3000),
+    ("Northrop Grumman Cygnus", datetime.date(2025, 2, 20), 90, 2000),
+)
+# How far ahead scheduled departures are offered for planning
+PLANNING_HORIZON_DAYS = 120
+
+STORAGE_LOCATION = "Waste Bay Section C"
+HANDLING_INSTRUCTIONS = "Secure in triple containment bag"
+
+
+def vehicle_id(name, departure_date):
+    return '%s-%s' % ('-'.join(name.lower().split()), departure_date)
+
+
+def default_vehicles(today):
+    """Scheduled departures after `today` within PLANNING_HORIZON_DAYS."""
+    horizon = today + datetime.timedelta(days=PLANNING_HORIZON_DAYS)
+    vehicles = []
+    for name, first, interval, capacity in RETURN_VEHICLES:
+        # First departure strictly after today
+        passed = max(0, (today - first).days // interval + 1)
+        departure = first + datetime.timedelta(days=passed * interval)
+        while departure <= horizon:
+            vehicles.append({
+                "id": vehicle_id(name, departure.isoformat()),
+                "name": name,
+                "departure_date": departure.isoformat(),
+                "capacity": capacity,
+            })
+            departure += datetime.timedelta(days=interval)
+    return vehicles
+
+
+def parse_vehicles(vehicles, today):
+    """Validate [{name, departure_date, capacity}] from a request; raises ValueError.
+
+    Vehicles that departed before `today` are rejected.
+    """
+    if not isinstance(vehicles, list) or not vehicles:
+        raise ValueError("vehicles must be a non-empty list")
+    parsed = []
+    for index, vehicle in enumerate(vehicles):
+        if not isinstance(vehicle, dict) or not vehicle.get('name') or not isinstance(vehicle['name'], str):
+            raise ValueError(f"Vehicle {index} needs a name")
+        if not isinstance(vehicle.get('id', ''), str):
+            raise ValueError(f"Vehicle {index} id must be a string")
+        try:
+            departure = datetime.date.fromisoformat(vehicle.get('departure_date', ''))
+        except (TypeError, ValueError):
+            raise ValueError(f"Vehicle {index} needs a departure_date as YYYY-MM-DD")
+        if departure < today:
+            raise ValueError(f"Vehicle {index} has already departed")
+        departure = departure.isoformat()
+        capacity = vehicle.get('capacity')
+        if isinstance(capacity, bool) or not isinstance(capacity, (int, float)) or capacity <= 0:
+            raise ValueError(f"Vehicle {index} needs a positive capacity")
+        parsed.append({
+            "id": vehicle.get('id') or vehicle_id(vehicle['name'], departure),
+            "name": vehicle['name'],
+            "departure_date": departure,
+            "capacity": capacity,
+        })
+    return parsed
+
+
+def weight_of(waste_item):
+    weight = waste_item.get('weight')
+    if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight < 0:
+        return None
+    return weight
+
+
+def planned_loads(planned):
+    """Weight already assigned to each vehicle id by return-planned waste."""
+    loads = {}
+    for waste_item in planned:
+        plan = waste_item.get('return_plan') or {}
+        if plan.get('vehicle_id'):
+            loads[plan['vehicle_id']] = loads.get(plan['vehicle_id'], 0) + (weight_of(waste_item) or 0)
+    return loads
+
+
+def return_plan(vehicle):
+    return {
+        "vehicle": vehicle['name'],
+        "vehicle_id": vehicle['id'],
+        "scheduled_date": vehicle['departure_date'],
+        "storage_location": STORAGE_LOCATION,
+        "handling_instructions": HANDLING_INSTRUCTIONS,
+    }
+
+
+def pack(waste, vehicles, loads):
+    """Assign waste to vehicles by weight, first-fit decreasing.
+
+    Heaviest items are placed first, each on the earliest departing vehicle
+    with enough remaining capacity given `loads` (updated in place).
+    Returns ([(waste_item, vehicle)], [(waste_item, error)]).
+    """
+    vehicles = sorted(vehicles, key=lambda v: v['departure_date'])
+    for vehicle in vehicles:
+        loads.setdefault(vehicle['id'], 0)
+    assigned = []
+    unplaced = []
+    weighed = []
+    for waste_item in waste:
+        weight = weight_of(waste_item)
+        if weight is None:
+            unplaced.append((waste_item, "Waste item has no valid weight"))
+        else:
+            weighed.append((weight, waste_item))
+    weighed.sort(key=lambda entry: entry[0], reverse=True)
+    for weight, waste_item in weighed:
+        for vehicle in vehicles:
+            if loads[vehicle['id']] + weight <= vehicle['capacity']:
+                loads[vehicle['id']] += weight
+                assigned.append((waste_item, vehicle))
+                break
+        else:
+            unplaced.append((waste_item, "No upcoming vehicle has enough capacity"))
+    return assigned, unplaced